@@ -0,0 +1,132 @@
+import datetime as dt
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+# Episodes released within the last days are refreshed every day
+HOT = "hot"
+# Episodes which were played since the last run are refreshed every day
+WARM = "warm"
+# Episodes without plays since the last run are refreshed less often
+COLD = "cold"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS episode_activity (
+    show TEXT NOT NULL,
+    episode TEXT NOT NULL,
+    total INTEGER,
+    refreshed_on TEXT,
+    PRIMARY KEY (show, episode)
+)
+"""
+
+
+class ActivityPlanner:
+    """
+    Decides which episodes need their per-episode endpoints fetched today.
+
+    Episodes are classified by the all-time play count the pipeline fetches
+    for the show anyway, compared to the count seen in the previous run:
+
+    - hot: released within the last `hot_days` days
+    - warm: the count changed (or the episode is seen for the first time)
+    - cold: the count did not change
+
+    Hot and warm episodes are refreshed every run, cold episodes only every
+    `cold_refresh_days` days. This way the number of daily requests scales
+    with the number of active episodes rather than the size of the catalog.
+
+    The counts are kept in a SQLite database between runs.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        show: str,
+        today: dt.datetime,
+        hot_days: int = 30,
+        cold_refresh_days: int = 7,
+    ):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.show = show
+        self.today = today
+        self.hot_days = hot_days
+        self.cold_refresh_days = cold_refresh_days
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(
+            str(path), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(SCHEMA)
+        self.previous = {
+            episode: (total, refreshed_on)
+            for episode, total, refreshed_on in self.db.execute(
+                "SELECT episode, total, refreshed_on FROM episode_activity WHERE show = ?",
+                (show,),
+            )
+        }
+        self.counts = {HOT: 0, WARM: 0, COLD: 0}
+
+    def classify(
+        self,
+        episode: str,
+        release_date: Optional[dt.datetime],
+        total: Optional[int],
+    ) -> str:
+        if release_date is None or self.today - release_date <= dt.timedelta(
+            days=self.hot_days
+        ):
+            return HOT
+        previous_total, _ = self.previous.get(episode, (None, None))
+        if total is None or previous_total is None or total != previous_total:
+            return WARM
+        return COLD
+
+    def previous_total(self, episode: str) -> Optional[int]:
+        """
+        The count of the episode stored by the previous run, if any.
+        """
+        total, _ = self.previous.get(episode, (None, None))
+        return total
+
+    def should_refresh(
+        self,
+        episode: str,
+        release_date: Optional[dt.datetime],
+        total: Optional[int],
+    ) -> bool:
+        """
+        Classify the episode, remember its count and return whether its
+        per-episode endpoints should be fetched in this run. An unknown count
+        (None) makes the episode warm and keeps the previous count.
+        """
+        activity = self.classify(episode, release_date, total)
+        previous_total, refreshed_on = self.previous.get(episode, (None, None))
+        if total is None:
+            total = previous_total
+
+        refresh = activity != COLD or (
+            refreshed_on is None
+            or self.today - dt.datetime.strptime(refreshed_on, "%Y-%m-%d")  # noqa: DTZ007
+            >= dt.timedelta(days=self.cold_refresh_days)
+        )
+        if refresh:
+            refreshed_on = self.today.strftime("%Y-%m-%d")
+
+        self.counts[activity] += 1
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO episode_activity VALUES (?, ?, ?, ?)",
+                (self.show, episode, total, refreshed_on),
+            )
+        return refresh
+
+    def close(self) -> None:
+        logger.info(
+            f"Episode activity: {self.counts[HOT]} hot, {self.counts[WARM]} warm, {self.counts[COLD]} cold"
+        )
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,148 @@
+import asyncio
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+from loguru import logger
+
+# How calls to the Spotify Creators API are executed:
+# - "threads" (default): the per-episode pre-fetch calls run one after another
+#   and the endpoints are processed by NUM_WORKERS worker threads
+# - "asyncio": the per-episode pre-fetch calls and the endpoints are run on an
+#   event loop with at most FETCH_CONCURRENCY calls in flight
+THREADS = "threads"
+ASYNCIO = "asyncio"
+
+
+def map_concurrently(
+    function: Callable[[Any], Any], items: Iterable[Any], concurrency: int = 1
+) -> List[Any]:
+    """
+    Call `function(item)` for all items and return the results in the order
+    of the items. Exceptions are returned in place of the result, so a single
+    failing call does not abort the others.
+
+    With a `concurrency` above 1, the calls are scheduled on an asyncio event
+    loop and a semaphore keeps at most `concurrency` of them in flight. The
+    connector is synchronous, so each call runs on a thread pool of the same
+    size: the number of threads is bounded by `concurrency`, not by the
+    number of items.
+    """
+    items = list(items)
+    if concurrency <= 1:
+        results = []
+        for item in items:
+            try:
+                results.append(function(item))
+            except Exception as e:
+                results.append(e)
+        return results
+    return asyncio.run(_map(function, items, concurrency))
+
+
+async def _map(function, items, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+
+        async def call(item):
+            async with semaphore:
+                return await loop.run_in_executor(pool, function, item)
+
+        return await asyncio.gather(
+            *(call(item) for item in items), return_exceptions=True
+        )
+
+
+def run_concurrently(
+    function: Callable[[Any], Any], items: Iterable[Any], concurrency: int = 1
+) -> None:
+    """
+    Call `function(item)` for all items like `map_concurrently`, but without
+    keeping the results. Exceptions are logged and the remaining items are
+    processed.
+
+    The items (e.g. a generator) are only taken when a call can start, so at
+    most `concurrency` of them are in memory at a time.
+    """
+    asyncio.run(_run(function, items, max(1, concurrency)))
+
+
+async def _run(function, items, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    running = set()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+
+        async def call(item):
+            try:
+                await loop.run_in_executor(pool, function, item)
+            except Exception as e:
+                logger.error(f"Error while processing {item}: {e}")
+            finally:
+                semaphore.release()
+
+        iterator = iter(items)
+        try:
+            while True:
+                # take the next item once a call can start
+                await semaphore.acquire()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                task = asyncio.create_task(call(item))
+                running.add(task)
+                task.add_done_callback(running.discard)
+        finally:
+            # also if generating the items failed
+            await asyncio.gather(*running)
+
+
+def run_graph(
+    tasks: Mapping[str, Tuple[Callable[..., Any], Sequence[str]]],
+    max_workers: int,
+) -> Dict[str, Any]:
+    """
+    Run a graph of dependent tasks concurrently and return their results by name.
+
+    `tasks` maps a name to `(function, dependencies)`. A task starts as soon
+    as all of its dependencies have finished, and its function is called with
+    their results (in the order of `dependencies`). Independent tasks run at
+    the same time on up to `max_workers` threads, so the total time is the
+    longest chain of dependent tasks rather than the sum of all of them.
+
+    If a task fails, no further tasks are started and the exception is raised.
+    """
+    for name, (_, dependencies) in tasks.items():
+        unknown = [d for d in dependencies if d not in tasks]
+        if unknown:
+            raise ValueError(f"Task `{name}` depends on unknown tasks {unknown}")
+
+    results: Dict[str, Any] = {}
+    waiting = dict(tasks)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        while waiting or running:
+            for name, (function, dependencies) in list(waiting.items()):
+                if all(d in results for d in dependencies):
+                    del waiting[name]
+                    args = [results[d] for d in dependencies]
+                    running[pool.submit(function, *args)] = name
+
+            if not running:
+                raise ValueError(f"Tasks with cyclic dependencies: {list(waiting)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    for pending in running:
+                        pending.cancel()
+                    raise error
+                results[name] = future.result()
+
+    return results
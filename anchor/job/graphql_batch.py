@@ -0,0 +1,224 @@
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+import requests
+from loguru import logger
+from spotifygraphqlconnector.connector import GraphQLResponseError
+from spotifygraphqlconnector.types import (
+    CLIENT_PUBLIC,
+    CLIENT_SHELL,
+    GRAPHQL_URL,
+    OPERATION_HASHES,
+)
+
+from job.rate_limit import RateLimitedGraphQLConnector
+
+# The batches are built from private parts of the connector (its auth, headers
+# and persisted query hashes), which may change in any release. Keep in sync
+# with the pinned version in pyproject.toml.
+SPOTIFYGRAPHQLCONNECTOR_VERSION = "0.5.2"
+
+# Per-episode operations which are sent in batches. All of them are queried
+# with the CLIENT_PUBLIC headers the batches are sent with.
+BATCHED_OPERATIONS = (
+    "getEpisodePerformanceAllTime",
+    "getEpisodeMetadataForAnalytics",
+    "getEpisodePlaysTotal",
+)
+
+# Status codes which indicate that the API does not accept batched requests.
+# In that case, batching is disabled and all queries are sent one by one.
+BATCH_UNSUPPORTED_STATUS_CODES = (400, 404, 405, 413, 415, 422)
+
+# Result of a batched query which has to be sent on its own
+_SEND_SINGLE = object()
+
+
+class _PendingQuery:
+    def __init__(self, operation_name, variables):
+        self.operation_name = operation_name
+        self.variables = variables
+        self.future = Future()
+
+
+class BatchingGraphQLConnector(RateLimitedGraphQLConnector):
+    """
+    SpotifyGraphQLConnector which sends the per-episode queries of concurrent
+    callers (worker threads or asyncio mode) as one batched GraphQL request,
+    a JSON array of persisted queries.
+
+    The queries are persisted (only their hash is sent), so they cannot be
+    merged into a single aliased document. Instead, a batch is sent as soon as
+    it holds `batch_size` queries or its oldest query waited `max_wait`
+    seconds, and every caller gets the result of its own query. A caller
+    without any other query in flight (e.g. a loop of sequential calls) sends
+    its query right away, as nobody could fill its batch.
+
+    If the API does not accept batched requests, batching is disabled for the
+    rest of the run. If a batch fails for another reason, its queries are sent
+    one by one with the retries of the connector.
+    """
+
+    def __init__(self, *args, batch_size: int = 10, max_wait: float = 0.05, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.batch_supported = True
+        self.batches = 0
+        self.batched_queries = 0
+        self._batch_lock = threading.Lock()
+        self._pending = []
+        self._callers = 0
+
+    @contextmanager
+    def _caller(self):
+        """
+        Count the calls in flight while the block runs. Returns whether the
+        call is the only one.
+        """
+        with self._batch_lock:
+            self._callers += 1
+            alone = self._callers == 1
+        try:
+            yield alone
+        finally:
+            with self._batch_lock:
+                self._callers -= 1
+
+    def _query(self, operation_name, variables=None, creator_client=CLIENT_SHELL):
+        with self._caller() as alone:
+            if (
+                alone
+                or not self.batch_supported
+                or operation_name not in BATCHED_OPERATIONS
+                or creator_client != CLIENT_PUBLIC
+            ):
+                return super()._query(operation_name, variables, creator_client)
+            return self._batched_query(operation_name, variables, creator_client)
+
+    def _batched_query(self, operation_name, variables, creator_client):
+        query = _PendingQuery(operation_name, variables or {})
+        with self._batch_lock:
+            self._pending.append(query)
+            batch = self._take_batch(self.batch_size)
+
+        if batch:
+            self._send_batch(batch)
+        else:
+            try:
+                query.future.result(timeout=self.max_wait)
+            except FutureTimeoutError:
+                # Nobody filled the batch in time, send what is there
+                with self._batch_lock:
+                    batch = self._take_batch(1)
+                if batch:
+                    self._send_batch(batch)
+
+        result = query.future.result()
+        if result is _SEND_SINGLE:
+            return super()._query(operation_name, variables, creator_client)
+        return result
+
+    def _take_batch(self, min_size):
+        if len(self._pending) < min_size:
+            return []
+        batch, self._pending = self._pending, []
+        return batch
+
+    def _send_batch(self, batch):
+        try:
+            try:
+                results = self._post_batch(batch)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.warning(f"Batched GraphQL request failed: {e}")
+                results = None
+
+            if results is None:
+                for query in batch:
+                    query.future.set_result(_SEND_SINGLE)
+                return
+
+            self.batches += 1
+            self.batched_queries += len(batch)
+            for query, result in zip(batch, results):
+                try:
+                    query.future.set_result(_unwrap(query.operation_name, result))
+                except GraphQLResponseError as e:
+                    query.future.set_exception(e)
+        except BaseException as e:
+            # e.g. expired credentials or a lost rate limit broker: every caller
+            # waiting for the batch gets the error instead of waiting forever
+            for query in batch:
+                if not query.future.done():
+                    query.future.set_exception(e)
+            raise
+
+    def _post_batch(self, batch):
+        """
+        Send the queries as one request. Returns their results or None if the
+        queries have to be sent one by one.
+        """
+        if len(batch) == 1:
+            return None
+
+        if self.limiter is not None:
+            self.limiter.acquire()
+        self._ensure_auth()
+        response = requests.post(
+            GRAPHQL_URL,
+            json=[
+                {
+                    "operationName": query.operation_name,
+                    "variables": query.variables,
+                    "extensions": {
+                        "persistedQuery": {
+                            "version": 1,
+                            "sha256Hash": OPERATION_HASHES[query.operation_name],
+                        }
+                    },
+                }
+                for query in batch
+            ],
+            headers=self._graphql_headers(CLIENT_PUBLIC),
+            timeout=60,
+        )
+
+        if response.status_code in BATCH_UNSUPPORTED_STATUS_CODES:
+            self._disable_batching(f"status code {response.status_code}")
+            return None
+        if response.status_code != 200:
+            # e.g. 401 or 429, the single queries retry with backoff
+            return None
+
+        results = response.json()
+        if not isinstance(results, list) or len(results) != len(batch):
+            self._disable_batching("unexpected response")
+            return None
+        return results
+
+    def _disable_batching(self, reason):
+        if self.batch_supported:
+            logger.warning(
+                f"Spotify Creators API does not accept batched queries ({reason}), "
+                "sending them one by one"
+            )
+        self.batch_supported = False
+
+
+def _unwrap(operation_name, result):
+    """
+    Return the `data` of a single GraphQL result like the connector does.
+    """
+    if not isinstance(result, dict):
+        return result
+    errors = result.get("errors")
+    if errors:
+        logger.warning(f"GraphQL errors in {operation_name}: {errors}")
+    data = result.get("data")
+    if not isinstance(data, dict):
+        if errors:
+            raise GraphQLResponseError(operation_name, errors)
+        return result
+    return data
@@ -0,0 +1,86 @@
+import functools
+import threading
+
+from loguru import logger
+
+
+class _Call:
+    """
+    Result of one connector call, shared by all callers with the same arguments.
+    """
+
+    def __init__(self, uses):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        # number of callers still expected to use the result
+        self.remaining = uses
+
+
+class Memoized:
+    """
+    Wraps a connector and caches the results of the given `methods`, keyed
+    by method name and arguments. Other attributes are passed through.
+
+    A result is kept until it was used `uses` times (the number of times
+    the pipeline makes the same call) and then dropped, so the memory does
+    not grow with the number of episodes. If several worker threads make
+    the same call at the same time, only the first one calls the API and
+    the others wait for its result. Failed calls are not cached, so a later
+    call tries again.
+
+    Cached results are shared between callers and must not be modified.
+    Methods returning generators must not be memoized.
+    """
+
+    def __init__(self, target, methods, uses=2):
+        self._target = target
+        self._methods = frozenset(methods)
+        self._uses = uses
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.hits = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name not in self._methods:
+            return attr
+        return functools.partial(self._call, name, attr)
+
+    def _call(self, name, method, *args, **kwargs):
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            # unhashable arguments, e.g. dicts
+            return method(*args, **kwargs)
+
+        with self._lock:
+            call = self._calls.get(key)
+            owner = call is None
+            if owner:
+                call = self._calls[key] = _Call(self._uses)
+            else:
+                self.hits += 1
+            call.remaining -= 1
+            if call.remaining <= 0:
+                del self._calls[key]
+
+        if not owner:
+            logger.debug(f"Reusing result of {name}{args}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = method(*args, **kwargs)
+            return call.value
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            raise
+        finally:
+            call.done.set()
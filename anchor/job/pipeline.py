@@ -0,0 +1,767 @@
+"""
+Anchor / Spotify GraphQL pipeline.
+
+Fetches show-level and episode-level analytics from the new Spotify Creators
+GraphQL API via ``spotifygraphqlconnector`` and posts the data to the Open
+Podcast API in the legacy Anchor-compatible data shapes expected by the backend.
+"""
+
+import sys
+import datetime as dt
+from pathlib import Path
+from typing import Mapping
+
+from loguru import logger
+from spotifygraphqlconnector import SpotifyGraphQLConnector
+
+from job.concurrency import (
+    ASYNCIO,
+    THREADS,
+    map_concurrently,
+    run_concurrently,
+    run_graph,
+)
+from job.dates import get_date_range
+from job.executor import Executor
+from job.graphql_batch import BatchingGraphQLConnector
+from job.fetch_params import FetchParams, parse_completed, skip_completed
+from job.load_env import load_env, load_file_or_env
+from job.memoize import Memoized
+from job.metadata_cache import DAY, ChangedOnlySink, MetadataCache, parse_ttls
+from job.activity import ActivityPlanner
+from job.batch import BatchingSink
+from job.open_podcast import OpenPodcastConnector
+from job.rate_limit import RateLimitedGraphQLConnector, connect_limiter
+from job.transforms import (
+    get_total_plays_by_uri,
+    transform_aggregated_performance,
+    transform_audience_size,
+    transform_episode_performance,
+    transform_episode_plays,
+    transform_episodes_page,
+    transform_plays,
+    transform_plays_by_age_range,
+    transform_plays_by_app,
+    transform_plays_by_device,
+    transform_plays_by_gender,
+    transform_plays_by_geo,
+    transform_plays_by_geo_region,
+    transform_total_plays,
+    transform_total_plays_by_episode,
+    transform_unique_listeners,
+    wrap_episode_metadata,
+)
+from job.worker import fetch
+
+# Days for which API responses of rarely changing calls are reused from the
+# metadata cache (overridden with METADATA_CACHE_TTLS)
+METADATA_CACHE_TTL_DAYS = {"legacyWebId": 30, "podcastEpisode": 7}
+
+# Endpoints which are only sent if they changed with POST_ONLY_IF_CHANGED
+CHANGED_ONLY_ENDPOINTS = ("podcastEpisode",)
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+
+def get_request_lambda(f, *args, **kwargs):
+    """Capture arguments in a closure (call-by-value)."""
+    return lambda: f(*args, **kwargs)
+
+
+def get_top_geo_name(geo_payload: dict) -> str | None:
+    """Extract top geo displayName from a geo stats response."""
+    geos = (
+        geo_payload.get("showByShowUri", {})
+        .get("showStreamsAndDownloadsByGeo", {})
+        .get("analyticsValue", {})
+        .get("analyticsValue", {})
+        .get("geos", [])
+    )
+    if not geos:
+        return None
+    return geos[0].get("displayName")
+
+
+def get_numeric_episode_id(episode: dict) -> int | str | None:
+    """Return numeric Anchor episode ID from episode payload variants."""
+    return (
+        episode.get("id") or episode.get("episodeId") or episode.get("stationEpisodeId")
+    )
+
+
+def get_episode_release_date(episode: dict) -> dt.datetime | None:
+    """Return the publish date of an episode payload, if available."""
+    seconds = episode.get("publishedOn", {}).get("seconds")
+    if not seconds:
+        return None
+    return dt.datetime.fromtimestamp(int(seconds), tz=dt.timezone.utc).replace(
+        tzinfo=None
+    )
+
+
+def run(config: Mapping[str, str]) -> None:
+    """
+    Fetch all data for one show and send it to the Open Podcast API.
+
+    `config` holds the settings that are read from the environment when the
+    pipeline is started as `python -m job`. Exits via `sys.exit` if the
+    configuration is invalid.
+    """
+    # ---------------------------------------------------------------------------
+    # Environment
+    # ---------------------------------------------------------------------------
+
+    print("Initializing environment")
+
+    OPENPODCAST_API_ENDPOINT = config.get(
+        "OPENPODCAST_API_ENDPOINT", "https://api.openpodcast.dev"
+    )
+    OPENPODCAST_API_TOKEN = load_file_or_env("OPENPODCAST_API_TOKEN", env=config)
+
+    # Number of documents sent per request to the Open Podcast API.
+    # Batching needs `/connector/batch` support on the API side and is disabled
+    # by default (with a value of 1 or lower, every document is sent on its own).
+    OPENPODCAST_BATCH_SIZE = int(config.get("OPENPODCAST_BATCH_SIZE", "0"))
+    OPENPODCAST_BATCH_MAX_BYTES = int(
+        config.get("OPENPODCAST_BATCH_MAX_BYTES", str(4 * 1024 * 1024))
+    )
+    OPENPODCAST_BATCH_MAX_WAIT = float(config.get("OPENPODCAST_BATCH_MAX_WAIT", "30"))
+
+    # Content coding for large request bodies: `gzip` (default) or `none`
+    OPENPODCAST_COMPRESSION = config.get("OPENPODCAST_COMPRESSION", "gzip").lower()
+
+    # Spotify Creators GraphQL authentication cookies
+    SPOTIFY_SP_DC = load_file_or_env("SPOTIFY_SP_DC", env=config)
+    SPOTIFY_SP_KEY = load_file_or_env("SPOTIFY_SP_KEY", env=config)
+
+    # Optional: Spotify show URI (e.g. "spotify:show:abc123")
+    # If not set, the connector resolves it automatically from the account.
+    SPOTIFY_SHOW_URI = load_file_or_env("SPOTIFY_SHOW_URI", "", env=config)
+    PODCAST_ID = load_file_or_env("PODCAST_ID", "", env=config)
+
+    if not SPOTIFY_SHOW_URI and PODCAST_ID.startswith("spotify:show:"):
+        SPOTIFY_SHOW_URI = PODCAST_ID
+
+    # Date range used for analytics queries.
+    START_DATE_STR = load_env(
+        "START_DATE",
+        (dt.datetime.now() - dt.timedelta(days=3)).strftime("%Y-%m-%d"),
+        env=config,
+    )
+    END_DATE_STR = load_env(
+        "END_DATE",
+        (dt.datetime.now() - dt.timedelta(days=1)).strftime("%Y-%m-%d"),
+        env=config,
+    )
+
+    # Number of worker threads
+    NUM_WORKERS = int(config.get("NUM_WORKERS", "1"))
+
+    # `threads` (default) or `asyncio`. In asyncio mode, the per-episode
+    # pre-fetch calls and all endpoints run concurrently with at most
+    # FETCH_CONCURRENCY calls in flight (see job/concurrency.py)
+    FETCH_MODE = config.get("FETCH_MODE", THREADS).lower()
+    FETCH_CONCURRENCY = int(config.get("FETCH_CONCURRENCY", "8"))
+    if FETCH_MODE not in (THREADS, ASYNCIO):
+        logger.error(f"Invalid FETCH_MODE `{FETCH_MODE}`. Exiting...")
+        sys.exit(1)
+    # Number of calls in flight during pre-fetch and per-endpoint work
+    concurrency = FETCH_CONCURRENCY if FETCH_MODE == ASYNCIO else 1
+
+    # Number of independent show-level pre-fetch calls which run at the same time
+    PREFETCH_CONCURRENCY = int(config.get("PREFETCH_CONCURRENCY", "4"))
+
+    # Documents which were already stored today, set by the connector manager
+    # when it resumes an aborted run. They are not fetched again.
+    COMPLETED_DOCUMENTS = parse_completed(config.get("COMPLETED_DOCUMENTS", ""))
+
+    # Directory for state that is kept between runs. If set, episodes without
+    # plays since the last run ("cold" episodes) are only refreshed every
+    # EPISODE_COLD_REFRESH_DAYS days. Episodes released within the last
+    # EPISODE_HOT_DAYS days are always refreshed.
+    STATE_DIR = load_env("STATE_DIR", env=config)
+    EPISODE_HOT_DAYS = int(config.get("EPISODE_HOT_DAYS", "30"))
+    EPISODE_COLD_REFRESH_DAYS = int(config.get("EPISODE_COLD_REFRESH_DAYS", "7"))
+
+    # Set by the connector manager for the chunks of a backfill. The activity
+    # of an episode today says nothing about a past date range, so all
+    # episodes are fetched.
+    BACKFILL = config.get("BACKFILL", "").lower() in ("1", "true", "yes")
+
+    # Directory of the on-disk cache for rarely changing data like episode
+    # metadata (defaults to STATE_DIR). Responses are reused for the number of
+    # days per call in METADATA_CACHE_TTLS (e.g. `legacyWebId=30,podcastEpisode=7`).
+    METADATA_CACHE_DIR = load_env("METADATA_CACHE_DIR", STATE_DIR, env=config)
+    METADATA_CACHE_TTLS = parse_ttls(
+        config.get("METADATA_CACHE_TTLS"), METADATA_CACHE_TTL_DAYS
+    )
+
+    # Only send metadata which changed since it was last stored. Unchanged
+    # documents are sent again after POST_UNCHANGED_AFTER_DAYS days.
+    POST_ONLY_IF_CHANGED = config.get("POST_ONLY_IF_CHANGED", "").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+    POST_UNCHANGED_AFTER_DAYS = float(config.get("POST_UNCHANGED_AFTER_DAYS", "7"))
+
+    # Optional rate limit for the Spotify Creators API in requests per window.
+    # Shared by all worker threads and all concurrent runs of the connector manager.
+    RATE_LIMIT_REQUESTS = load_env("ANCHOR_RATE_LIMIT_REQUESTS", env=config)
+    RATE_LIMIT_WINDOW = float(load_env("ANCHOR_RATE_LIMIT_WINDOW", "30", env=config))
+
+    # Optional batching of the per-episode GraphQL queries of concurrent calls
+    # (FETCH_MODE=asyncio or NUM_WORKERS > 1) into requests of up to this many
+    # queries. Disabled by default; falls back to single queries if the API
+    # does not accept batched requests.
+    GRAPHQL_BATCH_SIZE = int(config.get("ANCHOR_GRAPHQL_BATCH_SIZE", "0"))
+    GRAPHQL_BATCH_MAX_WAIT = float(config.get("ANCHOR_GRAPHQL_BATCH_MAX_WAIT", "0.05"))
+
+    date_range = get_date_range(START_DATE_STR, END_DATE_STR)
+    START_DATE = date_range.start.date()
+    END_DATE = date_range.end.date()
+
+    logger.info(f"Using explicit date range {START_DATE} - {END_DATE}.")
+
+    # Check required env vars
+    required_vars = {
+        "OPENPODCAST_API_TOKEN": OPENPODCAST_API_TOKEN,
+        "SPOTIFY_SP_DC": SPOTIFY_SP_DC,
+        "SPOTIFY_SP_KEY": SPOTIFY_SP_KEY,
+    }
+    missing_vars = [name for name, value in required_vars.items() if not value]
+    if missing_vars:
+        logger.error(
+            f"Missing required environment variables: {', '.join(missing_vars)}. Exiting..."
+        )
+        sys.exit(1)
+
+    print("Done initializing environment")
+
+    # ---------------------------------------------------------------------------
+    # Connectors
+    # ---------------------------------------------------------------------------
+
+    # Note: as of spotifygraphqlconnector 0.5.0 the GraphQL API keys the episode
+    # list by ``showUri`` (Spotify migrated ``WebGetIndexedEpisodeList`` away from
+    # ``stationId`` in April 2026), so ``SPOTIFY_STATION_ID`` is no longer needed
+    # and the connector ignores it.
+    limiter = None
+    if RATE_LIMIT_REQUESTS:
+        limiter = connect_limiter(
+            config, "anchor", float(RATE_LIMIT_REQUESTS), RATE_LIMIT_WINDOW
+        )
+
+    if GRAPHQL_BATCH_SIZE > 1 and max(NUM_WORKERS, concurrency) <= 1:
+        # a single caller would wait for queries that never come
+        logger.warning(
+            "ANCHOR_GRAPHQL_BATCH_SIZE needs FETCH_MODE=asyncio or NUM_WORKERS > 1, "
+            "not batching queries"
+        )
+        GRAPHQL_BATCH_SIZE = 0
+
+    if GRAPHQL_BATCH_SIZE > 1:
+        connector = BatchingGraphQLConnector(
+            sp_dc=SPOTIFY_SP_DC,
+            sp_key=SPOTIFY_SP_KEY,
+            show_uri=SPOTIFY_SHOW_URI or None,
+            limiter=limiter,
+            batch_size=GRAPHQL_BATCH_SIZE,
+            max_wait=GRAPHQL_BATCH_MAX_WAIT,
+        )
+    elif limiter is not None:
+        connector = RateLimitedGraphQLConnector(
+            sp_dc=SPOTIFY_SP_DC,
+            sp_key=SPOTIFY_SP_KEY,
+            show_uri=SPOTIFY_SHOW_URI or None,
+            limiter=limiter,
+        )
+    else:
+        connector = SpotifyGraphQLConnector(
+            sp_dc=SPOTIFY_SP_DC,
+            sp_key=SPOTIFY_SP_KEY,
+            show_uri=SPOTIFY_SHOW_URI or None,
+        )
+
+    # The all-time performance of an episode is used for two endpoints, the
+    # second one is served from memory
+    connector = Memoized(connector, ["get_episode_performance_all_time"])
+
+    # Resolve the show URI once so every subsequent call can reuse it.
+    show_uri = connector._ensure_show_uri()
+    logger.info(f"Resolved show URI: {show_uri}")
+
+    open_podcast = OpenPodcastConnector(
+        OPENPODCAST_API_ENDPOINT,
+        OPENPODCAST_API_TOKEN,
+        # Use the Spotify show URI as the podcast identifier
+        show_uri,
+        pool_size=max(NUM_WORKERS, concurrency),
+        compression=OPENPODCAST_COMPRESSION,
+    )
+
+    # Health check
+    response = open_podcast.health()
+    if response.status_code != 200:
+        logger.error(
+            f"Open Podcast API healthcheck failed with status code {response.status_code}"
+        )
+        sys.exit(1)
+
+    # Send documents in batches if enabled, otherwise post them one by one
+    sink = open_podcast
+    if OPENPODCAST_BATCH_SIZE > 1:
+        sink = BatchingSink(
+            open_podcast,
+            max_items=OPENPODCAST_BATCH_SIZE,
+            max_bytes=OPENPODCAST_BATCH_MAX_BYTES,
+            max_wait=OPENPODCAST_BATCH_MAX_WAIT,
+        )
+
+    metadata_cache = None
+    post_sink = sink
+    if METADATA_CACHE_DIR:
+        metadata_cache = MetadataCache(
+            Path(METADATA_CACHE_DIR) / "anchor.sqlite3",
+            show_uri,
+            METADATA_CACHE_TTLS,
+        )
+        # A resumed run sends everything, so today's number of updates
+        # catches up with yesterday's and the run is not repeated again
+        if POST_ONLY_IF_CHANGED and not COMPLETED_DOCUMENTS:
+            post_sink = ChangedOnlySink(
+                sink,
+                metadata_cache,
+                CHANGED_ONLY_ENDPOINTS,
+                POST_UNCHANGED_AFTER_DAYS * DAY,
+            )
+
+    def cached(endpoint, key, call):
+        """
+        Result of the API call, from the metadata cache if enabled
+        """
+        if metadata_cache is None:
+            return call()
+        return metadata_cache.cached(endpoint, key, call)
+
+    # ---------------------------------------------------------------------------
+    # Pre-fetch shared data (avoids duplicate API calls)
+    # ---------------------------------------------------------------------------
+
+    logger.info("Pre-fetching shared analytics data …")
+
+    def fetch_geo_region(geo_stats_country):
+        """
+        Geo drill-down for the top country. Returns `(country, stats)`.
+        """
+        top_country = get_top_geo_name(geo_stats_country)
+        if not top_country:
+            logger.warning(
+                "No GEO_COUNTRY data available; cannot fetch GEO_REGION drill-down."
+            )
+            return None, {}
+        try:
+            geo_stats_region = connector.get_show_geo_stats(
+                show_uri=show_uri,
+                result_geo="GEO_REGION",
+                country=top_country,
+                start_date=START_DATE,
+                end_date=END_DATE,
+            )
+            logger.info(f"Fetched GEO_REGION drill-down for {top_country}.")
+        except Exception as exc:  # noqa: BLE001
+            logger.warning(
+                f"GEO drill-down fetch failed, keeping empty payloads: {exc}"
+            )
+            geo_stats_region = {}
+        return top_country, geo_stats_region
+
+    def fetch_all_time_episode_plays(raw_episodes):
+        logger.info("Fetching all-time plays per episode …")
+        episodes_with_uri = [ep for ep in raw_episodes if ep.get("uri")]
+        all_time_episode_plays = []
+        for ep, plays_data in zip(
+            episodes_with_uri,
+            map_concurrently(
+                lambda ep: connector.get_episode_plays_total(episode_uri=ep["uri"]),
+                episodes_with_uri,
+                concurrency,
+            ),
+        ):
+            if isinstance(plays_data, Exception):
+                logger.warning(
+                    f"Failed to fetch episode plays total for {ep['uri']}: {plays_data}"
+                )
+                continue
+            all_time_episode_plays.append(
+                {"uri": ep["uri"], "episode": ep, "plays_data": plays_data}
+            )
+        return all_time_episode_plays
+
+    def fetch_legacy_metadata(raw_episodes):
+        """
+        Look up the legacy Anchor metadata of all episodes (e.g. the web
+        episode ID like e215pm4) using the legacy API helper in
+        spotifygraphqlconnector. Returns the metadata by Spotify URI.
+        """
+        legacy_lookups = [
+            (episode.get("uri", ""), get_numeric_episode_id(episode))
+            for episode in raw_episodes
+        ]
+        legacy_lookups = [
+            (episode_uri, numeric_episode_id)
+            for episode_uri, numeric_episode_id in legacy_lookups
+            if episode_uri and numeric_episode_id is not None
+        ]
+        legacy_metadata_by_uri: dict[str, dict] = {}
+        for (episode_uri, numeric_episode_id), legacy in zip(
+            legacy_lookups,
+            map_concurrently(
+                lambda lookup: cached(
+                    "legacyWebId",
+                    lookup[1],
+                    lambda: connector.get_episode_legacy_web_id(lookup[1]),
+                ),
+                legacy_lookups,
+                concurrency,
+            ),
+        ):
+            if isinstance(legacy, Exception) or legacy is None:
+                logger.warning(
+                    f"Legacy web ID lookup failed for episode {numeric_episode_id} ({episode_uri}): {legacy}"
+                )
+                continue
+            legacy_metadata_by_uri[episode_uri] = legacy
+        return legacy_metadata_by_uri
+
+    def show_stats(method, **kwargs):
+        """
+        Task calling a show-level stats method for the date range.
+        """
+        return lambda: method(
+            show_uri=show_uri, start_date=START_DATE, end_date=END_DATE, **kwargs
+        )
+
+    # The calls only depend on each other where noted, so they all run at the
+    # same time and the pre-fetch takes as long as the longest chain of calls
+    # (episodes -> per-episode lookups) instead of the sum of all calls.
+    prefetched = run_graph(
+        {
+            "spotify_stats": (
+                show_stats(
+                    connector.get_show_spotify_stats, include_audience_size=True
+                ),
+                [],
+            ),
+            "platform_stats": (show_stats(connector.get_show_platform_stats), []),
+            "demographics_stats": (
+                show_stats(connector.get_show_demographics_stats),
+                [],
+            ),
+            "geo_stats_country": (
+                show_stats(connector.get_show_geo_stats, result_geo="GEO_COUNTRY"),
+                [],
+            ),
+            "geo_region": (fetch_geo_region, ["geo_stats_country"]),
+            "discovery_stats": (
+                show_stats(connector.get_show_audience_discovery),
+                [],
+            ),
+            "all_time_show_stats": (
+                lambda: connector.get_streams_and_downloads_all_time(show_uri=show_uri),
+                [],
+            ),
+            "raw_episodes": (connector.get_all_episodes, []),
+            "all_time_episode_plays": (
+                fetch_all_time_episode_plays,
+                ["raw_episodes"],
+            ),
+            "legacy_metadata_by_uri": (fetch_legacy_metadata, ["raw_episodes"]),
+        },
+        PREFETCH_CONCURRENCY,
+    )
+
+    spotify_stats = prefetched["spotify_stats"]
+    platform_stats = prefetched["platform_stats"]
+    demographics_stats = prefetched["demographics_stats"]
+    geo_stats_country = prefetched["geo_stats_country"]
+    geo_region_country, geo_stats_region = prefetched["geo_region"]
+    discovery_stats = prefetched["discovery_stats"]
+    all_time_show_stats = prefetched["all_time_show_stats"]
+    raw_episodes = prefetched["raw_episodes"]
+    all_time_episode_plays = prefetched["all_time_episode_plays"]
+    legacy_metadata_by_uri = prefetched["legacy_metadata_by_uri"]
+
+    # Build enrichment lookup so transforms can access episodeId, duration, etc.
+    episode_enrichment = {ep.get("uri", ""): ep for ep in raw_episodes}
+
+    # Build mapping from Spotify URI -> legacy Anchor web episode ID (e.g. e215pm4)
+    legacy_web_ids_by_uri: dict[str, str] = {
+        episode_uri: legacy["webEpisodeId"]
+        for episode_uri, legacy in legacy_metadata_by_uri.items()
+        if legacy.get("webEpisodeId")
+    }
+
+    logger.info(
+        f"Resolved legacy web IDs for {len(legacy_web_ids_by_uri)}/{len(raw_episodes)} episodes."
+    )
+
+    legacy_web_station_id = next(
+        (
+            meta.get("webStationId")
+            for meta in legacy_metadata_by_uri.values()
+            if meta.get("webStationId")
+        ),
+        "",
+    )
+
+    logger.info(f"Pre-fetch complete ({len(raw_episodes)} episodes).")
+
+    # ---------------------------------------------------------------------------
+    # Show-level endpoints
+    # ---------------------------------------------------------------------------
+
+    endpoints: list[FetchParams] = [
+        FetchParams(
+            openpodcast_endpoint="plays",
+            anchor_call=lambda: transform_plays(spotify_stats),
+            start_date=START_DATE,
+            end_date=END_DATE,
+        ),
+        FetchParams(
+            openpodcast_endpoint="playsByApp",
+            anchor_call=lambda: transform_plays_by_app(platform_stats),
+            start_date=START_DATE,
+            end_date=END_DATE,
+        ),
+        FetchParams(
+            openpodcast_endpoint="playsByDevice",
+            anchor_call=lambda: transform_plays_by_device(platform_stats),
+            start_date=START_DATE,
+            end_date=END_DATE,
+        ),
+        # Countries
+        FetchParams(
+            openpodcast_endpoint="playsByGeo",
+            anchor_call=lambda: transform_plays_by_geo(geo_stats_country),
+            start_date=START_DATE,
+            end_date=END_DATE,
+        ),
+        # endpoint is still called "byGeoCity" for legacy reasons, even though it now contains region-level data.
+        FetchParams(
+            openpodcast_endpoint="playsByGeoCity",
+            anchor_call=lambda: transform_plays_by_geo_region(
+                geo_stats_region,
+                country=geo_region_country,
+            ),
+            start_date=START_DATE,
+            end_date=END_DATE,
+        ),
+        FetchParams(
+            openpodcast_endpoint="playsByAgeRange",
+            anchor_call=lambda: transform_plays_by_age_range(demographics_stats),
+            start_date=START_DATE,
+            end_date=END_DATE,
+        ),
+        FetchParams(
+            openpodcast_endpoint="playsByGender",
+            anchor_call=lambda: transform_plays_by_gender(demographics_stats),
+            start_date=START_DATE,
+            end_date=END_DATE,
+        ),
+        FetchParams(
+            openpodcast_endpoint="uniqueListeners",
+            anchor_call=lambda: transform_unique_listeners(
+                discovery_stats,
+                fallback_graphql_data=spotify_stats,
+            ),
+            start_date=START_DATE,
+            end_date=END_DATE,
+        ),
+        FetchParams(
+            openpodcast_endpoint="audienceSize",
+            anchor_call=lambda: transform_audience_size(
+                discovery_stats,
+                fallback_graphql_data=spotify_stats,
+            ),
+            start_date=START_DATE,
+            end_date=END_DATE,
+        ),
+        FetchParams(
+            openpodcast_endpoint="totalPlays",
+            anchor_call=lambda: transform_total_plays(all_time_show_stats),
+            start_date=START_DATE,
+            end_date=END_DATE,
+        ),
+        FetchParams(
+            openpodcast_endpoint="totalPlaysByEpisode",
+            anchor_call=lambda: transform_total_plays_by_episode(
+                all_time_episode_plays, episode_enrichment=episode_enrichment
+            ),
+            start_date=START_DATE,
+            end_date=END_DATE,
+        ),
+    ]
+
+    # ---------------------------------------------------------------------------
+    # Episodes
+    # ---------------------------------------------------------------------------
+
+    all_episodes = transform_episodes_page(
+        raw_episodes,
+        legacy_web_ids_by_uri=legacy_web_ids_by_uri,
+        legacy_metadata_by_uri=legacy_metadata_by_uri,
+    )
+
+    logger.info(
+        f"Sending episodesPage data to Open Podcast ({len(all_episodes)} episodes)"
+    )
+    sink.post(
+        "episodesPage",
+        None,
+        all_episodes,
+        START_DATE,
+        END_DATE,
+    )
+
+    # episode_enrichment was already built during pre-fetch above.
+
+    planner = None
+    if STATE_DIR and not BACKFILL:
+        planner = ActivityPlanner(
+            Path(STATE_DIR) / "anchor.sqlite3",
+            show_uri,
+            dt.datetime.combine(END_DATE, dt.time()),
+            hot_days=EPISODE_HOT_DAYS,
+            cold_refresh_days=EPISODE_COLD_REFRESH_DAYS,
+        )
+    total_plays_by_uri = get_total_plays_by_uri(all_time_episode_plays)
+
+    # ---------------------------------------------------------------------------
+    # Per-episode endpoints
+    # ---------------------------------------------------------------------------
+
+    def generate_endpoints():
+        """
+        Generate the endpoints lazily, so only the endpoints in flight are
+        kept in memory. Endpoints which were stored today by an aborted run
+        are skipped.
+        """
+        yield from skip_completed(endpoints, COMPLETED_DOCUMENTS)
+
+        for episode in raw_episodes:
+            # Extract the Spotify episode URI directly from the episode dict.
+            episode_uri = episode.get("uri", "")
+            if not episode_uri:
+                logger.warning(f"Skipping episode without URI: {episode}")
+                continue
+
+            # Skip episodes without recent activity, they are refreshed less often
+            if planner is not None and not planner.should_refresh(
+                episode_uri,
+                get_episode_release_date(episode),
+                total_plays_by_uri.get(episode_uri),
+            ):
+                continue
+
+            legacy_web_id = legacy_web_ids_by_uri.get(episode_uri, episode_uri)
+            meta = {"episode": legacy_web_id}
+
+            episode_endpoints = [
+                FetchParams(
+                    openpodcast_endpoint="episodePlays",
+                    anchor_call=get_request_lambda(
+                        lambda uri=episode_uri: transform_episode_plays(
+                            connector.get_episode_streams_and_downloads(
+                                episode_uri=uri,
+                                start_date=START_DATE,
+                                end_date=END_DATE,
+                            ),
+                            uri,
+                        ),
+                    ),
+                    start_date=START_DATE,
+                    end_date=END_DATE,
+                    meta=meta,
+                ),
+                FetchParams(
+                    openpodcast_endpoint="episodePerformance",
+                    anchor_call=get_request_lambda(
+                        lambda uri=episode_uri: transform_episode_performance(
+                            connector.get_episode_performance_all_time(episode_uri=uri),
+                            uri,
+                        ),
+                    ),
+                    start_date=START_DATE,
+                    end_date=END_DATE,
+                    meta=meta,
+                ),
+                FetchParams(
+                    openpodcast_endpoint="aggregatedPerformance",
+                    anchor_call=get_request_lambda(
+                        lambda uri=episode_uri: transform_aggregated_performance(
+                            connector.get_episode_performance_all_time(episode_uri=uri),
+                            uri,
+                        ),
+                    ),
+                    start_date=START_DATE,
+                    end_date=END_DATE,
+                    meta=meta,
+                ),
+                FetchParams(
+                    openpodcast_endpoint="podcastEpisode",
+                    anchor_call=get_request_lambda(
+                        lambda uri=episode_uri: wrap_episode_metadata(
+                            cached(
+                                "podcastEpisode",
+                                uri,
+                                lambda: connector.get_episode_metadata_for_analytics(
+                                    episode_uri=uri
+                                ),
+                            ),
+                            uri,
+                            episode_enrichment=episode_enrichment,
+                            legacy_web_id=legacy_web_ids_by_uri.get(uri, uri),
+                            legacy_episode_data=legacy_metadata_by_uri.get(uri, {}),
+                            legacy_web_station_id=legacy_web_station_id,
+                        ),
+                    ),
+                    start_date=START_DATE,
+                    end_date=END_DATE,
+                    meta=meta,
+                ),
+            ]
+            yield from skip_completed(episode_endpoints, COMPLETED_DOCUMENTS)
+
+    # ---------------------------------------------------------------------------
+    # Execute via worker queue
+    # ---------------------------------------------------------------------------
+
+    if FETCH_MODE == ASYNCIO:
+        run_concurrently(
+            lambda params: fetch(post_sink, params), generate_endpoints(), concurrency
+        )
+    else:
+        # The workers stop once all endpoints are processed
+        with Executor(lambda params: fetch(post_sink, params), NUM_WORKERS) as executor:
+            executor.map(generate_endpoints())
+
+    # Send the remainder of the last batch
+    if isinstance(sink, BatchingSink):
+        sink.flush()
+    open_podcast.close()
+    logger.info(f"Served {connector.hits} connector calls from memory")
+    if GRAPHQL_BATCH_SIZE > 1:
+        logger.info(
+            f"Sent {connector.batched_queries} GraphQL queries in {connector.batches} batched requests"
+        )
+    if planner is not None:
+        planner.close()
+    if post_sink is not sink:
+        logger.info(f"Skipped {post_sink.skipped} unchanged metadata documents")
+    if metadata_cache is not None:
+        metadata_cache.close()
+
+    print("All items processed.")
@@ -0,0 +1,139 @@
+import threading
+import time
+from multiprocessing.managers import BaseManager
+from typing import Mapping, Optional
+
+from loguru import logger
+from spotifygraphqlconnector import SpotifyGraphQLConnector
+
+
+class TokenBucket:
+    """
+    Token bucket shared by all worker threads to stay within the rate limit
+    of an API (`requests` per `window` seconds).
+
+    Every request takes one token. Tokens are refilled continuously, so short
+    bursts of up to `burst` requests are possible, but the average rate never
+    exceeds the limit. If the API answers with HTTP 429 anyway, the rate is
+    halved and all threads wait for `Retry-After`. Successful requests raise
+    the rate again step by step until the configured rate is reached.
+    """
+
+    def __init__(
+        self,
+        requests: float,
+        window: float,
+        burst: Optional[float] = None,
+        min_rate: Optional[float] = None,
+    ):
+        self.max_rate = requests / window
+        self.rate = self.max_rate
+        self.min_rate = min_rate or self.max_rate / 16
+        self.burst = burst if burst is not None else max(1.0, requests / 4)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Take a token, waiting until one is available.
+        Returns the number of seconds waited.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0.0)
+            time.sleep(wait)
+            waited += wait
+
+    def penalize(self, retry_after: Optional[float] = None) -> None:
+        """
+        Slow down after the API answered with HTTP 429.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+            logger.warning(
+                f"Rate limited, slowing down to {self.rate * 60:.1f} requests per minute"
+            )
+
+    def reward(self) -> None:
+        """
+        Speed up again after a successful request.
+        """
+        with self.lock:
+            if self.rate < self.max_rate:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class BrokerClient(BaseManager):
+    pass
+
+
+BrokerClient.register("get_bucket")
+
+
+def connect_limiter(
+    config: Mapping[str, str], provider: str, requests: float, window: float
+):
+    """
+    Return the token bucket for `provider`.
+
+    If the pipeline is run by the connector manager, the bucket is shared by
+    all pipeline runs on this host via the manager's rate limit broker
+    (`RATE_LIMIT_BROKER_ADDRESS`). Otherwise, or if the broker cannot be
+    reached, a bucket local to this run is used.
+    """
+    address = config.get("RATE_LIMIT_BROKER_ADDRESS")
+    authkey = config.get("RATE_LIMIT_BROKER_AUTHKEY")
+    if address and authkey:
+        try:
+            host, port = address.rsplit(":", 1)
+            client = BrokerClient(
+                address=(host, int(port)), authkey=bytes.fromhex(authkey)
+            )
+            client.connect()
+            logger.info(f"Using shared rate limit for {provider} from {address}")
+            return client.get_bucket(provider, requests, window)
+        except (OSError, ValueError, EOFError) as e:
+            logger.warning(f"Cannot connect to rate limit broker at {address}: {e}")
+    return TokenBucket(requests, window)
+
+
+class RateLimitedGraphQLConnector(SpotifyGraphQLConnector):
+    """
+    SpotifyGraphQLConnector which takes a token from a shared `TokenBucket`
+    before every call to the Spotify Creators API (without a limiter, calls
+    are not limited).
+
+    Retries after HTTP 429 are still handled by the connector itself.
+    """
+
+    def __init__(self, *args, limiter: Optional[TokenBucket], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter
+
+    def _query(self, *args, **kwargs):
+        if self.limiter is not None:
+            self.limiter.acquire()
+        return super()._query(*args, **kwargs)
+
+    def get_episode_legacy_web_id(self, *args, **kwargs):
+        if self.limiter is not None:
+            self.limiter.acquire()
+        return super().get_episode_legacy_web_id(*args, **kwargs)
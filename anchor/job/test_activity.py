@@ -0,0 +1,81 @@
+import datetime as dt
+import tempfile
+import unittest
+from pathlib import Path
+
+from job.activity import COLD, HOT, WARM, ActivityPlanner
+
+TODAY = dt.datetime(2026, 7, 28)
+OLD = dt.datetime(2024, 1, 1)
+
+
+class TestActivityPlanner(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "anchor.sqlite3"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def planner(self, today=TODAY):
+        return ActivityPlanner(self.path, "show", today, cold_refresh_days=7)
+
+    def test_classify(self):
+        planner = self.planner()
+        planner.should_refresh("old", OLD, 100)
+        planner.close()
+
+        planner = self.planner()
+        self.assertEqual(planner.classify("new", TODAY - dt.timedelta(days=3), 5), HOT)
+        self.assertEqual(planner.classify("unknown", None, 5), HOT)
+        self.assertEqual(planner.classify("first-seen", OLD, 5), WARM)
+        self.assertEqual(planner.classify("old", OLD, 101), WARM)
+        self.assertEqual(planner.classify("old", OLD, 100), COLD)
+        self.assertEqual(planner.classify("old", OLD, None), WARM)
+        planner.close()
+
+    def test_cold_episodes_are_refreshed_weekly(self):
+        refreshed = []
+        for day in range(15):
+            planner = self.planner(TODAY + dt.timedelta(days=day))
+            if planner.should_refresh("old", OLD, 100):
+                refreshed.append(day)
+            planner.close()
+
+        self.assertEqual(refreshed, [0, 7, 14])
+
+    def test_active_episodes_are_refreshed_daily(self):
+        refreshed = []
+        for day in range(3):
+            planner = self.planner(TODAY + dt.timedelta(days=day))
+            refreshed.append(planner.should_refresh("old", OLD, 100 + day))
+            planner.close()
+
+        self.assertEqual(refreshed, [True, True, True])
+
+    def test_unknown_count_keeps_the_previous_count(self):
+        planner = self.planner()
+        planner.should_refresh("old", OLD, 100)
+        planner.close()
+
+        planner = self.planner(TODAY + dt.timedelta(days=1))
+        self.assertTrue(planner.should_refresh("old", OLD, None))
+        planner.close()
+
+        planner = self.planner(TODAY + dt.timedelta(days=2))
+        self.assertEqual(planner.classify("old", OLD, 100), COLD)
+        planner.close()
+
+    def test_previous_total(self):
+        planner = self.planner()
+        planner.should_refresh("old", OLD, 100)
+        planner.close()
+
+        planner = self.planner(TODAY + dt.timedelta(days=1))
+        self.assertEqual(planner.previous_total("old"), 100)
+        self.assertIsNone(planner.previous_total("new"))
+        planner.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
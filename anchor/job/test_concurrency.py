@@ -0,0 +1,142 @@
+import threading
+import time
+import unittest
+
+from job.concurrency import map_concurrently, run_concurrently, run_graph
+
+
+class TestMapConcurrently(unittest.TestCase):
+    def test_results_in_order(self):
+        self.assertEqual(
+            map_concurrently(lambda x: x * 2, range(20), concurrency=4),
+            [x * 2 for x in range(20)],
+        )
+
+    def test_sequential_without_concurrency(self):
+        threads = set()
+
+        def call(x):
+            threads.add(threading.get_ident())
+            return x
+
+        self.assertEqual(map_concurrently(call, [1, 2, 3]), [1, 2, 3])
+        self.assertEqual(threads, {threading.get_ident()})
+
+    def test_exceptions_are_returned(self):
+        def call(x):
+            if x == 1:
+                raise ValueError("failed")
+            return x
+
+        for concurrency in (1, 3):
+            results = map_concurrently(call, [0, 1, 2], concurrency)
+            self.assertEqual(results[0], 0)
+            self.assertIsInstance(results[1], ValueError)
+            self.assertEqual(results[2], 2)
+
+    def test_limits_calls_in_flight(self):
+        lock = threading.Lock()
+        in_flight = 0
+        max_in_flight = 0
+
+        def call(x):
+            nonlocal in_flight, max_in_flight
+            with lock:
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+            time.sleep(0.01)
+            with lock:
+                in_flight -= 1
+
+        map_concurrently(call, range(30), concurrency=5)
+        self.assertLessEqual(max_in_flight, 5)
+        self.assertGreater(max_in_flight, 1)
+
+
+class TestRunConcurrently(unittest.TestCase):
+    def test_items_are_taken_as_calls_start(self):
+        lock = threading.Lock()
+        generated = 0
+        done = 0
+        max_ahead = 0
+
+        def items():
+            nonlocal generated
+            for x in range(30):
+                with lock:
+                    generated += 1
+                yield x
+
+        def call(x):
+            nonlocal done, max_ahead
+            time.sleep(0.005)
+            with lock:
+                max_ahead = max(max_ahead, generated - done)
+                done += 1
+
+        run_concurrently(call, items(), concurrency=4)
+        self.assertEqual(done, 30)
+        self.assertLessEqual(max_ahead, 4)
+
+    def test_exceptions_do_not_stop_the_other_calls(self):
+        called = []
+
+        def call(x):
+            called.append(x)
+            if x == 1:
+                raise ValueError("failed")
+
+        run_concurrently(call, iter([0, 1, 2]), concurrency=2)
+        self.assertEqual(sorted(called), [0, 1, 2])
+
+
+class TestRunGraph(unittest.TestCase):
+    def test_passes_dependency_results(self):
+        results = run_graph(
+            {
+                "episodes": (lambda: [1, 2], []),
+                "country": (lambda: "DE", []),
+                "region": (lambda country: f"{country}-BE", ["country"]),
+                "total": (
+                    lambda episodes, region: (sum(episodes), region),
+                    ["episodes", "region"],
+                ),
+            },
+            max_workers=2,
+        )
+        self.assertEqual(results["region"], "DE-BE")
+        self.assertEqual(results["total"], (3, "DE-BE"))
+
+    def test_independent_tasks_run_concurrently(self):
+        barrier = threading.Barrier(3, timeout=2)
+        tasks = {name: (barrier.wait, []) for name in "abc"}
+        # would time out if the tasks ran one after another
+        self.assertEqual(len(run_graph(tasks, max_workers=3)), 3)
+
+    def test_raises_task_errors(self):
+        def fail():
+            raise ValueError("failed")
+
+        started = []
+        with self.assertRaises(ValueError):
+            run_graph(
+                {
+                    "a": (fail, []),
+                    "b": (lambda a: started.append(a), ["a"]),
+                },
+                max_workers=2,
+            )
+        self.assertEqual(started, [])
+
+    def test_invalid_dependencies(self):
+        with self.assertRaises(ValueError):
+            run_graph({"a": (lambda b: b, ["b"])}, max_workers=1)
+        with self.assertRaises(ValueError):
+            run_graph(
+                {"a": (lambda b: b, ["b"]), "b": (lambda a: a, ["a"])},
+                max_workers=1,
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
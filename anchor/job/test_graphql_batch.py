@@ -0,0 +1,173 @@
+import threading
+import unittest
+from unittest.mock import Mock, patch
+
+from spotifygraphqlconnector import SpotifyGraphQLConnector
+from spotifygraphqlconnector.types import CLIENT_PUBLIC
+
+from job.graphql_batch import BatchingGraphQLConnector
+
+
+def make_connector(**kwargs):
+    connector = BatchingGraphQLConnector(
+        sp_dc="dc", sp_key="key", show_uri=None, limiter=None, **kwargs
+    )
+    connector._ensure_auth = Mock()
+    connector._graphql_headers = Mock(return_value={})
+    return connector
+
+
+def query_concurrently(connector, uris):
+    results = {}
+
+    def query(uri):
+        results[uri] = connector._query(
+            "getEpisodePlaysTotal", {"episodeUri": uri}, CLIENT_PUBLIC
+        )
+
+    # another call in flight, so none of the queries is sent on its own
+    with connector._caller():
+        threads = [threading.Thread(target=query, args=(uri,)) for uri in uris]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return results
+
+
+def batch_response(request_body):
+    return Mock(
+        status_code=200,
+        json=Mock(
+            return_value=[
+                {"data": {"uri": query["variables"]["episodeUri"]}}
+                for query in request_body
+            ]
+        ),
+    )
+
+
+class TestBatchingGraphQLConnector(unittest.TestCase):
+    def test_concurrent_queries_are_batched(self):
+        connector = make_connector(batch_size=3, max_wait=5)
+        with patch(
+            "job.graphql_batch.requests.post",
+            side_effect=lambda url, json, **kwargs: batch_response(json),
+        ) as post:
+            results = query_concurrently(connector, ["a", "b", "c"])
+
+        post.assert_called_once()
+        self.assertEqual(len(post.call_args.kwargs["json"]), 3)
+        self.assertEqual(results, {uri: {"uri": uri} for uri in "abc"})
+        self.assertEqual(connector.batches, 1)
+
+    def test_partial_batch_is_sent_after_max_wait(self):
+        connector = make_connector(batch_size=10, max_wait=0.05)
+        with patch(
+            "job.graphql_batch.requests.post",
+            side_effect=lambda url, json, **kwargs: batch_response(json),
+        ):
+            results = query_concurrently(connector, ["a", "b"])
+
+        self.assertEqual(results, {uri: {"uri": uri} for uri in "ab"})
+
+    def test_falls_back_to_single_queries(self):
+        connector = make_connector(batch_size=2, max_wait=5)
+        with (
+            patch(
+                "job.graphql_batch.requests.post",
+                return_value=Mock(status_code=400),
+            ) as post,
+            patch.object(
+                SpotifyGraphQLConnector,
+                "_query",
+                side_effect=lambda name, variables, client: {"single": variables},
+            ) as single,
+        ):
+            results = query_concurrently(connector, ["a", "b"])
+            # batching stays disabled for the rest of the run
+            connector._query("getEpisodePlaysTotal", {"episodeUri": "c"}, CLIENT_PUBLIC)
+
+        post.assert_called_once()
+        self.assertEqual(single.call_count, 3)
+        self.assertFalse(connector.batch_supported)
+        self.assertEqual(results["a"], {"single": {"episodeUri": "a"}})
+
+    def test_errors_are_passed_to_all_queries_of_the_batch(self):
+        connector = make_connector(batch_size=2, max_wait=5)
+        connector._ensure_auth.side_effect = RuntimeError("credentials expired")
+        errors = []
+
+        def query(uri):
+            try:
+                connector._query(
+                    "getEpisodePlaysTotal", {"episodeUri": uri}, CLIENT_PUBLIC
+                )
+            except RuntimeError as e:
+                errors.append(e)
+
+        with patch("job.graphql_batch.requests.post") as post, connector._caller():
+            threads = [threading.Thread(target=query, args=(uri,)) for uri in "ab"]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=5)
+
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual(len(errors), 2)
+        post.assert_not_called()
+
+    def test_single_caller_does_not_wait_for_a_batch(self):
+        connector = make_connector(batch_size=2, max_wait=60)
+        with (
+            patch("job.graphql_batch.requests.post") as post,
+            patch.object(
+                SpotifyGraphQLConnector,
+                "_query",
+                side_effect=lambda name, variables, client: {"single": variables},
+            ) as single,
+        ):
+            # sequential calls, e.g. the pre-fetch loop of the threads mode
+            results = [
+                connector._query(
+                    "getEpisodePlaysTotal", {"episodeUri": uri}, CLIENT_PUBLIC
+                )
+                for uri in "ab"
+            ]
+
+        post.assert_not_called()
+        self.assertEqual(single.call_count, 2)
+        self.assertEqual(results[1], {"single": {"episodeUri": "b"}})
+
+    def test_streams_and_downloads_are_not_batched(self):
+        connector = make_connector(batch_size=2, max_wait=5)
+        with (
+            patch("job.graphql_batch.requests.post") as post,
+            patch.object(
+                SpotifyGraphQLConnector, "_query", return_value={"a": 1}
+            ) as single,
+            connector._caller(),
+        ):
+            connector._query(
+                "getEpisodeStreamsAndDownloads", {"episodeUri": "a"}, CLIENT_PUBLIC
+            )
+
+        post.assert_not_called()
+        single.assert_called_once()
+
+    def test_other_operations_are_not_batched(self):
+        connector = make_connector(batch_size=2, max_wait=5)
+        with (
+            patch("job.graphql_batch.requests.post") as post,
+            patch.object(
+                SpotifyGraphQLConnector, "_query", return_value={"a": 1}
+            ) as single,
+        ):
+            self.assertEqual(connector._query("getShowType", {}), {"a": 1})
+
+        post.assert_not_called()
+        single.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
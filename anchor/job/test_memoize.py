@@ -0,0 +1,94 @@
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+
+from job.memoize import Memoized
+
+
+class SlowConnector:
+    def __init__(self):
+        self.calls = []
+
+    def performance(self, episode_uri):
+        self.calls.append(episode_uri)
+        time.sleep(0.05)
+        return {"uri": episode_uri}
+
+
+class TestMemoized(unittest.TestCase):
+    def test_repeated_calls_are_served_from_memory(self):
+        target = Mock()
+        target.performance.return_value = {"a": 1}
+        connector = Memoized(target, ["performance"])
+
+        first = connector.performance(episode_uri="spotify:episode:1")
+        second = connector.performance(episode_uri="spotify:episode:1")
+        connector.performance(episode_uri="spotify:episode:2")
+
+        self.assertIs(first, second)
+        self.assertEqual(target.performance.call_count, 2)
+        self.assertEqual(connector.hits, 1)
+
+    def test_results_are_dropped_after_their_uses(self):
+        target = Mock()
+        connector = Memoized(target, ["performance"], uses=2)
+
+        connector.performance("episode")
+        connector.performance("episode")
+        self.assertEqual(connector._calls, {})
+
+        connector.performance("episode")
+        self.assertEqual(target.performance.call_count, 2)
+
+    def test_other_methods_are_not_cached(self):
+        target = Mock()
+        connector = Memoized(target, ["performance"])
+
+        connector.plays("episode")
+        connector.plays("episode")
+
+        self.assertEqual(target.plays.call_count, 2)
+        self.assertEqual(connector.hits, 0)
+
+    def test_concurrent_calls_are_deduplicated(self):
+        target = SlowConnector()
+        connector = Memoized(target, ["performance"], uses=4)
+        results = []
+
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(connector.performance("episode"))
+            )
+            for _ in range(4)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(target.calls, ["episode"])
+        self.assertEqual(results, [{"uri": "episode"}] * 4)
+
+    def test_errors_are_not_cached(self):
+        target = Mock()
+        target.episodes.side_effect = [ValueError("boom"), ["episode"]]
+        connector = Memoized(target, ["episodes"])
+
+        with self.assertRaises(ValueError):
+            connector.episodes()
+
+        self.assertEqual(connector.episodes(), ["episode"])
+
+    def test_unhashable_arguments_are_not_cached(self):
+        target = Mock()
+        connector = Memoized(target, ["query"])
+
+        connector.query({"id": 1})
+        connector.query({"id": 1})
+
+        self.assertEqual(target.query.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
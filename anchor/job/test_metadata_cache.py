@@ -0,0 +1,51 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock
+
+from job.metadata_cache import DAY, ChangedOnlySink, MetadataCache, parse_ttls
+from job.pipeline import CHANGED_ONLY_ENDPOINTS, METADATA_CACHE_TTL_DAYS
+
+# The cache itself is tested in the Spotify pipeline, which has the same
+# job/metadata_cache.py. These tests cover the endpoints of this pipeline.
+
+
+class TestMetadataCacheEndpoints(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = MetadataCache(Path(self.tmp.name) / "anchor.sqlite3", "show", {})
+        self.target = Mock()
+        self.target.post.side_effect = lambda *args, on_success=None: (
+            on_success and on_success()
+        )
+        self.sink = ChangedOnlySink(
+            self.target, self.cache, CHANGED_ONLY_ENDPOINTS, DAY
+        )
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def post_twice(self, endpoint):
+        for _ in range(2):
+            self.sink.post(
+                endpoint, {"episode": "ep1"}, {"a": 1}, "2026-07-01", "2026-07-03"
+            )
+
+    def test_unchanged_podcast_episode_is_sent_once(self):
+        self.post_twice("podcastEpisode")
+        self.assertEqual(self.target.post.call_count, 1)
+
+    def test_episode_plays_is_always_sent(self):
+        self.post_twice("episodePlays")
+        self.assertEqual(self.target.post.call_count, 2)
+
+    def test_default_ttls(self):
+        self.assertEqual(
+            parse_ttls(None, METADATA_CACHE_TTL_DAYS),
+            {"legacyWebId": 30 * DAY, "podcastEpisode": 7 * DAY},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from spotifygraphqlconnector import SpotifyGraphQLConnector
+
+from job.rate_limit import RateLimitedGraphQLConnector, TokenBucket, connect_limiter
+
+
+class TestRateLimitedGraphQLConnector(unittest.TestCase):
+    def test_acquires_token_before_query(self):
+        limiter = Mock(spec=TokenBucket)
+        connector = RateLimitedGraphQLConnector(
+            sp_dc="dc", sp_key="key", show_uri=None, limiter=limiter
+        )
+        with patch.object(
+            SpotifyGraphQLConnector, "_query", return_value={"a": 1}
+        ) as mock_query:
+            result = connector._query("GetEpisodes", {"id": 1})
+
+        self.assertEqual(result, {"a": 1})
+        limiter.acquire.assert_called_once()
+        mock_query.assert_called_once_with("GetEpisodes", {"id": 1})
+
+    def test_local_bucket_without_broker(self):
+        self.assertIsInstance(connect_limiter({}, "anchor", 20, 30), TokenBucket)
+
+
+if __name__ == "__main__":
+    unittest.main()
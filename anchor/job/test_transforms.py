@@ -1,6 +1,12 @@
 import unittest
+from datetime import datetime, timezone
 
-from job.transforms import transform_plays_by_age_range, transform_plays_by_gender
+from job.transforms import (
+    _date_to_unix,
+    get_total_plays_by_uri,
+    transform_plays_by_age_range,
+    transform_plays_by_gender,
+)
 
 
 class TestDemographicTransforms(unittest.TestCase):
@@ -43,5 +49,31 @@ class TestDemographicTransforms(unittest.TestCase):
         self.assertEqual(transformed["data"]["rows"], [])
 
 
+class TestTotalPlaysByUri(unittest.TestCase):
+    def test_get_total_plays_by_uri(self):
+        plays = [
+            {"uri": "spotify:episode:a", "plays_data": {"total": 12}},
+            {"uri": "spotify:episode:b", "plays_data": {}},
+        ]
+
+        self.assertEqual(
+            get_total_plays_by_uri(plays),
+            {"spotify:episode:a": 12, "spotify:episode:b": None},
+        )
+
+
+class TestDateToUnix(unittest.TestCase):
+    def test_utc_midnight(self):
+        for date_str in ("1970-01-01", "2024-02-29", "2026-07-28"):
+            expected = datetime.strptime(date_str, "%Y-%m-%d").replace(
+                tzinfo=timezone.utc
+            )
+            self.assertEqual(_date_to_unix(date_str), expected.timestamp())
+
+    def test_invalid_date(self):
+        with self.assertRaises(ValueError):
+            _date_to_unix("2026-02-30")
+
+
 if __name__ == "__main__":
     unittest.main()
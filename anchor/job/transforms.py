@@ -7,7 +7,10 @@ Each function takes the raw GraphQL response dict and returns only the
 open_podcast.py).
 """
 
-from datetime import datetime, timezone
+import functools
+from datetime import date
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
 
 
 # ---------------------------------------------------------------------------
@@ -15,11 +18,13 @@ from datetime import datetime, timezone
 # ---------------------------------------------------------------------------
 
 
+@functools.lru_cache(maxsize=4096)
 def _date_to_unix(date_str: str) -> int:
-    """Convert a 'YYYY-MM-DD' date string to a Unix timestamp (UTC midnight)."""
-    return int(
-        datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
-    )
+    """
+    Convert a 'YYYY-MM-DD' date string to a Unix timestamp (UTC midnight).
+    The same dates occur in the series of every episode, so they are cached.
+    """
+    return (date.fromisoformat(date_str).toordinal() - _EPOCH_ORDINAL) * 86400
 
 
 def _extract_time_series_points(graphql_data: dict, *path_keys: str) -> list[dict]:
@@ -482,6 +487,16 @@ def transform_total_plays(graphql_data: dict) -> dict:
     }
 
 
+def get_total_plays_by_uri(all_time_episode_plays: list[dict]) -> dict[str, int]:
+    """
+    ``{uri: all-time plays}`` lookup from the items of get_episode_plays_total.
+    """
+    return {
+        item.get("uri", ""): _find_integer_value(item.get("plays_data", {}))
+        for item in all_time_episode_plays
+    }
+
+
 def transform_total_plays_by_episode(
     all_time_episode_plays: list[dict],
     episode_enrichment: dict | None = None,
@@ -1,23 +1,14 @@
-import queue
-
 import requests
 from loguru import logger
 
+from job.batch import BatchingSink
 from job.fetch_params import FetchParams
 from job.open_podcast import OpenPodcastConnector
 
 
-def worker(q: queue.Queue, openpodcast: OpenPodcastConnector) -> None:
-    """
-    A worker thread that fetches data from the Anchor API
-    """
-    while True:
-        params = q.get()
-        fetch(openpodcast, params)
-        q.task_done()
-
-
-def fetch(openpodcast: OpenPodcastConnector, params: FetchParams) -> None:
+def fetch(
+    openpodcast: OpenPodcastConnector | BatchingSink, params: FetchParams
+) -> None:
     """
     Fetches data from the Anchor API and sends it to the Open Podcast API
     """
@@ -32,7 +23,9 @@ def fetch(openpodcast: OpenPodcastConnector, params: FetchParams) -> None:
                 params.start_date,
                 params.end_date,
             )
-            logger.debug(f"Response: {response.status_code} - {response.text}")
+            # Batched documents are sent later, so there is no response yet
+            if response is not None:
+                logger.debug(f"Response: {response.status_code} - {response.text}")
     except requests.exceptions.HTTPError as e:
         logger.error(e)
         return
@@ -0,0 +1,146 @@
+import threading
+import time
+
+from loguru import logger
+
+from job.open_podcast import OpenPodcastConnector
+
+# Status codes which indicate that the API does not support batched ingestion.
+# In that case, all documents are sent one by one to `/connector` instead.
+BATCH_UNSUPPORTED_STATUS_CODES = (404, 405, 501)
+
+
+class BatchingSink:
+    """
+    Collects payloads for the Open Podcast API and sends them as a single
+    multi-document request to `/connector/batch`.
+
+    The sink has the same `post` signature as `OpenPodcastConnector`, so it
+    can be passed to the workers instead of the connector. A batch is sent
+    as soon as it holds `max_items` documents, exceeds `max_bytes` or its
+    oldest document is older than `max_wait` seconds. Call `flush` once all
+    workers are done to send the remainder.
+
+    The API answers with one status per document
+    (`{"results": [{"status": 200}, ...]}`), so failures can still be
+    attributed to a single endpoint.
+    """
+
+    def __init__(
+        self,
+        openpodcast: OpenPodcastConnector,
+        max_items: int = 50,
+        max_bytes: int = 4 * 1024 * 1024,
+        max_wait: float = 30.0,
+    ):
+        self.openpodcast = openpodcast
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.max_wait = max_wait
+        self.supported = True
+        self.lock = threading.Lock()
+        self.items = []
+        self.size = 0
+        self.oldest = None
+
+    def post(self, endpoint, extra_meta, data, start, end, on_success=None):
+        """
+        Add a document to the current batch and send the batch if it is full.
+        `on_success` is called once the document was stored.
+        """
+        description = f"`{endpoint}` [{start} - {end}]"
+        if extra_meta and "episode" in extra_meta:
+            description += f" for episode {extra_meta['episode']}"
+        logger.info(f"Queueing {description}")
+
+        payload = self.openpodcast.build_payload(endpoint, extra_meta, data, start, end)
+        body = self.openpodcast.encode(payload)
+
+        with self.lock:
+            self.items.append((description, body, on_success))
+            self.size += len(body)
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+            if not self._is_full():
+                return None
+            items = self._take()
+
+        self._send(items)
+        return None
+
+    def flush(self) -> None:
+        """
+        Send all queued documents.
+        """
+        with self.lock:
+            items = self._take()
+        if items:
+            self._send(items)
+
+    def _is_full(self) -> bool:
+        return (
+            len(self.items) >= self.max_items
+            or self.size >= self.max_bytes
+            or time.monotonic() - self.oldest >= self.max_wait
+        )
+
+    def _take(self) -> list:
+        items = self.items
+        self.items = []
+        self.size = 0
+        self.oldest = None
+        return items
+
+    def _send(self, items: list) -> None:
+        if self.supported:
+            logger.info(f"Storing batch of {len(items)} documents")
+            body = b"[" + b",".join(body for _, body, _ in items) + b"]"
+            response = self.openpodcast.send("connector/batch", body)
+            if response.status_code not in BATCH_UNSUPPORTED_STATUS_CODES:
+                self._check_results(items, response)
+                return
+            logger.warning(
+                f"Batched ingestion not supported (status code {response.status_code}), "
+                "falling back to single requests"
+            )
+            self.supported = False
+
+        for description, body, on_success in items:
+            logger.info(f"Storing {description}")
+            response = self.openpodcast.send("connector", body)
+            if response.status_code != 200:
+                logger.error(
+                    f"Failed to store {description} with status code {response.status_code} and response {response.text}"
+                )
+            elif on_success is not None:
+                on_success()
+
+    def _check_results(self, items: list, response) -> None:
+        """
+        Log every document of the batch that was not stored.
+        """
+        if response.status_code != 200:
+            for description, _, _ in items:
+                logger.error(
+                    f"Failed to store {description} with status code {response.status_code} and response {response.text}"
+                )
+            return
+
+        try:
+            results = response.json()["results"]
+        except (ValueError, KeyError, TypeError):
+            results = None
+        if not isinstance(results, list) or len(results) != len(items):
+            logger.error(
+                f"Unexpected response for batch of {len(items)} documents: {response.text}"
+            )
+            return
+
+        for (description, _, on_success), result in zip(items, results):
+            status = result.get("status") if isinstance(result, dict) else None
+            if status != 200:
+                logger.error(
+                    f"Failed to store {description} with status code {status} and response {result}"
+                )
+            elif on_success is not None:
+                on_success()
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import types
+from pathlib import Path
+from typing import Any, Callable, Collection, Dict, Mapping, Optional
+
+from loguru import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cached_responses (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    value TEXT NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS posted_digests (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    posted_at REAL NOT NULL
+);
+"""
+
+DAY = 24 * 60 * 60
+
+
+def parse_ttls(value: Optional[str], defaults: Mapping[str, float]) -> Dict[str, float]:
+    """
+    Parse time-to-live overrides in days per endpoint, e.g.
+    `episodeMetadata=7,episodeDetails=14`, on top of `defaults`.
+    Returns the time-to-live in seconds per endpoint.
+    """
+    ttls = dict(defaults)
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        endpoint, _, days = item.partition("=")
+        try:
+            ttls[endpoint.strip()] = float(days)
+        except ValueError:
+            logger.warning(f"Invalid cache TTL `{item}`, ignoring it")
+    return {endpoint: days * DAY for endpoint, days in ttls.items()}
+
+
+class MetadataCache:
+    """
+    On-disk cache for data that rarely changes, like episode metadata,
+    shared by all runs that use the same directory.
+
+    - `cached` returns the stored API response of a call if it is younger
+      than the time-to-live of its endpoint (`ttls`), so the API is not
+      called again. Endpoints without a time-to-live are not cached.
+    - `is_posted` / `mark_posted` remember a hash of the last document sent
+      to the Open Podcast API, so unchanged documents need not be sent again.
+
+    Entries are keyed by a hash of the scope (e.g. the podcast), the endpoint
+    and the arguments of the call.
+    """
+
+    def __init__(self, path: Path, scope: str, ttls: Mapping[str, float]):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.scope = scope
+        self.ttls = dict(ttls)
+        self.hits = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(
+            str(path), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def cached(self, endpoint: str, key: Any, call: Callable[[], Any]) -> Any:
+        """
+        Return the stored result of `call` or call it and store the result.
+        Failed calls, empty results (None) and results which are not JSON
+        are not stored.
+        """
+        ttl = self.ttls.get(endpoint)
+        if not ttl:
+            return call()
+
+        cache_key = self._key(endpoint, key)
+        with self.lock:
+            row = self.db.execute(
+                "SELECT value, stored_at FROM cached_responses WHERE key = ?",
+                (cache_key,),
+            ).fetchone()
+        if row is not None and time.time() - row[1] < ttl:
+            self.hits += 1
+            return json.loads(row[0])
+
+        value = call()
+        if value is None:
+            return value
+        try:
+            encoded = json.dumps(value)
+        except (TypeError, ValueError):
+            return value
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO cached_responses VALUES (?, ?, ?, ?)",
+                (cache_key, endpoint, encoded, time.time()),
+            )
+        return value
+
+    def is_posted(self, endpoint: str, key: Any, digest: str, max_age: float) -> bool:
+        """
+        Whether a document with this digest was sent within `max_age` seconds.
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT digest, posted_at FROM posted_digests WHERE key = ?",
+                (self._key(endpoint, key),),
+            ).fetchone()
+        return row is not None and row[0] == digest and time.time() - row[1] < max_age
+
+    def mark_posted(self, endpoint: str, key: Any, digest: str) -> None:
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO posted_digests VALUES (?, ?, ?, ?)",
+                (self._key(endpoint, key), endpoint, digest, time.time()),
+            )
+
+    def close(self) -> None:
+        logger.info(f"Served {self.hits} API calls from the metadata cache")
+        with self.lock:
+            self.db.close()
+
+    def _key(self, endpoint: str, key: Any) -> str:
+        return _sha256([self.scope, endpoint, key])
+
+
+def digest(data: Any) -> Optional[str]:
+    """
+    Hash of a document, None if it cannot be hashed (e.g. a generator).
+    """
+    if isinstance(data, types.GeneratorType):
+        return None
+    try:
+        return _sha256(data)
+    except (TypeError, ValueError):
+        return None
+
+
+def _sha256(value: Any) -> str:
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ChangedOnlySink:
+    """
+    Wraps the Open Podcast connector (or a `BatchingSink`) and only sends
+    documents of the given endpoints if they changed since they were last
+    stored. Unchanged documents are sent again after `max_age` seconds.
+    """
+
+    def __init__(
+        self, sink, cache: MetadataCache, endpoints: Collection[str], max_age: float
+    ):
+        self.sink = sink
+        self.cache = cache
+        self.endpoints = set(endpoints)
+        self.max_age = max_age
+        self.skipped = 0
+
+    def post(self, endpoint, extra_meta, data, start, end, on_success=None):
+        data_digest = digest(data) if endpoint in self.endpoints else None
+        if data_digest is None:
+            return self.sink.post(
+                endpoint, extra_meta, data, start, end, on_success=on_success
+            )
+
+        if self.cache.is_posted(endpoint, extra_meta, data_digest, self.max_age):
+            logger.info(f"Skipping unchanged `{endpoint}` {extra_meta or ''}")
+            self.skipped += 1
+            return None
+
+        def mark_posted():
+            self.cache.mark_posted(endpoint, extra_meta, data_digest)
+            if on_success is not None:
+                on_success()
+
+        return self.sink.post(
+            endpoint, extra_meta, data, start, end, on_success=mark_posted
+        )
@@ -0,0 +1,337 @@
+import sys
+import datetime as dt
+from pathlib import Path
+from time import sleep
+from typing import Mapping
+
+from job.executor import Executor
+from job.fetch_params import FetchParams, parse_completed, skip_completed
+from job.worker import fetch
+from job.batch import BatchingSink
+from job.open_podcast import OpenPodcastConnector
+from job.load_env import load_file_or_env
+from job.load_env import load_env
+from job.dates import get_date_range
+from job.memoize import Memoized
+from job.metadata_cache import DAY, ChangedOnlySink, MetadataCache, parse_ttls
+import job.apple as apple
+
+from loguru import logger
+from appleconnector import AppleConnector, Metric, Dimension
+
+# Endpoints which are only sent if they changed with POST_ONLY_IF_CHANGED
+CHANGED_ONLY_ENDPOINTS = ("episodeDetails",)
+
+
+def get_request_lambda(f, *args, **kwargs):
+    """
+    Capture arguments in the closure so we can use them later in the call
+    to ensure call by value and not call by reference.
+    """
+    return lambda: f(*args, **kwargs)
+
+
+def run(config: Mapping[str, str]) -> None:
+    """
+    Fetch all data for one podcast from Apple and send it to the Open Podcast API.
+
+    `config` holds the settings that are read from the environment when the
+    pipeline is started as `python -m job`. Exits via `sys.exit` if the
+    configuration is invalid.
+    """
+    print("Initializing environment")
+
+    # endpoint to receive apple cookie to access podcasters API
+    APPLE_AUTOMATION_ENDPOINT = load_file_or_env(
+        "APPLE_AUTOMATION_ENDPOINT", env=config
+    )
+    APPLE_AUTOMATION_BEARER_TOKEN = load_file_or_env(
+        "APPLE_AUTOMATION_BEARER_TOKEN", env=config
+    )
+
+    # ID of the podcast we want to fetch data for
+    APPLE_PODCAST_ID = load_file_or_env("APPLE_PODCAST_ID", env=config)
+
+    # if APPLE_PODCAST_ID is not set, try to use PODCAST_ID instead
+    # this is used by the connector manager to be more generic
+    if not APPLE_PODCAST_ID:
+        APPLE_PODCAST_ID = load_file_or_env("PODCAST_ID", env=config)
+
+    # Open Podcast API endpoint and token to submit data fetched from the spotify endpoint
+    OPENPODCAST_API_ENDPOINT = config.get(
+        "OPENPODCAST_API_ENDPOINT", "https://api.openpodcast.dev"
+    )
+    OPENPODCAST_API_TOKEN = load_file_or_env("OPENPODCAST_API_TOKEN", env=config)
+
+    # Number of documents sent per request to the Open Podcast API.
+    # Batching needs `/connector/batch` support on the API side and is disabled
+    # by default (with a value of 1 or lower, every document is sent on its own).
+    OPENPODCAST_BATCH_SIZE = int(config.get("OPENPODCAST_BATCH_SIZE", "0"))
+    OPENPODCAST_BATCH_MAX_BYTES = int(
+        config.get("OPENPODCAST_BATCH_MAX_BYTES", str(4 * 1024 * 1024))
+    )
+    OPENPODCAST_BATCH_MAX_WAIT = float(config.get("OPENPODCAST_BATCH_MAX_WAIT", "30"))
+
+    # Content coding for large request bodies: `gzip` (default) or `none`
+    OPENPODCAST_COMPRESSION = config.get("OPENPODCAST_COMPRESSION", "gzip").lower()
+
+    # Number of worker threads to fetch data from the Apple API by default
+    NUM_WORKERS = int(config.get("NUM_WORKERS", "1"))
+
+    # Documents which were already stored today, set by the connector manager
+    # when it resumes an aborted run. They are not fetched again.
+    COMPLETED_DOCUMENTS = parse_completed(config.get("COMPLETED_DOCUMENTS", ""))
+
+    # Directory of an on-disk cache shared between runs. API responses are
+    # reused for the number of days per endpoint in METADATA_CACHE_TTLS
+    # (e.g. `episodeDetails=1`). Nothing is cached by default, as the episode
+    # details include the all-time analytics of the episode.
+    METADATA_CACHE_DIR = load_env("METADATA_CACHE_DIR", env=config)
+    METADATA_CACHE_TTLS = parse_ttls(config.get("METADATA_CACHE_TTLS"), {})
+
+    # Only send episode details which changed since they were last stored.
+    # Unchanged documents are sent again after POST_UNCHANGED_AFTER_DAYS days.
+    POST_ONLY_IF_CHANGED = config.get("POST_ONLY_IF_CHANGED", "").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+    POST_UNCHANGED_AFTER_DAYS = float(config.get("POST_UNCHANGED_AFTER_DAYS", "7"))
+
+    # Apple seems to be ok without a delay between requests
+    TASK_DELAY = float(config.get("TASK_DELAY", 0))
+
+    # Start- and end-date for the data we want to fetch
+    # Load from environment variable if set, otherwise set to defaults
+    START_DATE = load_env(
+        "START_DATE",
+        (dt.datetime.now() - dt.timedelta(days=7)).strftime("%Y-%m-%d"),
+        env=config,
+    )
+    END_DATE = load_env(
+        "END_DATE", (dt.datetime.now()).strftime("%Y-%m-%d"), env=config
+    )
+
+    # Due to weird behaviour of the Apple API when fetching just a few days,
+    # extend the date range to 30 days if shorter
+    if (
+        dt.datetime.strptime(END_DATE, "%Y-%m-%d")
+        - dt.datetime.strptime(START_DATE, "%Y-%m-%d")
+    ).days < 30:
+        START_DATE = (
+            dt.datetime.strptime(END_DATE, "%Y-%m-%d") - dt.timedelta(days=30)
+        ).strftime("%Y-%m-%d")
+        print(
+            f"Date range too short, extending to 30 days. New start date: {START_DATE}"
+        )
+
+    # The trends API supports historical data imports with daily resolution
+    # up to 4 months in the past.
+    # If we want to import a longer date-range, we split the date range into chunks
+    # of 4 months to fetch the data in multiple requests.
+    # This allows us to fetch the data quicker and avoid hitting the rate limit.
+    DAYS_PER_CHUNK = int(config.get("DAYS_PER_CHUNK", str(4 * 30)))
+
+    date_range = get_date_range(START_DATE, END_DATE)
+
+    # check if all needed environment variables are set
+    required_vars = {
+        "APPLE_AUTOMATION_ENDPOINT": APPLE_AUTOMATION_ENDPOINT,
+        "APPLE_AUTOMATION_BEARER_TOKEN": APPLE_AUTOMATION_BEARER_TOKEN,
+        "APPLE_PODCAST_ID": APPLE_PODCAST_ID,
+        "OPENPODCAST_API_TOKEN": OPENPODCAST_API_TOKEN,
+    }
+    missing_vars = [name for name, value in required_vars.items() if value is None]
+
+    if len(missing_vars):
+        logger.error(
+            f"Missing required environment variables:  {', '.join(missing_vars)}. Exiting..."
+        )
+        sys.exit(1)
+
+    print("Done initializing environment")
+    print("Import date range: ", date_range)
+
+    open_podcast = OpenPodcastConnector(
+        OPENPODCAST_API_ENDPOINT,
+        OPENPODCAST_API_TOKEN,
+        APPLE_PODCAST_ID,
+        pool_size=NUM_WORKERS,
+        compression=OPENPODCAST_COMPRESSION,
+    )
+
+    # Check that the Open Podcast API is healthy
+    response = open_podcast.health()
+    if response.status_code != 200:
+        logger.error(
+            f"Open Podcast API healthcheck failed with status code {response.status_code}"
+        )
+        sys.exit(1)
+
+    # Send documents in batches if enabled, otherwise post them one by one
+    sink = open_podcast
+    if OPENPODCAST_BATCH_SIZE > 1:
+        sink = BatchingSink(
+            open_podcast,
+            max_items=OPENPODCAST_BATCH_SIZE,
+            max_bytes=OPENPODCAST_BATCH_MAX_BYTES,
+            max_wait=OPENPODCAST_BATCH_MAX_WAIT,
+        )
+
+    metadata_cache = None
+    post_sink = sink
+    if METADATA_CACHE_DIR:
+        metadata_cache = MetadataCache(
+            Path(METADATA_CACHE_DIR) / "apple.sqlite3",
+            APPLE_PODCAST_ID,
+            METADATA_CACHE_TTLS,
+        )
+        # A resumed run sends everything, so today's number of updates
+        # catches up with yesterday's and the run is not repeated again
+        if POST_ONLY_IF_CHANGED and not COMPLETED_DOCUMENTS:
+            post_sink = ChangedOnlySink(
+                sink,
+                metadata_cache,
+                CHANGED_ONLY_ENDPOINTS,
+                POST_UNCHANGED_AFTER_DAYS * DAY,
+            )
+
+    logger.info(
+        f"Receiving cookies from Apple from automation endpoint {APPLE_AUTOMATION_ENDPOINT}"
+    )
+    cookies = apple.get_cookies(
+        APPLE_AUTOMATION_BEARER_TOKEN, APPLE_AUTOMATION_ENDPOINT, APPLE_PODCAST_ID
+    )
+
+    # The episode list is used as an endpoint and for the episode IDs, the
+    # second call is served from memory
+    apple_connector = Memoized(
+        AppleConnector(
+            podcast_id=APPLE_PODCAST_ID,
+            myacinfo=cookies.myacinfo,
+            itctx=cookies.itctx,
+        ),
+        ["episodes"],
+    )
+
+    def cached_call(endpoint, key, f):
+        """
+        Call `f(key)`, with the result from the metadata cache if enabled
+        """
+        if metadata_cache is None:
+            return f(key)
+        return metadata_cache.cached(endpoint, key, lambda: f(key))
+
+    # Define a list of FetchParams objects with the parameters for each API call
+    endpoints = []
+
+    for chunk_id, (start_date, end_date) in enumerate(
+        date_range.chunks(DAYS_PER_CHUNK)
+    ):
+        print(f"Chunk {chunk_id} from {start_date} to {end_date}...")
+        endpoints += [
+            FetchParams(
+                openpodcast_endpoint="showTrends/Followers",
+                call=get_request_lambda(
+                    apple_connector.trends,
+                    start_date,
+                    end_date,
+                    metric=Metric.FOLLOWERS,
+                ),
+                start_date=start_date,
+                end_date=end_date,
+                meta={"metric": Metric.FOLLOWERS},
+            ),
+            FetchParams(
+                openpodcast_endpoint="showTrends/Listeners",
+                call=get_request_lambda(
+                    apple_connector.trends,
+                    start_date,
+                    end_date,
+                    metric=Metric.LISTENERS,
+                    dimension=Dimension.BY_EPISODES,
+                ),
+                start_date=start_date,
+                end_date=end_date,
+                meta={
+                    "metric": Metric.LISTENERS,
+                    "dimension": Dimension.BY_EPISODES,
+                },
+            ),
+            # fetch podcast listening time grouped by (non)followers
+            FetchParams(
+                openpodcast_endpoint="showTrends/ListeningTimeFollowerState",
+                call=get_request_lambda(
+                    apple_connector.trends,
+                    start_date,
+                    end_date,
+                    metric=Metric.TIME_LISTENED,
+                    dimension=Dimension.BY_FOLLOW_STATE,
+                ),
+                start_date=start_date,
+                end_date=end_date,
+                meta={
+                    "metric": Metric.TIME_LISTENED,
+                    "dimension": Dimension.BY_FOLLOW_STATE,
+                },
+            ),
+        ]
+
+    endpoints += [
+        FetchParams(
+            openpodcast_endpoint="episodes",
+            call=lambda: apple_connector.episodes(),
+            start_date=date_range.start,
+            end_date=date_range.end,
+        ),
+    ]
+
+    # Fetch all episodes to get the episode IDs
+    # for which we want to fetch data
+    episodes = apple.get_episode_ids(apple_connector)
+
+    for episode_id in episodes:
+        endpoints += [
+            FetchParams(
+                openpodcast_endpoint="episodeDetails",
+                call=get_request_lambda(
+                    cached_call,
+                    "episodeDetails",
+                    episode_id,
+                    apple_connector.episode,
+                ),
+                start_date=date_range.start,
+                end_date=date_range.end,
+                meta={
+                    "episode": episode_id,
+                },
+            ),
+        ]
+
+    # Skip endpoints which were stored today by an aborted run
+    endpoints = skip_completed(endpoints, COMPLETED_DOCUMENTS)
+
+    def fetch_and_wait(params):
+        """
+        Fetch an endpoint and wait TASK_DELAY seconds before the worker takes
+        the next one, to stay below the rate limit of the Apple API.
+        """
+        fetch(post_sink, params)
+        sleep(TASK_DELAY)
+
+    # Process the FetchParams objects on a pool of worker threads. The workers
+    # stop once all endpoints are processed
+    with Executor(fetch_and_wait, NUM_WORKERS) as executor:
+        executor.map(endpoints)
+
+    # Send the remainder of the last batch
+    if isinstance(sink, BatchingSink):
+        sink.flush()
+    open_podcast.close()
+    logger.info(f"Served {apple_connector.hits} connector calls from memory")
+    if post_sink is not sink:
+        logger.info(f"Skipped {post_sink.skipped} unchanged metadata documents")
+    if metadata_cache is not None:
+        metadata_cache.close()
+
+    print("All items processed.")
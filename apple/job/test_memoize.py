@@ -0,0 +1,33 @@
+import unittest
+from unittest.mock import Mock
+
+from job.memoize import Memoized
+
+
+class TestMemoized(unittest.TestCase):
+    def test_episode_list_is_fetched_once(self):
+        target = Mock()
+        target.episodes.return_value = {"data": []}
+        connector = Memoized(target, ["episodes"])
+
+        first = connector.episodes()
+        second = connector.episodes()
+
+        self.assertIs(first, second)
+        self.assertEqual(target.episodes.call_count, 1)
+        self.assertEqual(connector.hits, 1)
+        # the list is not kept after its second use
+        self.assertEqual(connector._calls, {})
+
+    def test_trends_are_not_cached(self):
+        target = Mock()
+        connector = Memoized(target, ["episodes"])
+
+        connector.trends("2026-07-01", "2026-07-28", metric="PLAYS")
+        connector.trends("2026-07-01", "2026-07-28", metric="PLAYS")
+
+        self.assertEqual(target.trends.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import datetime as dt
+import json
+import unittest
+from unittest.mock import Mock, patch
+
+from job.batch import BatchingSink
+from job.open_podcast import OpenPodcastConnector
+
+# The connector and the batching sink are tested in the Spotify pipeline, which
+# has the same job/open_podcast.py and job/batch.py. These tests cover the
+# documents of this pipeline.
+
+
+class TestOpenPodcastProvider(unittest.TestCase):
+    def setUp(self):
+        self.connector = OpenPodcastConnector(
+            "https://api.example.com", "token", "podcast-id"
+        )
+        self.start = dt.datetime(2026, 7, 22)
+        self.end = dt.datetime(2026, 7, 28)
+
+    def test_documents_are_sent_for_this_provider(self):
+        with patch.object(
+            self.connector.session, "post", return_value=Mock(status_code=200)
+        ) as mock_post:
+            self.connector.post("metadata", None, {"a": 1}, self.start, self.end)
+
+        payload = json.loads(mock_post.call_args.kwargs["data"])
+        self.assertEqual(payload["provider"], "apple")
+
+    def test_batched_documents_are_sent_for_this_provider(self):
+        sink = BatchingSink(self.connector, max_items=1)
+        ok = Mock(
+            status_code=200, json=Mock(return_value={"results": [{"status": 200}]})
+        )
+        with patch.object(self.connector, "send", return_value=ok) as mock_send:
+            sink.post("metadata", None, {"a": 1}, self.start, self.end)
+
+        path, body = mock_send.call_args.args
+        self.assertEqual(path, "connector/batch")
+        self.assertEqual(json.loads(body)[0]["provider"], "apple")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,14 +1,29 @@
+import datetime as dt
 import importlib.metadata
-import multiprocessing
 import os
 import subprocess
 import sys
+import threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 import mysql.connector
 from loguru import logger
 
+from manager.cryptography import DECRYPTION_WORKERS, decrypt_json
 from manager.load_env import load_env, load_file_or_env
+from manager.rate_limit import start_broker, stop_broker
+from manager.runs import (
+    COMPLETED_DOCUMENTS_SQL,
+    RESUME,
+    RUN,
+    SKIP,
+    RunLog,
+    encode_documents,
+    plan_daily_job,
+)
+from manager.scheduler import Scheduler, load_concurrency_limits
 
 # Import the Podigee connector functionality
 
@@ -23,6 +38,10 @@ MYSQL_PASSWORD = load_file_or_env("MYSQL_PASSWORD")
 MYSQL_DATABASE = load_env("MYSQL_DATABASE", "openpodcast_auth")
 OPENPODCAST_ENCRYPTION_KEY = load_file_or_env("OPENPODCAST_ENCRYPTION_KEY")
 
+# Maximum number of jobs running at the same time across all sources.
+# The limit per source is set with <SOURCE>_MAX_CONCURRENCY (default 1).
+MAX_CONCURRENCY = int(load_env("MAX_CONCURRENCY", str(os.cpu_count() or 1)))
+
 # Podigee-specific environment variables
 PODIGEE_CLIENT_ID = load_env("PODIGEE_CLIENT_ID")
 PODIGEE_CLIENT_SECRET = load_file_or_env("PODIGEE_CLIENT_SECRET")
@@ -85,7 +104,8 @@ if "--skip-repetition-check" in sys.argv:
     skipRepetitionCheck = True
 
 # Import worker functions and types from separate module for multiprocessing
-from manager.worker import PodcastJob, process_source_jobs  # noqa: E402
+from manager.pools import SourcePools  # noqa: E402
+from manager.worker import PodcastJob  # noqa: E402
 
 
 def print_debug_output():
@@ -132,53 +152,73 @@ if __name__ == "__main__":
                 source_name,
                 source_podcast_id,
                 source_access_keys_encrypted,
-                pod_name
+                pod_name,
+                NULL AS today_count,
+                NULL AS yesterday_count
             FROM
                 podcastSources
                 JOIN openpodcast.podcasts USING (account_id)
         """
     else:
+        # Count today's and yesterday's updates per podcast and source in a
+        # single pass over a half-open range of `created`, so the (created, ...)
+        # primary key or the (account_id, provider, created) index can be used.
+        # Which podcasts are fetched is decided by `plan_daily_job`.
         sql = """
             SELECT
-                account_id,
+                podcastSources.account_id,
                 source_name,
                 source_podcast_id,
                 source_access_keys_encrypted,
-                pod_name
+                pod_name,
+                recent_updates.today_count,
+                recent_updates.yesterday_count
             FROM
                 podcastSources
                 JOIN openpodcast.podcasts USING (account_id)
-            WHERE
-                -- Fetch if no updates exist for today (new podcast or first run of the day)
-                NOT EXISTS (
-                    SELECT 1 FROM openpodcast.updates
-                    WHERE openpodcast.updates.account_id = podcastSources.account_id
-                    AND openpodcast.updates.provider = podcastSources.source_name
-                    AND DATE(openpodcast.updates.created) = CURDATE()
-                )
-                OR
-                -- Re-fetch if today's endpoint count is less than yesterday's, which
-                -- indicates the previous fetch was aborted before all endpoints were fetched
-                (
-                    SELECT COUNT(*) FROM openpodcast.updates
-                    WHERE openpodcast.updates.account_id = podcastSources.account_id
-                    AND openpodcast.updates.provider = podcastSources.source_name
-                    AND DATE(openpodcast.updates.created) = CURDATE()
-                ) < (
-                    SELECT COUNT(*) FROM openpodcast.updates
-                    WHERE openpodcast.updates.account_id = podcastSources.account_id
-                    AND openpodcast.updates.provider = podcastSources.source_name
-                    AND DATE(openpodcast.updates.created) = DATE_SUB(CURDATE(), INTERVAL 1 DAY)
-                )
+                LEFT JOIN (
+                    SELECT
+                        account_id,
+                        provider,
+                        SUM(created >= CURDATE()) AS today_count,
+                        SUM(created < CURDATE()) AS yesterday_count
+                    FROM openpodcast.updates
+                    WHERE
+                        created >= CURDATE() - INTERVAL 1 DAY
+                        AND created < CURDATE() + INTERVAL 1 DAY
+                    GROUP BY account_id, provider
+                ) AS recent_updates
+                    ON recent_updates.account_id = podcastSources.account_id
+                    AND recent_updates.provider = podcastSources.source_name
         """
 
     with db.cursor() as cursor:
         cursor.execute(sql)
         results = cursor.fetchall()
 
+    # Jobs which finished today are not run again, even if they sent fewer
+    # updates than yesterday. Sources which were backfilled today are fetched
+    # completely, as their updates are not from the daily run.
+    today = dt.date.today()
+    run_log = RunLog(load_env("RUN_STATE_FILE", str(Path("state") / "runs.sqlite3")))
+    completed_today = run_log.completed(today)
+    backfilled_today = run_log.backfilled(today)
+
     # Handle interactive mode by filtering jobs upfront
     jobs_to_process = []
     for row in results:
+        plan = RUN
+        if not skipRepetitionCheck:
+            source = (str(row[0]), row[1])
+            plan = plan_daily_job(
+                row[5],
+                row[6],
+                source in completed_today,
+                source in backfilled_today,
+            )
+            if plan == SKIP:
+                continue
+
         job = PodcastJob(
             account_id=row[0],
             source_name=row[1],
@@ -186,6 +226,13 @@ if __name__ == "__main__":
             source_access_keys_encrypted=row[3],
             pod_name=row[4],
         )
+        if plan == RESUME:
+            # Documents stored today, which the resumed job does not fetch again
+            with db.cursor() as cursor:
+                cursor.execute(
+                    COMPLETED_DOCUMENTS_SQL, (job.account_id, job.source_name)
+                )
+                job.completed_documents = encode_documents(cursor.fetchall())
 
         if interactiveMode:
             print(
@@ -196,33 +243,91 @@ if __name__ == "__main__":
 
         jobs_to_process.append(job)
 
-    # Group jobs by source to avoid running multiple jobs for the same source in parallel
-    # This prevents rate limiting and credential issues with Apple, Spotify, etc.
+    # Group jobs by source to limit the number of jobs running in parallel
+    # for the same source. This prevents rate limiting and credential issues
+    # with Apple, Spotify, etc.
     jobs_by_source = defaultdict(list)
     for job in jobs_to_process:
         jobs_by_source[job.source_name].append(job)
 
-    # Process jobs: run different sources in parallel, but same-source jobs sequentially
+    # Process jobs: run different sources in parallel and up to
+    # <SOURCE>_MAX_CONCURRENCY jobs of the same source at the same time
     if jobs_to_process:
+        limits = load_concurrency_limits(jobs_by_source.keys())
         logger.info(
             f"Processing {len(jobs_to_process)} jobs across {len(jobs_by_source)} sources..."
         )
         logger.info(f"Sources: {list(jobs_by_source.keys())}")
+        logger.info(f"Concurrency: {MAX_CONCURRENCY} total, per source: {limits}")
         logger.info(f"Jobs to process: {jobs_to_process}")
 
-        all_results = []
+        # Shared rate limits for concurrent runs of the same provider. Started
+        # before the worker processes, which pass its address on to the pipelines.
+        # Without a shared broker, waits for a running backfill to finish.
+        broker = start_broker(
+            load_env("RATE_LIMIT_LOCK_FILE", str(Path("state") / "rate_limit.lock"))
+        )
+
+        pools = SourcePools(
+            {
+                source_name: min(limits[source_name], MAX_CONCURRENCY, len(jobs))
+                for source_name, jobs in jobs_by_source.items()
+            }
+        )
+
+        def submit(source_name, job, done):
+            def finished(result):
+                if result:
+                    run_log.mark_completed(job, today)
+                done(result)
+
+            def failed(e):
+                logger.error(f"Exception while fetching {job.pod_name}: {e}")
+                done(False)
 
-        # Use multiprocessing to process different sources in parallel
-        with multiprocessing.Pool() as pool:
-            results_by_source = pool.map(process_source_jobs, jobs_by_source.values())
+            pools.submit(source_name, job, callback=finished, error_callback=failed)
 
-        # Flatten results
-        for source_results in results_by_source:
-            all_results.extend(source_results)
+        scheduler = Scheduler(MAX_CONCURRENCY, limits)
+
+        def decrypt(job):
+            """
+            Decrypt the access keys of a job and hand the job to the scheduler.
+            """
+            try:
+                job.source_access_keys = decrypt_json(
+                    job.source_access_keys_encrypted, OPENPODCAST_ENCRYPTION_KEY
+                )
+            except Exception as e:
+                # the job decrypts (and reports) its own keys again
+                logger.error(f"Cannot decrypt keys for {job.pod_name}: {e}")
+            scheduler.add(job.source_name, job)
+
+        def decrypt_jobs():
+            try:
+                with ThreadPoolExecutor(max_workers=DECRYPTION_WORKERS) as executor:
+                    for _ in executor.map(decrypt, jobs_to_process):
+                        pass
+            finally:
+                scheduler.close()
+
+        try:
+            # Decrypt the access keys on a thread pool, so at most
+            # DECRYPTION_WORKERS gpg processes run at the same time
+            # (`decrypt_json` decrypts the values of a job one after another).
+            # Every job is started as soon as its keys are decrypted, while the
+            # other keys are still being decrypted. Started after the worker
+            # processes were forked.
+            threading.Thread(target=decrypt_jobs, daemon=True).start()
+            all_results = scheduler.run(None, submit)
+        finally:
+            pools.close()
+            stop_broker(broker)
+            run_log.close()
 
         successful = sum(1 for r in all_results if r)
         failed = sum(1 for r in all_results if not r)
 
         logger.info(f"Completed. Successful: {successful}, Failed: {failed}")
     else:
+        run_log.close()
         logger.info("No jobs to process")
@@ -0,0 +1,301 @@
+"""
+Backfill of the history of podcasts, e.g. when a new show is onboarded.
+
+    python -m manager.backfill --account 42 --source spotify --start 2020-01-01
+
+The date range is split into chunks of `--chunk-days` days (newest first).
+Every chunk runs as an independent job of the pipeline with its own
+`START_DATE` and `END_DATE`. Like in the daily run, up to
+`<SOURCE>_MAX_CONCURRENCY` jobs of a source run at the same time and share
+the rate limits of the provider. Unless the runs share a rate limit broker
+(see `manager.rate_limit`), a backfill does not start while the daily run is
+in progress.
+
+Finished chunks are recorded in `BACKFILL_STATE_FILE`, so running the same
+command again only runs the chunks which failed or did not run yet.
+"""
+
+import argparse
+import datetime as dt
+import os
+import sqlite3
+import sys
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+from loguru import logger
+
+from manager.load_env import load_env
+from manager.pools import SourcePools
+from manager.rate_limit import start_broker, stop_broker
+from manager.runs import RunLog
+from manager.scheduler import Scheduler, load_concurrency_limits
+from manager.worker import (
+    OPENPODCAST_ENCRYPTION_KEY,
+    PodcastJob,
+    ensure_db_connection,
+)
+
+# Days per chunk. Apple fetches at least 30 days per run anyway.
+DEFAULT_CHUNK_DAYS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backfill_chunks (
+    account_id TEXT NOT NULL,
+    source_name TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    completed_at TEXT NOT NULL,
+    PRIMARY KEY (account_id, source_name, start_date, end_date)
+)
+"""
+
+
+def plan_chunks(start, end, chunk_days):
+    """
+    Split the days from `start` to `end` (both included) into chunks of at
+    most `chunk_days` days, newest first. Returns `(start, end)` pairs.
+    """
+    chunks = []
+    chunk_end = end
+    while chunk_end >= start:
+        chunk_start = max(start, chunk_end - dt.timedelta(days=chunk_days - 1))
+        chunks.append((chunk_start, chunk_end))
+        chunk_end = chunk_start - dt.timedelta(days=1)
+    return chunks
+
+
+class BackfillState:
+    """
+    Remembers which chunks of a backfill finished successfully. The chunks are
+    recorded by the manager process when their job finished, in a SQLite
+    database.
+    """
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        # Jobs finish on the result thread of the worker pools
+        self.db = sqlite3.connect(
+            str(path), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.db.execute(SCHEMA)
+
+    def is_completed(self, job):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT 1 FROM backfill_chunks WHERE account_id = ? "
+                "AND source_name = ? AND start_date = ? AND end_date = ?",
+                (str(job.account_id), job.source_name, job.start_date, job.end_date),
+            ).fetchone()
+        return row is not None
+
+    def mark_completed(self, job):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO backfill_chunks VALUES (?, ?, ?, ?, ?)",
+                (
+                    str(job.account_id),
+                    job.source_name,
+                    job.start_date,
+                    job.end_date,
+                    dt.datetime.now(dt.timezone.utc).isoformat(),
+                ),
+            )
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def chunk_jobs(podcasts, chunks, state):
+    """
+    Create a job for every podcast source and chunk which is not completed yet.
+    `podcasts` are the rows of the podcast sources.
+    """
+    jobs = []
+    for chunk_start, chunk_end in chunks:
+        for row in podcasts:
+            job = PodcastJob(
+                account_id=row[0],
+                source_name=row[1],
+                source_podcast_id=row[2],
+                source_access_keys_encrypted=row[3],
+                pod_name=row[4],
+                start_date=chunk_start.isoformat(),
+                end_date=chunk_end.isoformat(),
+            )
+            if state.is_completed(job):
+                continue
+            jobs.append(job)
+    return jobs
+
+
+def load_podcasts(db, account_ids, source_names):
+    """
+    Load the sources of the given accounts, optionally only of some sources.
+    """
+    sql = f"""
+        SELECT
+            account_id,
+            source_name,
+            source_podcast_id,
+            source_access_keys_encrypted,
+            pod_name
+        FROM
+            podcastSources
+            JOIN openpodcast.podcasts USING (account_id)
+        WHERE
+            account_id IN ({", ".join(["%s"] * len(account_ids))})
+    """
+    params = list(account_ids)
+    if source_names:
+        sql += f" AND source_name IN ({', '.join(['%s'] * len(source_names))})"
+        params += list(source_names)
+
+    with db.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def run_jobs(jobs, state, max_concurrency, run_log):
+    """
+    Run the jobs with the concurrency limits of their sources and record the
+    successful ones. The sources are recorded as backfilled in the `run_log`
+    of the daily run. Returns the number of failed jobs.
+    """
+    jobs_by_source = defaultdict(list)
+    for job in jobs:
+        jobs_by_source[job.source_name].append(job)
+    limits = load_concurrency_limits(jobs_by_source.keys())
+    logger.info(f"Concurrency: {max_concurrency} total, per source: {limits}")
+
+    pools = SourcePools(
+        {
+            source_name: min(limits[source_name], max_concurrency, len(source_jobs))
+            for source_name, source_jobs in jobs_by_source.items()
+        }
+    )
+
+    def submit(source_name, job, done):
+        def finished(result):
+            if result:
+                state.mark_completed(job)
+            else:
+                logger.error(
+                    f"Backfill of {job.pod_name} for {job.source_name} from {job.start_date} to {job.end_date} failed"
+                )
+            done(result)
+
+        def failed(e):
+            logger.error(f"Exception while fetching {job.pod_name}: {e}")
+            done(False)
+
+        # The daily run fetches the source completely today, as the updates
+        # of the backfill count as updates of the day
+        run_log.mark_backfilled(job, dt.date.today())
+        pools.submit(source_name, job, callback=finished, error_callback=failed)
+
+    try:
+        results = Scheduler(max_concurrency, limits).run(jobs_by_source, submit)
+    finally:
+        pools.close()
+
+    return sum(1 for result in results if not result)
+
+
+def main(argv=None):
+    yesterday = dt.date.today() - dt.timedelta(days=1)
+    parser = argparse.ArgumentParser(
+        prog="python -m manager.backfill",
+        description="Fetch the history of podcasts in chunks of days.",
+    )
+    parser.add_argument(
+        "--account",
+        action="append",
+        required=True,
+        help="account ID of the podcast (repeat for several podcasts)",
+    )
+    parser.add_argument(
+        "--source",
+        action="append",
+        help="source to backfill, e.g. spotify (repeatable, default: all)",
+    )
+    parser.add_argument(
+        "--start", required=True, type=dt.date.fromisoformat, help="YYYY-MM-DD"
+    )
+    parser.add_argument(
+        "--end",
+        type=dt.date.fromisoformat,
+        default=yesterday,
+        help="YYYY-MM-DD (default: yesterday)",
+    )
+    parser.add_argument(
+        "--chunk-days",
+        type=int,
+        default=int(load_env("BACKFILL_CHUNK_DAYS", str(DEFAULT_CHUNK_DAYS))),
+        help=f"days per job (default: {DEFAULT_CHUNK_DAYS})",
+    )
+    args = parser.parse_args(argv)
+
+    if not OPENPODCAST_ENCRYPTION_KEY:
+        logger.error("No OPENPODCAST_ENCRYPTION_KEY found")
+        return 1
+    if args.start > args.end or args.chunk_days < 1:
+        logger.error(
+            f"Invalid backfill from {args.start} to {args.end} in chunks of {args.chunk_days} days"
+        )
+        return 1
+
+    db = ensure_db_connection()
+    try:
+        podcasts = load_podcasts(db, args.account, args.source)
+    finally:
+        # The worker processes open their own connections
+        db.close()
+    if not podcasts:
+        logger.error(f"No podcast sources found for accounts {args.account}")
+        return 1
+
+    state = BackfillState(
+        load_env("BACKFILL_STATE_FILE", str(Path("state") / "backfill.sqlite3"))
+    )
+    run_log = RunLog(load_env("RUN_STATE_FILE", str(Path("state") / "runs.sqlite3")))
+    try:
+        chunks = plan_chunks(args.start, args.end, args.chunk_days)
+        jobs = chunk_jobs(podcasts, chunks, state)
+        logger.info(
+            f"Backfilling {len(podcasts)} podcast sources from {args.start} to {args.end}: "
+            f"{len(jobs)} of {len(chunks) * len(podcasts)} chunks to fetch"
+        )
+        if not jobs:
+            return 0
+
+        max_concurrency = int(load_env("MAX_CONCURRENCY", str(os.cpu_count() or 1)))
+        # Without a shared broker, a backfill does not run at the same time as
+        # the daily run, which would not share its rate limits
+        try:
+            broker = start_broker(
+                load_env(
+                    "RATE_LIMIT_LOCK_FILE", str(Path("state") / "rate_limit.lock")
+                ),
+                wait=False,
+            )
+        except (RuntimeError, OSError) as e:
+            logger.error(f"Cannot start the backfill: {e}")
+            return 1
+        try:
+            failed = run_jobs(jobs, state, max_concurrency, run_log)
+        finally:
+            stop_broker(broker)
+    finally:
+        state.close()
+        run_log.close()
+
+    logger.info(f"Completed. Successful: {len(jobs) - failed}, Failed: {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
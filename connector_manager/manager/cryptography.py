@@ -5,8 +5,14 @@ import binascii
 
 from loguru import logger
 
+from manager.load_env import load_env
+
 gpg = gnupg.GPG()
 
+# Number of jobs whose access keys are decrypted in parallel by the manager,
+# each with its own gpg process
+DECRYPTION_WORKERS = int(load_env("DECRYPTION_WORKERS", "8"))
+
 
 def decrypt_json(json_encrypted, key):
     """
@@ -14,6 +20,9 @@ def decrypt_json(json_encrypted, key):
     The json object keys are plain text, the value is gpg encrypted and base64 encoded
     e.g. {"key1": "base64encodedgpgencryptedvalue1", "key2": "base64encodedgpgencryptedvalue2"}
     the method supports only one level of nesting, deeper nesting is not supported yet
+
+    The values are decrypted one after another, callers decrypt several json
+    strings on their own thread pool (see DECRYPTION_WORKERS).
     """
     dict_encrypted = json.loads(json_encrypted)
     for k in dict_encrypted:
@@ -30,7 +39,8 @@ def decrypt_json(json_encrypted, key):
             if not decryptedValue and dict_encrypted[k].strip() != "":
                 decryptedValue = dict_encrypted[k]
             dict_encrypted[k] = decryptedValue
-        except (binascii.Error, ValueError) as e:
+        except (binascii.Error, ValueError, TypeError) as e:
+            # ValueError includes UnicodeDecodeError of non-UTF-8 gpg output
             logger.debug(
                 f"Error decrypting {k}, assuming plain text and continuing, error: {e}"
             )
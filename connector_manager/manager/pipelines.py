@@ -0,0 +1,84 @@
+"""
+In-process execution of the per-source pipelines.
+
+Every pipeline directory (apple, anchor, podigee, spotify) contains a `job`
+package with a `job.pipeline.run(config)` entrypoint. Instead of starting a
+new interpreter for every podcast, the worker process imports the pipeline of
+its source once and then calls `run` for each podcast of that source.
+"""
+
+import importlib
+import sys
+import threading
+from pathlib import Path
+
+from loguru import logger
+
+
+def load_pipeline(connectors_path, source_name):
+    """
+    Import `job.pipeline` of the given source and return its `run` function.
+
+    All pipelines use the same package name (`job`), so a previously imported
+    pipeline of another source is removed from `sys.modules` first.
+    """
+    source_path = str((Path(connectors_path) / source_name).resolve())
+
+    loaded = sys.modules.get("job")
+    if loaded is not None:
+        loaded_path = str(Path(loaded.__file__).resolve().parent.parent)
+        if loaded_path != source_path:
+            logger.info(f"Unloading pipeline at {loaded_path}")
+            for name in list(sys.modules):
+                if name == "job" or name.startswith("job."):
+                    del sys.modules[name]
+            sys.path[:] = [p for p in sys.path if p != loaded_path]
+
+    if source_path not in sys.path:
+        sys.path.insert(0, source_path)
+
+    return importlib.import_module("job.pipeline").run
+
+
+def run_pipeline(connectors_path, source_name, config, timeout):
+    """
+    Run the pipeline of the given source with `config` in the current process.
+
+    Returns the exit code of the pipeline (0 on success), analogous to the
+    return code of `python -m job`. Raises `TimeoutError` if the pipeline
+    does not finish within `timeout` seconds.
+    """
+    run = load_pipeline(connectors_path, source_name)
+    result = {"returncode": 1}
+
+    def target():
+        try:
+            run(config)
+            result["returncode"] = 0
+        except SystemExit as e:
+            # pipelines exit via sys.exit(), mimic the exit code of a process
+            if e.code is None:
+                result["returncode"] = 0
+            elif isinstance(e.code, int):
+                result["returncode"] = e.code
+            else:
+                logger.error(e.code)
+                result["returncode"] = 1
+        except Exception as e:
+            logger.exception(f"Pipeline {source_name} failed: {e}")
+            result["returncode"] = 1
+
+    # Run in a separate (daemon) thread to be able to enforce the timeout.
+    # A timed out pipeline is abandoned and ends with the worker process,
+    # which is replaced after a timeout (see `SourcePools`).
+    thread = threading.Thread(target=target, name=f"pipeline-{source_name}")
+    thread.daemon = True
+    thread.start()
+    thread.join(timeout)
+
+    if thread.is_alive():
+        raise TimeoutError(
+            f"Pipeline {source_name} did not finish within {timeout} seconds"
+        )
+
+    return result["returncode"]
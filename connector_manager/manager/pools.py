@@ -0,0 +1,89 @@
+"""
+Worker processes of the sources.
+
+Every source gets its own pool of worker processes, as the pipelines of all
+sources share the same package name (`job`). The processes are reused for
+all jobs of the source.
+"""
+
+import multiprocessing
+import threading
+
+from loguru import logger
+
+from manager.worker import init_source_worker, process_podcast_job
+
+
+class SourcePools:
+    """
+    One pool of worker processes per source, with `processes_by_source`
+    processes each.
+
+    A pipeline that timed out cannot be stopped and keeps running in its
+    worker process. If a job fails with a `TimeoutError`, the pool of its
+    source is therefore replaced by a new one before the next job of the
+    source starts. The old pool finishes its running jobs and its processes
+    exit, which ends the abandoned pipeline.
+    """
+
+    def __init__(
+        self,
+        processes_by_source,
+        initializer=init_source_worker,
+        task=process_podcast_job,
+    ):
+        self.processes = dict(processes_by_source)
+        self.initializer = initializer
+        self.task = task
+        self.lock = threading.Lock()
+        self.pools = {
+            source_name: self._create(source_name) for source_name in self.processes
+        }
+        self.stale = set()
+        self.retired = []
+
+    def _create(self, source_name):
+        return multiprocessing.Pool(
+            processes=self.processes[source_name],
+            initializer=self.initializer,
+            initargs=(source_name,),
+        )
+
+    def submit(self, source_name, job, callback, error_callback):
+        """
+        Run the job in a worker process of its source. `callback` gets the
+        result, `error_callback` the exception if the job raised one.
+        """
+
+        def failed(e):
+            if isinstance(e, TimeoutError):
+                with self.lock:
+                    if self.pools[source_name] is pool:
+                        self.stale.add(source_name)
+            error_callback(e)
+
+        with self.lock:
+            # Replace the pool here rather than in the callback, so new
+            # processes are always started by the thread submitting the jobs
+            if source_name in self.stale:
+                logger.warning(
+                    f"Restarting the worker processes of {source_name} after a timeout"
+                )
+                self.stale.discard(source_name)
+                self.pools[source_name].close()
+                self.retired.append(self.pools[source_name])
+                self.pools[source_name] = self._create(source_name)
+            pool = self.pools[source_name]
+            pool.apply_async(
+                self.task, (job,), callback=callback, error_callback=failed
+            )
+
+    def close(self):
+        """
+        Wait for all jobs and stop the worker processes.
+        """
+        with self.lock:
+            pools = list(self.pools.values()) + self.retired
+        for pool in pools:
+            pool.close()
+            pool.join()
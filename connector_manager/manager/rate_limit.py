@@ -0,0 +1,224 @@
+"""
+Rate limit broker shared by all pipeline runs on this host.
+
+The manager runs several jobs of the same provider at the same time (see
+`<SOURCE>_MAX_CONCURRENCY`), in different worker processes. Each of them
+would throttle on its own and together they would exceed the rate limit of
+the provider. The broker keeps one token bucket per provider in a separate
+server process, which the pipelines connect to via
+`RATE_LIMIT_BROKER_ADDRESS` and `RATE_LIMIT_BROKER_AUTHKEY`.
+
+By default, every run of the manager (the daily run or a backfill) starts its
+own broker, and a lock makes sure that only one of them runs at a time. To
+run them at the same time, start a broker shared by all runs with
+
+    RATE_LIMIT_BROKER_ADDRESS=127.0.0.1:50123 \
+    RATE_LIMIT_BROKER_AUTHKEY=<hex> python -m manager.rate_limit
+
+and run the manager and the backfills with the same two variables.
+
+`TokenBucket` is also copied into the pipelines that are rate limited
+(`job/rate_limit.py`), which use it when they run on their own. The pipelines
+are separate projects, so they cannot import it from here. Keep the copies
+the same (see `test_rate_limit.py`).
+"""
+
+import fcntl
+import os
+import threading
+import time
+from multiprocessing.managers import BaseManager
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+
+class TokenBucket:
+    """
+    Token bucket shared by all worker threads to stay within the rate limit
+    of an API (`requests` per `window` seconds).
+
+    Every request takes one token. Tokens are refilled continuously, so short
+    bursts of up to `burst` requests are possible, but the average rate never
+    exceeds the limit. If the API answers with HTTP 429 anyway, the rate is
+    halved and all threads wait for `Retry-After`. Successful requests raise
+    the rate again step by step until the configured rate is reached.
+    """
+
+    def __init__(
+        self,
+        requests: float,
+        window: float,
+        burst: Optional[float] = None,
+        min_rate: Optional[float] = None,
+    ):
+        self.max_rate = requests / window
+        self.rate = self.max_rate
+        self.min_rate = min_rate or self.max_rate / 16
+        self.burst = burst if burst is not None else max(1.0, requests / 4)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Take a token, waiting until one is available.
+        Returns the number of seconds waited.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0.0)
+            time.sleep(wait)
+            waited += wait
+
+    def penalize(self, retry_after: Optional[float] = None) -> None:
+        """
+        Slow down after the API answered with HTTP 429.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+            logger.warning(
+                f"Rate limited, slowing down to {self.rate * 60:.1f} requests per minute"
+            )
+
+    def reward(self) -> None:
+        """
+        Speed up again after a successful request.
+        """
+        with self.lock:
+            if self.rate < self.max_rate:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class RateLimitBroker:
+    """
+    Hands out one shared `TokenBucket` per provider. The first pipeline that
+    asks for a provider defines its rate.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def get_bucket(self, provider: str, requests: float, window: float):
+        with self.lock:
+            if provider not in self.buckets:
+                logger.info(
+                    f"Rate limit for {provider}: {requests:g} requests per {window:g}s"
+                )
+                self.buckets[provider] = TokenBucket(requests, window)
+            return self.buckets[provider]
+
+
+class BrokerManager(BaseManager):
+    pass
+
+
+broker = RateLimitBroker()
+BrokerManager.register("get_bucket", callable=broker.get_bucket)
+
+
+class LocalBroker:
+    """
+    A broker started for a single run of the manager, see `start_broker`.
+    """
+
+    def __init__(self, manager: BrokerManager, lock):
+        self.manager = manager
+        self.lock = lock
+
+
+def start_broker(lock_path, wait: bool = True) -> Optional[LocalBroker]:
+    """
+    Provide a broker to the pipelines started by this run of the manager.
+
+    If `RATE_LIMIT_BROKER_ADDRESS` and `RATE_LIMIT_BROKER_AUTHKEY` are set,
+    the pipelines use that broker, which all runs on this host share (see
+    `serve_broker`). Returns None in that case.
+
+    Otherwise a broker is started in a separate process and its address is
+    published in the environment, which is passed on to all pipeline runs.
+    As other runs cannot share its rate limits, the run first takes an
+    exclusive lock on `lock_path`. With `wait=False`, a RuntimeError is raised
+    if another run holds the lock, otherwise the run waits for it.
+    """
+    address = os.environ.get("RATE_LIMIT_BROKER_ADDRESS")
+    authkey = os.environ.get("RATE_LIMIT_BROKER_AUTHKEY")
+    if address and authkey:
+        # fail early instead of running every pipeline without shared limits
+        _client(address, authkey).connect()
+        logger.info(f"Using the shared rate limit broker at {address}")
+        return None
+
+    Path(lock_path).parent.mkdir(parents=True, exist_ok=True)
+    lock = open(lock_path, "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        if not wait:
+            lock.close()
+            raise RuntimeError(
+                f"Another run of the connector manager holds {lock_path}. "
+                "Wait for it to finish or run a shared rate limit broker "
+                "(python -m manager.rate_limit)."
+            )
+        logger.info(f"Waiting for another run of the connector manager ({lock_path})")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+    authkey = os.urandom(16)
+    manager = BrokerManager(address=("127.0.0.1", 0), authkey=authkey)
+    manager.start()
+    host, port = manager.address
+    os.environ["RATE_LIMIT_BROKER_ADDRESS"] = f"{host}:{port}"
+    os.environ["RATE_LIMIT_BROKER_AUTHKEY"] = authkey.hex()
+    logger.info(f"Rate limit broker listening on {host}:{port}")
+    return LocalBroker(manager, lock)
+
+
+def stop_broker(broker: Optional[LocalBroker]) -> None:
+    if broker is None:
+        # the shared broker keeps running
+        return
+    os.environ.pop("RATE_LIMIT_BROKER_ADDRESS", None)
+    os.environ.pop("RATE_LIMIT_BROKER_AUTHKEY", None)
+    broker.manager.shutdown()
+    # releases the lock
+    broker.lock.close()
+
+
+def _client(address: str, authkey: str) -> BrokerManager:
+    host, port = address.rsplit(":", 1)
+    return BrokerManager(address=(host, int(port)), authkey=bytes.fromhex(authkey))
+
+
+def serve_broker() -> None:
+    """
+    Run a broker shared by all runs of the manager on this host, at
+    `RATE_LIMIT_BROKER_ADDRESS` with `RATE_LIMIT_BROKER_AUTHKEY`.
+    """
+    address = os.environ["RATE_LIMIT_BROKER_ADDRESS"]
+    server = _client(address, os.environ["RATE_LIMIT_BROKER_AUTHKEY"]).get_server()
+    logger.info(f"Rate limit broker listening on {address}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    serve_broker()
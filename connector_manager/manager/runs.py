@@ -0,0 +1,149 @@
+"""
+Successful runs of the pipelines, recorded by the manager.
+
+The number of updates of a podcast source only tells that a run started. A
+run which sends fewer documents than the day before (e.g. because unchanged
+metadata or days without streams are not sent) looks like an aborted run. The
+run log tells which jobs actually finished today, so they are not run again.
+
+Backfills record the podcast sources they fetched, as their updates count as
+updates of the day as well.
+"""
+
+import datetime as dt
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    account_id TEXT NOT NULL,
+    source_name TEXT NOT NULL,
+    day TEXT NOT NULL,
+    completed_at TEXT NOT NULL,
+    PRIMARY KEY (account_id, source_name, day)
+);
+CREATE TABLE IF NOT EXISTS backfills (
+    account_id TEXT NOT NULL,
+    source_name TEXT NOT NULL,
+    day TEXT NOT NULL,
+    PRIMARY KEY (account_id, source_name, day)
+);
+"""
+
+# Documents of a podcast source stored today: endpoint, episode and date range,
+# as sent by the pipelines
+COMPLETED_DOCUMENTS_SQL = """
+    SELECT
+        endpoint,
+        JSON_UNQUOTE(JSON_EXTRACT(update_data, '$.meta.episode')),
+        JSON_UNQUOTE(JSON_EXTRACT(update_data, '$.range.start')),
+        JSON_UNQUOTE(JSON_EXTRACT(update_data, '$.range.end'))
+    FROM openpodcast.updates
+    WHERE
+        account_id = %s
+        AND provider = %s
+        AND created >= CURDATE()
+        AND created < CURDATE() + INTERVAL 1 DAY
+"""
+
+# Decisions of `plan_daily_job`
+SKIP = "skip"
+# Fetch everything
+RUN = "run"
+# Fetch the endpoints which were not stored today
+RESUME = "resume"
+
+
+def plan_daily_job(today_count, yesterday_count, completed, backfilled=False):
+    """
+    Decide whether the daily job of a podcast source runs, from its number of
+    updates today and yesterday, whether it finished today already and
+    whether a backfill fetched the source today.
+    """
+    if completed:
+        return SKIP
+    if backfilled:
+        # the updates of today are (also) from the backfill
+        return RUN
+    if not today_count:
+        # new podcast or first run of the day
+        return RUN
+    if today_count < (yesterday_count or 0):
+        # the previous run of today was aborted before all endpoints were stored
+        return RESUME
+    return SKIP
+
+
+def encode_documents(rows):
+    """
+    Encode the documents stored today (rows of `COMPLETED_DOCUMENTS_SQL`) for
+    the `COMPLETED_DOCUMENTS` variable of the pipelines: a JSON list of
+    `[endpoint, episode, start, end]`, with "" for the show.
+    """
+    documents = {
+        (endpoint, episode or "", start, end)
+        for endpoint, episode, start, end in rows
+        if start and end
+    }
+    return json.dumps(sorted(documents))
+
+
+class RunLog:
+    """
+    Remembers the jobs which finished successfully per day, in a SQLite
+    database.
+    """
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        # Jobs finish on the result thread of the worker pools
+        self.db = sqlite3.connect(
+            str(path), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.db.executescript(SCHEMA)
+
+    def completed(self, day):
+        """
+        `(account_id, source_name)` of all jobs which finished on `day`.
+        """
+        return self._sources("runs", day)
+
+    def backfilled(self, day):
+        """
+        `(account_id, source_name)` of all sources backfilled on `day`.
+        """
+        return self._sources("backfills", day)
+
+    def _sources(self, table, day):
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT account_id, source_name FROM {table} WHERE day = ?",
+                (day.isoformat(),),
+            ).fetchall()
+        return set(rows)
+
+    def mark_completed(self, job, day):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?)",
+                (
+                    str(job.account_id),
+                    job.source_name,
+                    day.isoformat(),
+                    dt.datetime.now(dt.timezone.utc).isoformat(),
+                ),
+            )
+
+    def mark_backfilled(self, job, day):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO backfills VALUES (?, ?, ?)",
+                (str(job.account_id), job.source_name, day.isoformat()),
+            )
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,146 @@
+"""
+Scheduling of podcast jobs with a global and a per-source concurrency limit.
+
+Providers rate limit per account or per client, so running too many jobs of
+the same source in parallel gets us blocked. The scheduler therefore limits
+the number of jobs in flight per source (`<SOURCE>_MAX_CONCURRENCY`, e.g.
+`SPOTIFY_MAX_CONCURRENCY=3`) and in total (`MAX_CONCURRENCY`).
+"""
+
+import threading
+from collections import deque
+
+from loguru import logger
+
+from manager.load_env import load_env
+
+# Default number of jobs per source that run at the same time.
+# One job per source keeps the behaviour of processing each source sequentially.
+DEFAULT_SOURCE_CONCURRENCY = 1
+
+
+def load_concurrency_limits(source_names):
+    """
+    Load the maximum number of concurrent jobs for each source from
+    `<SOURCE>_MAX_CONCURRENCY` (e.g. `SPOTIFY_MAX_CONCURRENCY`).
+    """
+    limits = {}
+    for source_name in source_names:
+        value = load_env(
+            f"{source_name.upper()}_MAX_CONCURRENCY", str(DEFAULT_SOURCE_CONCURRENCY)
+        )
+        try:
+            limits[source_name] = max(1, int(value))
+        except ValueError:
+            logger.warning(
+                f"Invalid {source_name.upper()}_MAX_CONCURRENCY: {value}, using {DEFAULT_SOURCE_CONCURRENCY}"
+            )
+            limits[source_name] = DEFAULT_SOURCE_CONCURRENCY
+    return limits
+
+
+class Scheduler:
+    """
+    Runs jobs grouped by source with at most `limits[source]` jobs of a
+    source and at most `max_concurrency` jobs overall in flight.
+
+    Jobs are started through `submit(source_name, job, done)`, which must run
+    the job asynchronously and call `done(result)` once it has finished.
+    Sources are served round-robin, so a source with many jobs does not
+    starve the others.
+
+    Jobs can be passed to `run` or added with `add` while the scheduler is
+    running (e.g. as soon as their access keys are decrypted). In the latter
+    case, `close` has to be called once all jobs were added.
+    """
+
+    def __init__(self, max_concurrency, limits):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limits = limits
+        self.condition = threading.Condition()
+        self.pending = {}
+        self.in_flight = {}
+        self.total_in_flight = 0
+        self.closed = False
+
+    def add(self, source_name, job):
+        """
+        Add a job, it is started as soon as its source has capacity.
+        """
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Cannot add jobs to a closed scheduler")
+            self.pending.setdefault(source_name, deque()).append(job)
+            self.condition.notify_all()
+
+    def close(self):
+        """
+        Signal that no more jobs will be added.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def run(self, jobs_by_source, submit):
+        """
+        Run all jobs and return their results (in order of completion).
+        Pass `None` as `jobs_by_source` to run jobs added with `add` until
+        the scheduler is closed.
+        """
+        if jobs_by_source is not None:
+            for source_name, jobs in jobs_by_source.items():
+                for job in jobs:
+                    self.add(source_name, job)
+            self.close()
+
+        results = []
+
+        def done(source_name, result):
+            with self.condition:
+                self.in_flight[source_name] -= 1
+                self.total_in_flight -= 1
+                results.append(result)
+                self.condition.notify_all()
+
+        with self.condition:
+            while self.pending or not self.closed:
+                source_name = self._next_source(self.pending)
+                if source_name is None:
+                    self.condition.wait()
+                    continue
+
+                job = self.pending[source_name].popleft()
+                if not self.pending[source_name]:
+                    del self.pending[source_name]
+                # Move the source to the end to serve the sources round-robin
+                elif len(self.pending) > 1:
+                    self.pending[source_name] = self.pending.pop(source_name)
+
+                self.in_flight[source_name] = self.in_flight.get(source_name, 0) + 1
+                self.total_in_flight += 1
+                logger.info(
+                    f"Starting job for {source_name} ({self.in_flight[source_name]}/{self._limit(source_name)} of source, {self.total_in_flight}/{self.max_concurrency} total)"
+                )
+                submit(
+                    source_name,
+                    job,
+                    lambda result, source_name=source_name: done(source_name, result),
+                )
+
+            self.condition.wait_for(lambda: self.total_in_flight == 0)
+
+        return results
+
+    def _limit(self, source_name):
+        return self.limits.get(source_name, DEFAULT_SOURCE_CONCURRENCY)
+
+    def _next_source(self, pending):
+        """
+        Return the first source with pending jobs that can start another job.
+        """
+        if self.total_in_flight >= self.max_concurrency:
+            return None
+        for source_name in pending:
+            if self.in_flight.get(source_name, 0) < self._limit(source_name):
+                return source_name
+        return None
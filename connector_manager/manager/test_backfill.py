@@ -0,0 +1,48 @@
+"""
+Tests for splitting backfills into chunks and recording finished chunks.
+"""
+
+import datetime as dt
+
+from manager.backfill import BackfillState, chunk_jobs, plan_chunks
+
+PODCASTS = [
+    (1, "spotify", "show1", "keys", "Podcast 1"),
+    (2, "spotify", "show2", "keys", "Podcast 2"),
+]
+
+
+def test_plan_chunks_newest_first():
+    chunks = plan_chunks(dt.date(2026, 1, 1), dt.date(2026, 1, 10), 4)
+    assert chunks == [
+        (dt.date(2026, 1, 7), dt.date(2026, 1, 10)),
+        (dt.date(2026, 1, 3), dt.date(2026, 1, 6)),
+        (dt.date(2026, 1, 1), dt.date(2026, 1, 2)),
+    ]
+
+
+def test_plan_chunks_single_day():
+    day = dt.date(2026, 1, 1)
+    assert plan_chunks(day, day, 30) == [(day, day)]
+
+
+def test_completed_chunks_are_skipped(tmp_path):
+    chunks = plan_chunks(dt.date(2026, 1, 1), dt.date(2026, 1, 10), 5)
+    state = BackfillState(tmp_path / "backfill.sqlite3")
+    jobs = chunk_jobs(PODCASTS, chunks, state)
+    assert [(job.account_id, job.start_date, job.end_date) for job in jobs] == [
+        (1, "2026-01-06", "2026-01-10"),
+        (2, "2026-01-06", "2026-01-10"),
+        (1, "2026-01-01", "2026-01-05"),
+        (2, "2026-01-01", "2026-01-05"),
+    ]
+
+    state.mark_completed(jobs[1])
+    state.close()
+
+    # the state is kept between runs
+    state = BackfillState(tmp_path / "backfill.sqlite3")
+    remaining = chunk_jobs(PODCASTS, chunks, state)
+    state.close()
+    assert jobs[1] not in remaining
+    assert len(remaining) == 3
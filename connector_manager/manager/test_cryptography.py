@@ -1,4 +1,7 @@
 import unittest
+from unittest.mock import Mock, patch
+
+import manager.cryptography
 from manager.cryptography import decrypt_json, encrypt_json
 import json
 
@@ -70,5 +73,13 @@ class TestEncrypt(unittest.TestCase):
         self.assertNotEqual(decrypted_data["secret"], test_data["secret"])
 
 
+class TestDecryptErrors(unittest.TestCase):
+    def test_invalid_utf8_keeps_the_original_value(self):
+        with patch.object(
+            manager.cryptography.gpg, "decrypt", return_value=Mock(data=b"\xff\xfe")
+        ):
+            self.assertEqual(decrypt_json(json_encrypted, passphrase), encrypted)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,100 @@
+"""
+Tests for running the per-source pipelines in-process.
+"""
+
+import sys
+
+import pytest
+
+from manager.pipelines import load_pipeline, run_pipeline
+
+
+def write_pipeline(connectors_path, source_name, body):
+    job_dir = connectors_path / source_name / "job"
+    job_dir.mkdir(parents=True)
+    (job_dir / "__init__.py").write_text("")
+    (job_dir / "pipeline.py").write_text(body)
+
+
+@pytest.fixture
+def connectors_path(tmp_path):
+    """Provide a connectors directory and restore the import state afterwards."""
+    saved_path = list(sys.path)
+    saved_job = {
+        name: module
+        for name, module in sys.modules.items()
+        if name == "job" or name.startswith("job.")
+    }
+    for name in saved_job:
+        del sys.modules[name]
+
+    yield tmp_path
+
+    for name in [n for n in sys.modules if n == "job" or n.startswith("job.")]:
+        del sys.modules[name]
+    sys.modules.update(saved_job)
+    sys.path[:] = saved_path
+
+
+class TestRunPipeline:
+    """Test the in-process execution of pipelines."""
+
+    def test_passes_config_and_returns_zero(self, connectors_path):
+        write_pipeline(
+            connectors_path,
+            "spotify",
+            "calls = []\n\ndef run(config):\n    calls.append(config)\n",
+        )
+
+        returncode = run_pipeline(connectors_path, "spotify", {"PODCAST_ID": "1"}, 5)
+
+        assert returncode == 0
+        assert sys.modules["job.pipeline"].calls == [{"PODCAST_ID": "1"}]
+
+    def test_maps_exit_codes(self, connectors_path):
+        write_pipeline(
+            connectors_path,
+            "apple",
+            "import sys\n\ndef run(config):\n    sys.exit(int(config['CODE']))\n",
+        )
+
+        assert run_pipeline(connectors_path, "apple", {"CODE": "0"}, 5) == 0
+        assert run_pipeline(connectors_path, "apple", {"CODE": "3"}, 5) == 3
+
+    def test_exception_is_failure(self, connectors_path):
+        write_pipeline(
+            connectors_path, "podigee", "def run(config):\n    raise ValueError()\n"
+        )
+
+        assert run_pipeline(connectors_path, "podigee", {}, 5) == 1
+
+    def test_timeout(self, connectors_path):
+        write_pipeline(
+            connectors_path,
+            "anchor",
+            "import time\n\ndef run(config):\n    time.sleep(1)\n",
+        )
+
+        with pytest.raises(TimeoutError):
+            run_pipeline(connectors_path, "anchor", {}, 0.01)
+
+
+class TestLoadPipeline:
+    """Test importing the pipeline of a source."""
+
+    def test_reuses_loaded_pipeline(self, connectors_path):
+        write_pipeline(connectors_path, "spotify", "def run(config):\n    pass\n")
+
+        assert load_pipeline(connectors_path, "spotify") is load_pipeline(
+            connectors_path, "spotify"
+        )
+
+    def test_replaces_pipeline_of_other_source(self, connectors_path):
+        write_pipeline(connectors_path, "spotify", "SOURCE = 'spotify'\nrun = None\n")
+        write_pipeline(connectors_path, "apple", "SOURCE = 'apple'\nrun = None\n")
+
+        load_pipeline(connectors_path, "spotify")
+        load_pipeline(connectors_path, "apple")
+
+        assert sys.modules["job.pipeline"].SOURCE == "apple"
+        assert str(connectors_path / "spotify") not in sys.path
@@ -0,0 +1,69 @@
+"""
+Tests for the worker processes of the sources.
+"""
+
+import os
+import threading
+
+from manager.pools import SourcePools
+
+
+def init_worker(source_name):
+    pass
+
+
+def run_job(job):
+    if job == "timeout":
+        raise TimeoutError("Pipeline test did not finish within 0 seconds")
+    if job == "error":
+        raise ValueError("Invalid job")
+    return os.getpid()
+
+
+def run_jobs(pools, jobs):
+    """Run the jobs one after another and return their results or errors."""
+    results = []
+    for job in jobs:
+        finished = threading.Event()
+
+        def done(result):
+            results.append(result)
+            finished.set()
+
+        pools.submit("test", job, callback=done, error_callback=done)
+        assert finished.wait(10)
+    return results
+
+
+class TestSourcePools:
+    def test_processes_are_reused(self):
+        pools = SourcePools({"test": 1}, initializer=init_worker, task=run_job)
+        try:
+            first, second = run_jobs(pools, ["a", "b"])
+        finally:
+            pools.close()
+
+        assert first == second
+
+    def test_processes_are_replaced_after_a_timeout(self):
+        pools = SourcePools({"test": 1}, initializer=init_worker, task=run_job)
+        old_pool = pools.pools["test"]
+        try:
+            before, timeout, after = run_jobs(pools, ["a", "timeout", "b"])
+        finally:
+            pools.close()
+
+        assert isinstance(timeout, TimeoutError)
+        assert before != after
+        assert pools.pools["test"] is not old_pool
+        assert pools.retired == [old_pool]
+
+    def test_other_errors_keep_the_processes(self):
+        pools = SourcePools({"test": 1}, initializer=init_worker, task=run_job)
+        try:
+            before, error, after = run_jobs(pools, ["a", "error", "b"])
+        finally:
+            pools.close()
+
+        assert isinstance(error, ValueError)
+        assert before == after
@@ -0,0 +1,115 @@
+"""
+Tests for the rate limit broker shared by all pipeline runs.
+"""
+
+import ast
+import os
+from multiprocessing.managers import BaseManager
+from pathlib import Path
+
+import pytest
+
+from manager.rate_limit import TokenBucket, start_broker, stop_broker
+
+# Pipelines with a copy of `TokenBucket`
+PIPELINES = Path(__file__).parents[2]
+TOKEN_BUCKET_COPIES = ["spotify", "anchor"]
+
+
+class Client(BaseManager):
+    pass
+
+
+Client.register("get_bucket")
+
+
+def connect():
+    host, port = os.environ["RATE_LIMIT_BROKER_ADDRESS"].split(":")
+    client = Client(
+        address=(host, int(port)),
+        authkey=bytes.fromhex(os.environ["RATE_LIMIT_BROKER_AUTHKEY"]),
+    )
+    client.connect()
+    return client
+
+
+@pytest.fixture
+def broker(tmp_path):
+    manager = start_broker(tmp_path / "rate_limit.lock")
+    yield manager
+    stop_broker(manager)
+
+
+def class_source(path, name):
+    source = path.read_text()
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.ClassDef) and node.name == name:
+            return ast.get_source_segment(source, node)
+
+
+class TestRateLimitBroker:
+    def test_clients_share_bucket_per_provider(self, broker):
+        # a single token, refilled after 0.2 seconds
+        first = connect().get_bucket("spotify", 1, 0.2)
+        # the first client defines the rate of the provider
+        second = connect().get_bucket("spotify", 100, 1)
+        other = connect().get_bucket("anchor", 1, 0.2)
+
+        assert first.acquire() == 0.0
+        assert second.acquire() > 0.0
+        assert other.acquire() == 0.0
+
+    def test_environment_is_removed_on_stop(self, tmp_path):
+        manager = start_broker(tmp_path / "rate_limit.lock")
+        assert "RATE_LIMIT_BROKER_ADDRESS" in os.environ
+
+        stop_broker(manager)
+
+        assert "RATE_LIMIT_BROKER_ADDRESS" not in os.environ
+        assert "RATE_LIMIT_BROKER_AUTHKEY" not in os.environ
+
+    def test_runs_with_their_own_broker_do_not_overlap(self, broker, tmp_path):
+        # e.g. a backfill while the daily run is in progress
+        saved = {
+            name: os.environ.pop(name)
+            for name in ("RATE_LIMIT_BROKER_ADDRESS", "RATE_LIMIT_BROKER_AUTHKEY")
+        }
+        try:
+            with pytest.raises(RuntimeError):
+                start_broker(tmp_path / "rate_limit.lock", wait=False)
+        finally:
+            os.environ.update(saved)
+
+    def test_shared_broker_is_used(self, broker, tmp_path):
+        # e.g. a backfill started with the address of a shared broker
+        assert start_broker(tmp_path / "other.lock", wait=False) is None
+        first = connect().get_bucket("spotify", 1, 0.2)
+        assert first.acquire() == 0.0
+
+        stop_broker(None)
+        assert "RATE_LIMIT_BROKER_ADDRESS" in os.environ
+
+    def test_unreachable_shared_broker(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("RATE_LIMIT_BROKER_ADDRESS", "127.0.0.1:1")
+        monkeypatch.setenv("RATE_LIMIT_BROKER_AUTHKEY", "00")
+
+        with pytest.raises(OSError):
+            start_broker(tmp_path / "rate_limit.lock")
+
+
+@pytest.mark.parametrize("pipeline", TOKEN_BUCKET_COPIES)
+def test_token_bucket_copies_are_the_same(pipeline):
+    copy = PIPELINES / pipeline / "job" / "rate_limit.py"
+    if not copy.exists():
+        pytest.skip(f"{pipeline} is not next to the connector manager")
+    assert class_source(copy, "TokenBucket") == class_source(
+        Path(__file__).parent / "rate_limit.py", "TokenBucket"
+    )
+
+
+class TestTokenBucket:
+    def test_waits_when_empty(self):
+        bucket = TokenBucket(requests=2, window=0.1, burst=1)
+
+        assert bucket.acquire() == 0.0
+        assert bucket.acquire() > 0.0
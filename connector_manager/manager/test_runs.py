@@ -0,0 +1,83 @@
+"""
+Tests for deciding which daily jobs run and recording finished jobs.
+"""
+
+import datetime as dt
+import json
+
+from manager.runs import RESUME, RUN, SKIP, RunLog, encode_documents, plan_daily_job
+from manager.worker import PodcastJob
+
+TODAY = dt.date(2026, 7, 28)
+
+
+def job(account_id=1, source_name="spotify"):
+    return PodcastJob(
+        account_id=account_id,
+        source_name=source_name,
+        source_podcast_id="show",
+        source_access_keys_encrypted="keys",
+        pod_name="Podcast",
+    )
+
+
+def test_first_run_of_the_day():
+    assert plan_daily_job(None, None, completed=False) == RUN
+    assert plan_daily_job(0, 120, completed=False) == RUN
+
+
+def test_aborted_run_is_resumed():
+    assert plan_daily_job(40, 120, completed=False) == RESUME
+
+
+def test_complete_run_is_skipped():
+    assert plan_daily_job(120, 120, completed=False) == SKIP
+
+
+def test_finished_run_with_fewer_updates_is_skipped():
+    # e.g. unchanged metadata was not sent again
+    assert plan_daily_job(80, 120, completed=True) == SKIP
+
+
+def test_backfilled_source_is_fetched_completely():
+    # the updates of today are from the backfill
+    assert plan_daily_job(300, 120, completed=False, backfilled=True) == RUN
+    assert plan_daily_job(300, 120, completed=True, backfilled=True) == SKIP
+
+
+def test_finished_jobs_are_recorded_per_day(tmp_path):
+    path = tmp_path / "runs.sqlite3"
+    run_log = RunLog(path)
+    run_log.mark_completed(job(1), TODAY)
+    run_log.mark_completed(job(2, "apple"), TODAY - dt.timedelta(days=1))
+    run_log.close()
+
+    run_log = RunLog(path)
+    assert run_log.completed(TODAY) == {("1", "spotify")}
+    assert run_log.backfilled(TODAY) == set()
+    run_log.close()
+
+
+def test_backfilled_sources_are_recorded_per_day(tmp_path):
+    run_log = RunLog(tmp_path / "runs.sqlite3")
+    run_log.mark_backfilled(job(1), TODAY)
+    run_log.mark_backfilled(job(1), TODAY)
+
+    assert run_log.backfilled(TODAY) == {("1", "spotify")}
+    assert run_log.completed(TODAY) == set()
+    run_log.close()
+
+
+def test_stored_documents_are_encoded_for_the_pipeline():
+    rows = [
+        ("metadata", None, "2026-07-01", "2026-07-28"),
+        ("listeners", "ep1", "2026-07-01", "2026-07-28"),
+        ("listeners", "ep1", "2026-07-01", "2026-07-28"),
+        # documents without a date range cannot be matched
+        ("episodes", None, None, None),
+    ]
+
+    assert json.loads(encode_documents(rows)) == [
+        ["listeners", "ep1", "2026-07-01", "2026-07-28"],
+        ["metadata", "", "2026-07-01", "2026-07-28"],
+    ]
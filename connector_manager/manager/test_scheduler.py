@@ -0,0 +1,118 @@
+"""
+Tests for scheduling jobs with per-source and global concurrency limits.
+"""
+
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from manager.scheduler import Scheduler, load_concurrency_limits
+
+
+class FakeExecutor:
+    """Runs every job in a thread and records the jobs in flight."""
+
+    def __init__(self, duration=0.02):
+        self.duration = duration
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.max_in_flight = {}
+        self.max_total = 0
+        self.started = []
+
+    def submit(self, source_name, job, done):
+        with self.lock:
+            self.started.append(job)
+            self.in_flight[source_name] = self.in_flight.get(source_name, 0) + 1
+            self.max_in_flight[source_name] = max(
+                self.max_in_flight.get(source_name, 0), self.in_flight[source_name]
+            )
+            self.max_total = max(self.max_total, sum(self.in_flight.values()))
+
+        def run():
+            time.sleep(self.duration)
+            with self.lock:
+                self.in_flight[source_name] -= 1
+            done(job)
+
+        threading.Thread(target=run).start()
+
+
+class TestScheduler:
+    def test_respects_per_source_limits(self):
+        executor = FakeExecutor()
+        jobs = {
+            "spotify": [f"spotify-{i}" for i in range(6)],
+            "apple": [f"apple-{i}" for i in range(3)],
+        }
+
+        results = Scheduler(10, {"spotify": 3, "apple": 1}).run(jobs, executor.submit)
+
+        assert sorted(results) == sorted(jobs["spotify"] + jobs["apple"])
+        assert executor.max_in_flight == {"spotify": 3, "apple": 1}
+
+    def test_respects_global_limit(self):
+        executor = FakeExecutor()
+        jobs = {
+            "spotify": [f"spotify-{i}" for i in range(4)],
+            "anchor": [f"anchor-{i}" for i in range(4)],
+        }
+
+        results = Scheduler(2, {"spotify": 4, "anchor": 4}).run(jobs, executor.submit)
+
+        assert len(results) == 8
+        assert executor.max_total == 2
+
+    def test_serves_sources_round_robin(self):
+        executor = FakeExecutor()
+        jobs = {"spotify": ["s1", "s2"], "apple": ["a1", "a2"]}
+
+        Scheduler(1, {"spotify": 1, "apple": 1}).run(jobs, executor.submit)
+
+        assert executor.started == ["s1", "a1", "s2", "a2"]
+
+    def test_synchronous_completion(self):
+        def submit(source_name, job, done):
+            done(True)
+
+        results = Scheduler(1, {}).run({"podigee": [1, 2, 3]}, submit)
+
+        assert results == [True, True, True]
+
+    def test_runs_jobs_added_while_running(self):
+        executor = FakeExecutor()
+        scheduler = Scheduler(2, {"spotify": 2})
+
+        def add_jobs():
+            for i in range(3):
+                time.sleep(0.01)
+                scheduler.add("spotify", f"spotify-{i}")
+            scheduler.close()
+
+        threading.Thread(target=add_jobs).start()
+        results = scheduler.run(None, executor.submit)
+
+        assert sorted(results) == ["spotify-0", "spotify-1", "spotify-2"]
+
+    def test_cannot_add_to_closed_scheduler(self):
+        scheduler = Scheduler(1, {})
+        scheduler.close()
+
+        with pytest.raises(RuntimeError):
+            scheduler.add("apple", 1)
+
+    def test_no_jobs(self):
+        assert Scheduler(1, {}).run({}, lambda *args: None) == []
+
+
+class TestLoadConcurrencyLimits:
+    def test_loads_limits_from_environment(self):
+        with patch.dict(
+            "os.environ",
+            {"SPOTIFY_MAX_CONCURRENCY": "3", "APPLE_MAX_CONCURRENCY": "invalid"},
+        ):
+            limits = load_concurrency_limits(["spotify", "apple", "podigee"])
+
+        assert limits == {"spotify": 3, "apple": 1, "podigee": 1}
@@ -0,0 +1,47 @@
+"""
+Tests for the configuration passed to the pipelines.
+"""
+
+from unittest.mock import patch
+
+from manager.worker import PodcastJob, process_podcast_job
+
+
+def run_job(**kwargs):
+    """Run a job in-process and return the configuration of the pipeline."""
+    job = PodcastJob(
+        account_id=1,
+        source_name="spotify",
+        source_podcast_id="show",
+        source_access_keys_encrypted="{}",
+        pod_name="Podcast",
+        source_access_keys={"SPOTIFY_SP_DC": "dc"},
+        **kwargs,
+    )
+    with (
+        patch("manager.worker.JOB_EXECUTION_MODE", "inprocess"),
+        patch("manager.worker.run_pipeline", return_value=0) as run_pipeline,
+    ):
+        assert process_podcast_job(job)
+    return run_pipeline.call_args.args[2]
+
+
+def test_daily_job():
+    config = run_job(
+        completed_documents='[["metadata", "", "2024-01-01", "2024-01-30"]]'
+    )
+
+    assert config["PODCAST_ID"] == "show"
+    assert config["SPOTIFY_SP_DC"] == "dc"
+    assert config["COMPLETED_DOCUMENTS"] == (
+        '[["metadata", "", "2024-01-01", "2024-01-30"]]'
+    )
+    assert "BACKFILL" not in config
+
+
+def test_backfill_chunk():
+    config = run_job(start_date="2024-01-01", end_date="2024-01-30")
+
+    assert config["START_DATE"] == "2024-01-01"
+    assert config["END_DATE"] == "2024-01-30"
+    assert config["BACKFILL"] == "1"
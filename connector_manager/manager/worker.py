@@ -15,6 +15,7 @@ from loguru import logger
 
 from manager.cryptography import decrypt_json
 from manager.load_env import load_env, load_file_or_env
+from manager.pipelines import load_pipeline, run_pipeline
 
 
 @dataclass
@@ -24,6 +25,14 @@ class PodcastJob:
     source_podcast_id: str
     source_access_keys_encrypted: str
     pod_name: str
+    # decrypted access keys, if they were decrypted before the job was started
+    source_access_keys: dict | None = None
+    # documents already stored today, e.g. by an aborted run (see
+    # `encode_documents`)
+    completed_documents: str | None = None
+    # date range (YYYY-MM-DD) of a backfill chunk, the pipeline default otherwise
+    start_date: str | None = None
+    end_date: str | None = None
 
 
 # Load environment variables
@@ -35,6 +44,15 @@ MYSQL_PASSWORD = load_file_or_env("MYSQL_PASSWORD")
 MYSQL_DATABASE = load_env("MYSQL_DATABASE", "openpodcast_auth")
 OPENPODCAST_ENCRYPTION_KEY = load_file_or_env("OPENPODCAST_ENCRYPTION_KEY")
 
+# How pipelines are executed:
+# - "inprocess" (default): import `job.pipeline` once per worker process and
+#   call `run(config)` for every podcast of the source
+# - "subprocess": start a new `python -m job` process for every podcast
+JOB_EXECUTION_MODE = load_env("JOB_EXECUTION_MODE", "inprocess")
+
+# Timeout for a single pipeline run (120 minutes) to prevent hanging jobs
+JOB_TIMEOUT = 7200
+
 PODIGEE_CLIENT_ID = load_env("PODIGEE_CLIENT_ID")
 PODIGEE_CLIENT_SECRET = load_file_or_env("PODIGEE_CLIENT_SECRET")
 PODIGEE_REDIRECT_URI = load_env(
@@ -95,12 +113,14 @@ def process_podcast_job(job):
 
     try:
         # all keys that are needed to access the source
-        print(
-            f"Decrypting keys for {job.pod_name} {job.account_id} for {job.source_name}"
-        )
-        source_access_keys = decrypt_json(
-            job.source_access_keys_encrypted, OPENPODCAST_ENCRYPTION_KEY
-        )
+        source_access_keys = job.source_access_keys
+        if source_access_keys is None:
+            print(
+                f"Decrypting keys for {job.pod_name} {job.account_id} for {job.source_name}"
+            )
+            source_access_keys = decrypt_json(
+                job.source_access_keys_encrypted, OPENPODCAST_ENCRYPTION_KEY
+            )
 
         # Handle Podigee token refresh if this is a Podigee source
         if job.source_name == "podigee":
@@ -167,21 +187,49 @@ def process_podcast_job(job):
         if job.source_name == "anchor":
             job_env["SPOTIFY_SHOW_URI"] = job.source_podcast_id
 
-        # run an external process, switch to right fetcher depending on
-        # source_name, and set env variables from source_access_keys
-        result = subprocess.run(
-            ["python", "-m", "job"],
-            cwd=cwd,
-            env=job_env,
-            text=True,
-            timeout=7200,  # 120 minute timeout to prevent hanging of subprocesses
-        )
+        # Resume an aborted run: the pipeline skips the documents that were
+        # already stored today instead of fetching everything again
+        job_env.pop("COMPLETED_DOCUMENTS", None)
+        if job.completed_documents:
+            logger.info(f"Skipping documents stored today for {job.pod_name}")
+            job_env["COMPLETED_DOCUMENTS"] = job.completed_documents
+
+        # A backfill chunk fetches its own date range, for all episodes
+        job_env.pop("BACKFILL", None)
+        if job.start_date and job.end_date:
+            job_env["START_DATE"] = job.start_date
+            job_env["END_DATE"] = job.end_date
+            job_env["BACKFILL"] = "1"
+
+        if JOB_EXECUTION_MODE == "subprocess":
+            # run an external process, switch to right fetcher depending on
+            # source_name, and set env variables from source_access_keys
+            result = subprocess.run(
+                ["python", "-m", "job"],
+                cwd=cwd,
+                env=job_env,
+                text=True,
+                timeout=JOB_TIMEOUT,
+            )
+
+            if result.returncode == 0:
+                return True
+            else:
+                logger.error(
+                    f"Fetching of {job.pod_name} not successful. Subprocess error output: {result.stderr}"
+                )
+                return False
 
-        if result.returncode == 0:
+        # run the pipeline of the source in this process with the job
+        # environment as its configuration
+        returncode = run_pipeline(
+            CONNECTORS_PATH, job.source_name, job_env, JOB_TIMEOUT
+        )
+        if returncode == 0:
             return True
         else:
             logger.error(
-                f"Fetching of {job.pod_name} not successful. Subprocess error output: {result.stderr}"
+                f"Fetching of {job.pod_name} not successful. Pipeline exited with code {returncode}"
             )
             return False
 
@@ -190,6 +238,13 @@ def process_podcast_job(job):
             f"Error: Timeout while fetching {job.pod_name} (exceeded 120 minutes)"
         )
         return False
+    except TimeoutError:
+        logger.error(
+            f"Error: Timeout while fetching {job.pod_name} (exceeded 120 minutes)"
+        )
+        # The pipeline still runs in this process, the job fails so that the
+        # worker processes of the source are replaced (see SourcePools)
+        raise
     except Exception as e:
         logger.error(f"Exception while fetching {job.pod_name}: {e}")
         return False
@@ -199,12 +254,17 @@ def process_podcast_job(job):
             db.close()
 
 
-def process_source_jobs(source_jobs):
+def init_source_worker(source_name):
     """
-    Process all jobs for a single source sequentially.
+    Initializer of the worker processes of a source.
+
+    Imports the pipeline (and its connector library) of the source once when
+    the process starts, so all jobs that run in this process reuse it.
     """
-    source_results = []
-    for job in source_jobs:
-        result = process_podcast_job(job)
-        source_results.append(result)
-    return source_results
+    if JOB_EXECUTION_MODE == "subprocess":
+        return
+    try:
+        load_pipeline(CONNECTORS_PATH, source_name)
+    except Exception as e:
+        # the job itself reports the error again when it runs
+        logger.error(f"Cannot load pipeline for {source_name}: {e}")
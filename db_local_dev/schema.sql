@@ -6,7 +6,11 @@ CREATE TABLE IF NOT EXISTS openpodcast.updates (
   endpoint VARCHAR(64) NOT NULL,
   created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
   update_data JSON NOT NULL,
-  PRIMARY KEY (created, account_id, endpoint)
+  PRIMARY KEY (created, account_id, endpoint),
+  -- Used by the connector manager to count the updates of a podcast and source
+  -- per day. On existing databases, create it with:
+  -- ALTER TABLE openpodcast.updates ADD INDEX updates_account_provider_created (account_id, provider, created);
+  INDEX updates_account_provider_created (account_id, provider, created)
 );
 
 CREATE TABLE IF NOT EXISTS openpodcast.podcasts (
@@ -0,0 +1,97 @@
+import queue
+import threading
+from typing import Any, Callable, Iterable, Optional
+
+from loguru import logger
+
+# Number of items waiting in the queue per worker thread
+QUEUE_SIZE_PER_WORKER = 4
+
+
+class Executor:
+    """
+    Runs `work(item)` for every submitted item (e.g. a `FetchParams`) on a
+    pool of worker threads.
+
+    The queue between the producer and the workers is bounded: `submit`
+    blocks while the queue is full. Items can therefore be generated lazily
+    (e.g. while episodes are still being listed) without ever holding more
+    than a few of them in memory.
+
+    Use the executor as a context manager. When leaving the block, all
+    submitted items are processed and the worker threads are stopped, also
+    if the producer failed, so no threads outlive a pipeline run that is
+    executed in-process by the connector manager.
+    """
+
+    def __init__(
+        self,
+        work: Callable[[Any], None],
+        num_workers: int = 1,
+        queue_size: Optional[int] = None,
+    ):
+        self.work = work
+        self.num_workers = max(1, num_workers)
+        self.queue = queue.Queue(
+            maxsize=queue_size or self.num_workers * QUEUE_SIZE_PER_WORKER
+        )
+        self.closed = False
+        self.threads = [
+            threading.Thread(target=self._worker, daemon=True)
+            for _ in range(self.num_workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, item: Any) -> None:
+        """
+        Queue an item, waiting while the queue is full.
+        """
+        if self.closed:
+            raise RuntimeError("Cannot submit items to a closed executor")
+        self.queue.put(item)
+
+    def map(self, items: Iterable[Any]) -> None:
+        """
+        Queue all items of an iterable (or generator) as the workers can take them.
+        """
+        for item in items:
+            self.submit(item)
+
+    def join(self) -> None:
+        """
+        Wait until all submitted items have been processed.
+        """
+        self.queue.join()
+
+    def close(self) -> None:
+        """
+        Process the remaining items and stop the worker threads.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        # `None` signals that all items have been processed
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def __enter__(self) -> "Executor":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _worker(self) -> None:
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    break
+                self.work(item)
+            except Exception as e:
+                # keep the worker alive, so the remaining items are processed
+                logger.error(f"Error while processing {item}: {e}")
+            finally:
+                self.queue.task_done()
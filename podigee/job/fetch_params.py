@@ -1,7 +1,12 @@
+import json
+from collections import Counter
 from datetime import datetime
-from typing import Any, Callable, Dict
+from typing import Any, Callable, Dict, List, Set, Tuple
 from dataclasses import dataclass
 
+# endpoint, episode, start and end date of a document
+Document = Tuple[str, str, str, str]
+
 
 @dataclass
 class FetchParams:
@@ -15,8 +20,52 @@ class FetchParams:
     end_date: datetime
     meta: Dict[str, Any] = None
 
+    def document(self) -> Document:
+        """
+        Key of the document sent to the Open Podcast API: endpoint, episode
+        ("" for the show) and date range.
+        """
+        return (
+            self.openpodcast_endpoint,
+            str((self.meta or {}).get("episode", "")),
+            self.start_date.strftime("%Y-%m-%d"),
+            self.end_date.strftime("%Y-%m-%d"),
+        )
+
     def output_path(self) -> str:
         """
         Returns the path to the output file for this FetchParams object.
         """
         return f"{self.save_location}/{self.openpodcast_endpoint}-{self.start_date}-{self.end_date}.json"
+
+
+def parse_completed(value: str) -> Set[Document]:
+    """
+    Parse the documents stored today, passed by the connector manager as a
+    JSON list of `[endpoint, episode, start, end]`.
+    """
+    if not value:
+        return set()
+    return {tuple(document) for document in json.loads(value)}
+
+
+def skip_completed(
+    endpoints: List[FetchParams], completed: Set[Document]
+) -> List[FetchParams]:
+    """
+    Remove documents which were already stored today, e.g. by a run that was
+    aborted. `completed` holds the keys (see `FetchParams.document`) of the
+    stored documents.
+
+    Documents whose key is used several times (e.g. two documents of the same
+    endpoint and date range) are kept, as the key does not tell which of them
+    was stored.
+    """
+    if not completed:
+        return endpoints
+    counts = Counter(params.document() for params in endpoints)
+    return [
+        params
+        for params in endpoints
+        if params.document() not in completed or counts[params.document()] > 1
+    ]
@@ -1,7 +1,54 @@
 import datetime as dt
+import gzip
+import json
 import types
+
 import requests
 from loguru import logger
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Retry requests that fail on the connection level (e.g. a keep-alive connection
+# reset by the server) with exponential backoff. Read errors and timeouts are not
+# retried, as the server may have stored the data already. HTTP error responses
+# are not retried here either; they are logged by the caller.
+RETRY = Retry(
+    total=3, connect=3, read=0, status=0, backoff_factor=0.5, allowed_methods=None
+)
+
+# Bodies smaller than this are sent uncompressed, as compressing them
+# does not pay off.
+COMPRESSION_MIN_BYTES = 1024
+
+
+def supported_encodings() -> tuple:
+    """
+    Returns the request content codings this client can produce,
+    in order of preference.
+    """
+    return ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: str):
+    """
+    Pick the preferred content coding from an `Accept-Encoding` header the
+    API sent to announce which request codings it accepts (RFC 7694).
+    Returns None if none of them is supported.
+    """
+    accepted = {
+        coding.split(";")[0].strip().lower() for coding in accept_encoding.split(",")
+    }
+    return next((c for c in supported_encodings() if c in accepted), None)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """
+    Compress a request body with the given content coding, one of
+    `supported_encodings()`.
+    """
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    raise ValueError(f"Unsupported content coding `{encoding}`")
 
 
 class OpenPodcastConnector:
@@ -9,7 +56,14 @@ class OpenPodcastConnector:
     Client for Open Podcast API.
     """
 
-    def __init__(self, url: str, token: str, podcast_id: str):
+    def __init__(
+        self,
+        url: str,
+        token: str,
+        podcast_id: str,
+        pool_size: int = 1,
+        compression: str = "gzip",
+    ):
         self.url = url
         self.token = token
         self.headers = {"Authorization": f"Bearer {self.token}"}
@@ -17,6 +71,24 @@ class OpenPodcastConnector:
             "show": podcast_id,
         }
 
+        # Reuse connections across requests instead of doing a new TCP/TLS
+        # handshake for every payload. The pool is sized to the number of
+        # worker threads posting concurrently.
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_maxsize=pool_size, max_retries=RETRY)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # Content coding used for request bodies (None disables compression).
+        # It is downgraded automatically if the API rejects compressed bodies.
+        if compression in (None, "", "none", "identity"):
+            compression = None
+        elif compression not in supported_encodings():
+            logger.warning(f"Compression `{compression}` not available, using gzip")
+            compression = "gzip"
+        self.content_encoding = compression
+
     def merge_meta(self, endpoint: str, extra_meta: dict):
         """
         Merge meta data with default meta data.
@@ -32,17 +104,10 @@ class OpenPodcastConnector:
             }
         return meta
 
-    def post(self, endpoint, extra_meta, data, start, end):
+    def build_payload(self, endpoint, extra_meta, data, start, end):
         """
-        Send POST request to Open Podcast API.
+        Build the document for a single `/connector` request.
         """
-        if extra_meta and "episode" in extra_meta:
-            logger.info(
-                f"Storing `{endpoint}` [{start} - {end}] for episode {extra_meta['episode']}"
-            )
-        else:
-            logger.info(f"Storing `{endpoint}` [{start} - {end}]")
-
         meta = self.merge_meta(endpoint, extra_meta)
 
         # If the data is a generator, we need convert it to a list with
@@ -62,17 +127,71 @@ class OpenPodcastConnector:
             "data": data,
         }
 
-        logger.debug(f"Payload: {payload}")
+        return payload
 
-        response = requests.post(
-            f"{self.url}/connector", headers=self.headers, json=payload, timeout=60
+    def encode(self, payload) -> bytes:
+        """
+        Serialize a payload to the JSON body sent to the Open Podcast API.
+        """
+        return json.dumps(payload, allow_nan=False).encode("utf-8")
+
+    def send(self, path: str, body: bytes):
+        """
+        Send an already serialized JSON body to the given API path.
+        Large bodies are compressed with the negotiated content coding.
+        """
+        encoding = self.content_encoding
+        if encoding is None or len(body) < COMPRESSION_MIN_BYTES:
+            return self._send(path, body, None)
+
+        response = self._send(path, body, encoding)
+        if response.status_code != 415:
+            return response
+
+        # The API does not accept this content coding. It may list the ones it
+        # does accept, otherwise we fall back to uncompressed bodies.
+        accepted = negotiate_encoding(response.headers.get("Accept-Encoding", ""))
+        self.content_encoding = accepted if accepted != encoding else None
+        logger.warning(
+            f"Open Podcast API rejected `{encoding}` request bodies, "
+            f"switching to `{self.content_encoding or 'identity'}`"
+        )
+        return self._send(path, body, self.content_encoding)
+
+    def _send(self, path: str, body: bytes, encoding):
+        headers = {"Content-Type": "application/json"}
+        if encoding:
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+        return self.session.post(
+            f"{self.url}/{path}", data=body, headers=headers, timeout=60
         )
 
+    def post(self, endpoint, extra_meta, data, start, end, on_success=None):
+        """
+        Send POST request to Open Podcast API.
+        `on_success` is called once the data was stored.
+        """
+        if extra_meta and "episode" in extra_meta:
+            logger.info(
+                f"Storing `{endpoint}` [{start} - {end}] for episode {extra_meta['episode']}"
+            )
+        else:
+            logger.info(f"Storing `{endpoint}` [{start} - {end}]")
+
+        payload = self.build_payload(endpoint, extra_meta, data, start, end)
+
+        logger.debug(f"Payload: {payload}")
+
+        response = self.send("connector", self.encode(payload))
+
         # log error if response is not 200
         if response.status_code != 200:
             logger.error(
                 f"Failed to store `{endpoint}` [{start} - {end}] with status code {response.status_code} and response {response.text}"
             )
+        elif on_success is not None:
+            on_success()
 
         return response
 
@@ -82,4 +201,17 @@ class OpenPodcastConnector:
         """
         logger.info(f"Checking health of {self.url}/health")
         logger.debug(f"Headers: {self.headers}")
-        return requests.get(f"{self.url}/health", headers=self.headers, timeout=60)
+        response = self.session.get(f"{self.url}/health", timeout=60)
+
+        # The API may announce which request content codings it accepts
+        accept_encoding = response.headers.get("Accept-Encoding")
+        if self.content_encoding and accept_encoding:
+            self.content_encoding = negotiate_encoding(accept_encoding)
+
+        return response
+
+    def close(self):
+        """
+        Close all pooled connections.
+        """
+        self.session.close()
@@ -0,0 +1,385 @@
+import sys
+import datetime as dt
+
+from datetime import datetime
+from pathlib import Path
+from typing import Mapping
+
+from job.executor import Executor
+from job.fetch_params import FetchParams, parse_completed, skip_completed
+from job.worker import fetch
+from job.batch import BatchingSink
+from job.open_podcast import OpenPodcastConnector
+from job.load_env import load_file_or_env
+from job.load_env import load_env
+from job.dates import get_date_range
+from job.metadata_cache import DAY, ChangedOnlySink, MetadataCache
+from job.transforms import (
+    transform_podigee_analytics_to_metrics,
+    transform_podigee_podcast_overview,
+)
+from job.date_utils import extract_date_str_from_iso
+
+from loguru import logger
+from podigeeconnector import PodigeeConnector
+
+# Endpoints which are only sent if they changed with POST_ONLY_IF_CHANGED
+CHANGED_ONLY_ENDPOINTS = ("metadata",)
+
+
+def get_request_lambda(f, *args, **kwargs):
+    """
+    Capture arguments in the closure so we can use them later in the call
+    to ensure call by value and not call by reference.
+    """
+    return lambda: f(*args, **kwargs)
+
+
+def run(config: Mapping[str, str]) -> None:
+    """
+    Fetch all data for one podcast from Podigee and send it to the Open Podcast API.
+
+    `config` holds the settings that are read from the environment when the
+    pipeline is started as `python -m job`. Exits via `sys.exit` if the
+    configuration is invalid.
+    """
+    print("Initializing environment")
+
+    OPENPODCAST_API_ENDPOINT = config.get(
+        "OPENPODCAST_API_ENDPOINT", "https://api.openpodcast.dev"
+    )
+    OPENPODCAST_API_TOKEN = load_file_or_env("OPENPODCAST_API_TOKEN", env=config)
+
+    # Number of documents sent per request to the Open Podcast API.
+    # Batching needs `/connector/batch` support on the API side and is disabled
+    # by default (with a value of 1 or lower, every document is sent on its own).
+    OPENPODCAST_BATCH_SIZE = int(config.get("OPENPODCAST_BATCH_SIZE", "0"))
+    OPENPODCAST_BATCH_MAX_BYTES = int(
+        config.get("OPENPODCAST_BATCH_MAX_BYTES", str(4 * 1024 * 1024))
+    )
+    OPENPODCAST_BATCH_MAX_WAIT = float(config.get("OPENPODCAST_BATCH_MAX_WAIT", "30"))
+
+    # Content coding for large request bodies: `gzip` (default) or `none`
+    OPENPODCAST_COMPRESSION = config.get("OPENPODCAST_COMPRESSION", "gzip").lower()
+
+    BASE_URL = load_file_or_env(
+        "PODIGEE_BASE_URL", "https://app.podigee.com/api/v1", env=config
+    )
+
+    # Podigee podcast IDs are integers and different from Open Podcast IDs
+    # One Podigee account can have multiple podcasts, so we need to specify the podcast ID
+    # of the podcast we want to fetch data for
+    PODCAST_ID = load_file_or_env("PODCAST_ID", env=config)
+
+    # Podigee authentication
+    PODIGEE_ACCESS_TOKEN = load_file_or_env("PODIGEE_ACCESS_TOKEN", env=config)
+    PODIGEE_USERNAME = load_file_or_env("PODIGEE_USERNAME", env=config)
+    PODIGEE_PASSWORD = load_file_or_env("PODIGEE_PASSWORD", env=config)
+
+    # Number of worker threads to fetch data from the Podigee API by default
+    NUM_WORKERS = int(config.get("NUM_WORKERS", 1))
+
+    # Documents which were already stored today, set by the connector manager
+    # when it resumes an aborted run. They are not fetched again.
+    COMPLETED_DOCUMENTS = parse_completed(config.get("COMPLETED_DOCUMENTS", ""))
+
+    # Only send podcast and episode metadata which changed since it was last
+    # stored, according to the hashes kept in METADATA_CACHE_DIR (shared
+    # between runs). Unchanged documents are sent again after
+    # POST_UNCHANGED_AFTER_DAYS days.
+    METADATA_CACHE_DIR = load_env("METADATA_CACHE_DIR", env=config)
+    POST_ONLY_IF_CHANGED = config.get("POST_ONLY_IF_CHANGED", "").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+    POST_UNCHANGED_AFTER_DAYS = float(config.get("POST_UNCHANGED_AFTER_DAYS", "7"))
+
+    # Start- and end-date for the data we want to fetch
+    # Load from environment variable if set, otherwise set to defaults
+    # Podigee default is last 30 days
+    TODAY_DATE = dt.datetime.now()
+    START_DATE = load_env(
+        "START_DATE",
+        (dt.datetime.now() - dt.timedelta(days=31)).strftime("%Y-%m-%d"),
+        env=config,
+    )
+    END_DATE = load_env(
+        "END_DATE",
+        (dt.datetime.now() - dt.timedelta(days=1)).strftime("%Y-%m-%d"),
+        env=config,
+    )
+
+    date_range = get_date_range(START_DATE, END_DATE)
+
+    # check if all required environment variables are set
+    always_required = {"OPENPODCAST_API_TOKEN": OPENPODCAST_API_TOKEN}
+    missing_always_required = [
+        name for name, value in always_required.items() if value is None
+    ]
+
+    if len(missing_always_required):
+        logger.error(
+            f"Missing required environment variables: {', '.join(missing_always_required)}. Exiting..."
+        )
+        sys.exit(1)
+
+    # Check authentication methods - require either API token OR username+password
+    has_api_token = PODIGEE_ACCESS_TOKEN is not None
+    has_credentials = PODIGEE_USERNAME is not None and PODIGEE_PASSWORD is not None
+
+    if not has_api_token and not has_credentials:
+        logger.error(
+            "Missing Podigee authentication. Please provide either PODIGEE_ACCESS_TOKEN or both PODIGEE_USERNAME and PODIGEE_PASSWORD. Exiting..."
+        )
+        sys.exit(1)
+
+    print("Done initializing environment")
+
+    # Try API token first (preferred method), fallback to username/password
+    if has_api_token:
+        logger.info("Using Podigee API token for authentication")
+        podigee = PodigeeConnector(
+            base_url=BASE_URL,
+            podigee_access_token=PODIGEE_ACCESS_TOKEN,
+        )
+    else:
+        logger.info(
+            "Fallback: Using Podigee username/password for authentication. Set API token to use it instead."
+        )
+        podigee = PodigeeConnector.from_credentials(
+            base_url=BASE_URL,
+            username=PODIGEE_USERNAME,
+            password=PODIGEE_PASSWORD,
+        )
+
+    podcasts = podigee.podcasts()
+
+    if not podcasts:
+        logger.error("No podcasts found")
+        sys.exit(1)
+
+    # if no podcast id is set, just list the available podcasts and exit
+    if not PODCAST_ID or PODCAST_ID.strip() == "":
+        logger.info("No PODCAST_ID set, listing available podcasts:")
+        for p in podcasts:
+            logger.info(f"Found podcast: {p['title']} (ID: {p['id']})")
+        sys.exit(0)
+
+    # The Podigee podcast ID is expected to be an integer
+    # Try to convert it to an integer, if it fails, this throws exception
+    try:
+        PODCAST_ID = int(PODCAST_ID)
+    except ValueError:
+        logger.error(f"PODCAST_ID must be an integer, got: {PODCAST_ID}")
+        sys.exit(1)
+
+    # Find the podcast we want to work with
+    podcast = None
+    for p in podcasts:
+        if p["id"] == PODCAST_ID:
+            podcast = p
+            break
+
+    if not podcast:
+        logger.error(
+            f"Podcast with ID {PODCAST_ID} not found. Available podcasts: {[p['id'] for p in podcasts]}"
+        )
+        sys.exit(1)
+
+    # Extract and validate podcast title
+    podcast_title = podcast.get("title")
+    # published at format is "2022-01-25T22:19:42Z"
+    podcast_published_at = datetime.fromisoformat(
+        podcast.get("published_at").replace("Z", "+00:00")
+    )
+
+    if not podcast_title:
+        logger.error(f"Podcast with ID {PODCAST_ID} has no title")
+        sys.exit(1)
+
+    open_podcast = OpenPodcastConnector(
+        OPENPODCAST_API_ENDPOINT,
+        OPENPODCAST_API_TOKEN,
+        PODCAST_ID,
+        pool_size=NUM_WORKERS,
+        compression=OPENPODCAST_COMPRESSION,
+    )
+
+    # Check that the Open Podcast API is healthy
+    response = open_podcast.health()
+    if response.status_code != 200:
+        logger.error(
+            f"Open Podcast API healthcheck failed with status code {response.status_code}"
+        )
+        sys.exit(1)
+
+    # Send documents in batches if enabled, otherwise post them one by one
+    sink = open_podcast
+    if OPENPODCAST_BATCH_SIZE > 1:
+        sink = BatchingSink(
+            open_podcast,
+            max_items=OPENPODCAST_BATCH_SIZE,
+            max_bytes=OPENPODCAST_BATCH_MAX_BYTES,
+            max_wait=OPENPODCAST_BATCH_MAX_WAIT,
+        )
+
+    # The metadata is part of the episode list, so there are no API calls to
+    # cache, but unchanged documents need not be sent again. A resumed run
+    # sends everything, so today's number of updates catches up with
+    # yesterday's and the run is not repeated again.
+    metadata_cache = None
+    post_sink = sink
+    if METADATA_CACHE_DIR and POST_ONLY_IF_CHANGED and not COMPLETED_DOCUMENTS:
+        metadata_cache = MetadataCache(
+            Path(METADATA_CACHE_DIR) / "podigee.sqlite3", str(PODCAST_ID), {}
+        )
+        post_sink = ChangedOnlySink(
+            sink,
+            metadata_cache,
+            CHANGED_ONLY_ENDPOINTS,
+            POST_UNCHANGED_AFTER_DAYS * DAY,
+        )
+
+    def get_podcast_metadata():
+        """
+        Get podcast metadata formatted for OpenPodcast API.
+        """
+        return {"name": podcast_title}
+
+    endpoints = [
+        # Podcast metadata - get basic podcast information
+        FetchParams(
+            openpodcast_endpoint="metadata",
+            podigee_call=get_podcast_metadata,
+            start_date=date_range.start,
+            end_date=date_range.end,
+        ),
+        # Podcast metrics like apps and platforms and downloads per day of last 30 days
+        FetchParams(
+            openpodcast_endpoint="metrics",
+            podigee_call=lambda: transform_podigee_analytics_to_metrics(
+                podigee.podcast_analytics(
+                    PODCAST_ID, start=date_range.start, end=date_range.end
+                ),
+                # we fetch this just every week on Monday and the first day of the month
+                # daily downloads are stored every day
+                not (TODAY_DATE.weekday() == 0 or TODAY_DATE.day == 1),
+            ),
+            start_date=date_range.start,
+            end_date=date_range.end,
+        ),
+        # Fetch total downloads since beginning which is returned in months
+        # the current month is not complete and is updated every day
+        # important: end date is in the future for the current month, as it is always the last day of the month
+        FetchParams(
+            openpodcast_endpoint="metrics",
+            podigee_call=lambda: transform_podigee_analytics_to_metrics(
+                podigee.podcast_analytics(
+                    PODCAST_ID, start=podcast_published_at, end=date_range.end
+                ),
+                store_downloads_only=True,
+            ),
+            start_date=podcast_published_at,
+            end_date=date_range.end,
+        ),
+        # Fetch overview metrics for the podcast, endpoint "overview"
+        FetchParams(
+            openpodcast_endpoint="metrics",
+            podigee_call=lambda: transform_podigee_podcast_overview(
+                podigee.podcast_overview(
+                    PODCAST_ID, start=date_range.start, end=date_range.end
+                ),
+            ),
+            start_date=date_range.start,
+            end_date=date_range.end,
+        ),
+    ]
+
+    episodes = podigee.episodes(PODCAST_ID)
+
+    for episode in episodes:
+        print(episode)
+        episode_published_at_str = extract_date_str_from_iso(
+            episode.get("published_at", "")
+        )
+        # Convert to datetime object for API calls
+        episode_published_at = (
+            datetime.strptime(episode_published_at_str, "%Y-%m-%d")
+            if episode_published_at_str
+            else date_range.start
+        )
+        endpoints += [
+            # Episode metadata - basic episode information
+            FetchParams(
+                openpodcast_endpoint="metadata",
+                podigee_call=get_request_lambda(
+                    lambda ep: {
+                        "ep_name": ep.get("title", ""),
+                        "ep_url": ep.get("url", ""),
+                        "ep_release_date": ep.get("published_at", ""),
+                    },
+                    episode,
+                ),
+                start_date=date_range.start,
+                end_date=date_range.end,
+                meta={"episode": str(episode["id"])},
+            ),
+            # Episode metrics - analytics data for the episode
+            FetchParams(
+                openpodcast_endpoint="metrics",
+                podigee_call=get_request_lambda(
+                    lambda ep_id: transform_podigee_analytics_to_metrics(
+                        podigee.episode_analytics(
+                            ep_id,
+                            granularity=None,
+                            start=date_range.start,
+                            end=date_range.end,
+                        ),
+                        # for now we just store the downloads and do not store platforms etc. per episode
+                        store_downloads_only=True,
+                    ),
+                    str(episode["id"]),
+                ),
+                start_date=date_range.start,
+                end_date=date_range.end,
+                meta={"episode": str(episode["id"])},
+            ),
+            # We store the downloads since publication. The Podigee API returns one data point per month.
+            FetchParams(
+                openpodcast_endpoint="metrics",
+                podigee_call=get_request_lambda(
+                    lambda ep_id: transform_podigee_analytics_to_metrics(
+                        podigee.episode_analytics(
+                            ep_id,
+                            granularity="monthly",
+                            start=episode_published_at,
+                            end=date_range.end,
+                        ),
+                        store_downloads_only=True,
+                    ),
+                    str(episode["id"]),
+                ),
+                start_date=episode_published_at,
+                end_date=date_range.end,
+                meta={"episode": str(episode["id"])},
+            ),
+        ]
+
+    # Skip endpoints which were stored today by an aborted run
+    endpoints = skip_completed(endpoints, COMPLETED_DOCUMENTS)
+
+    # Process the FetchParams objects on a pool of worker threads. The workers
+    # stop once all endpoints are processed
+    with Executor(lambda params: fetch(post_sink, params), NUM_WORKERS) as executor:
+        executor.map(endpoints)
+
+    # Send the remainder of the last batch
+    if isinstance(sink, BatchingSink):
+        sink.flush()
+    open_podcast.close()
+    if metadata_cache is not None:
+        logger.info(f"Skipped {post_sink.skipped} unchanged metadata documents")
+        metadata_cache.close()
+
+    print("All items processed.")
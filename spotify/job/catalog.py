@@ -0,0 +1,138 @@
+import datetime as dt
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+from loguru import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS episode_catalog (
+    show TEXT NOT NULL,
+    episode TEXT NOT NULL,
+    release_date TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (show, episode)
+);
+CREATE TABLE IF NOT EXISTS catalog_refreshes (
+    show TEXT PRIMARY KEY,
+    refreshed_on TEXT NOT NULL
+);
+"""
+
+
+class EpisodeCatalog:
+    """
+    Keeps the episode list of a show between runs, so that not every run
+    has to page through the whole history of the show.
+
+    The episodes are listed newest first. Between full refreshes, the
+    listing stops at the first episode which is already in the catalog and
+    older than the newest known episode (usually on the first page), and all
+    other episodes are taken from the catalog. Every `refresh_days` days,
+    all episodes are listed again, which also removes deleted episodes.
+
+    Episodes taken from the catalog have the numbers of the run in which
+    they were listed last, their IDs are in `cached`.
+    """
+
+    def __init__(self, path: Path, show: str, today: dt.datetime, refresh_days: int):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.show = show
+        self.today = today
+        self.refresh_days = refresh_days
+        self.listed = 0
+        self.cached = set()
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(
+            str(path), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def needs_full_refresh(self) -> bool:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT refreshed_on FROM catalog_refreshes WHERE show = ?",
+                (self.show,),
+            ).fetchone()
+        if row is None:
+            return True
+        refreshed_on = dt.datetime.strptime(row[0], "%Y-%m-%d")  # noqa: DTZ007
+        return self.today - refreshed_on >= dt.timedelta(days=self.refresh_days)
+
+    def episodes(self, list_episodes: Callable[[], Iterable[dict]]) -> Iterator[dict]:
+        """
+        Yield all episodes of the show. `list_episodes` lists them from the
+        API, sorted by release date (newest first).
+        """
+        if self.needs_full_refresh():
+            yield from self._full_refresh(list_episodes())
+            return
+
+        known = self._load()
+        latest = max((release_date for release_date, _ in known.values()), default="")
+        seen = set()
+        for episode in list_episodes():
+            episode_id = episode["id"]
+            release_date = episode.get("releaseDate") or ""
+            if episode_id in known and release_date < latest:
+                break
+            self._store(episode)
+            seen.add(episode_id)
+            self.listed += 1
+            yield episode
+
+        for episode_id, (_, data) in sorted(
+            known.items(), key=lambda item: item[1][0], reverse=True
+        ):
+            if episode_id not in seen:
+                self.cached.add(episode_id)
+                yield json.loads(data)
+
+    def _full_refresh(self, listed: Iterable[dict]) -> Iterator[dict]:
+        removed = set(self._load())
+        for episode in listed:
+            self._store(episode)
+            removed.discard(episode["id"])
+            self.listed += 1
+            yield episode
+
+        # Only reached if all episodes were listed
+        with self.lock:
+            self.db.executemany(
+                "DELETE FROM episode_catalog WHERE show = ? AND episode = ?",
+                [(self.show, episode_id) for episode_id in removed],
+            )
+            self.db.execute(
+                "INSERT OR REPLACE INTO catalog_refreshes VALUES (?, ?)",
+                (self.show, self.today.strftime("%Y-%m-%d")),
+            )
+
+    def _load(self) -> dict:
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT episode, release_date, data FROM episode_catalog WHERE show = ?",
+                (self.show,),
+            ).fetchall()
+        return {episode: (release_date, data) for episode, release_date, data in rows}
+
+    def _store(self, episode: dict) -> None:
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO episode_catalog VALUES (?, ?, ?, ?)",
+                (
+                    self.show,
+                    episode["id"],
+                    episode.get("releaseDate") or "",
+                    json.dumps(episode),
+                ),
+            )
+
+    def close(self) -> None:
+        logger.info(
+            f"Listed {self.listed} episodes, took {len(self.cached)} from the episode catalog"
+        )
+        with self.lock:
+            self.db.close()
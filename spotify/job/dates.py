@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import Optional, Tuple
 import datetime as dt
 from loguru import logger
 import sys
@@ -34,6 +34,16 @@ class DateRange:
             end = min(self.start + dt.timedelta(days=i + days_per_chunk), self.end)
             yield (start, end)
 
+    def since(self, start: dt.datetime) -> Optional["DateRange"]:
+        """
+        The part of the range from `start` on (e.g. the release date of an
+        episode), or None if `start` is after the end of the range.
+        """
+        start = max(start, self.start)
+        if start > self.end:
+            return None
+        return DateRange(start, self.end)
+
     def __str__(self) -> str:
         """
         Return a string representation of the date range.
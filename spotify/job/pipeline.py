@@ -0,0 +1,627 @@
+import datetime as dt
+import sys
+from pathlib import Path
+from typing import Mapping
+
+from loguru import logger
+from spotifyconnector.connector import CredentialsExpired
+
+from job.dates import get_date_range
+from job.executor import Executor, prefetch
+from job.fetch_params import FetchParams, parse_completed, skip_completed
+from job.load_env import load_env, load_file_or_env
+from job.metadata_cache import DAY, ChangedOnlySink, MetadataCache, parse_ttls
+from job.activity import ActivityPlanner
+from job.catalog import EpisodeCatalog
+from job.batch import BatchingSink
+from job.open_podcast import OpenPodcastConnector
+from job.rate_limit import RateLimitedSpotifyConnector, connect_limiter
+from job.spotify import (
+    aggregate_or_empty,
+    empty_aggregate,
+    get_episode_plays,
+    get_episode_release_date,
+    normalize_performance,
+    zero_stream_days,
+)
+from job.watermarks import WatermarkStore, days_to_fetch
+from job.worker import fetch
+
+
+# The Spotify API imposes exactly 30 days of data for "total" and "faceted" impressions
+# (The diff is 29 because both start and end dates are inclusive)
+IMPRESSIONS_DAYS_DIFF = 29
+
+# Days for which API responses of rarely changing endpoints are reused from
+# the metadata cache (overridden with METADATA_CACHE_TTLS)
+METADATA_CACHE_TTL_DAYS = {"episodeMetadata": 7}
+
+# Endpoints which are only sent if they changed with POST_ONLY_IF_CHANGED
+CHANGED_ONLY_ENDPOINTS = ("episodeMetadata",)
+
+# Show-level endpoints with the state of the show today (e.g. the impressions
+# of the last 30 days), not the numbers of the date range. The chunks of a
+# backfill do not send them.
+CURRENT_ENDPOINTS = (
+    "metadata",
+    "followers",
+    "impressions_total",
+    "impressions_faceted",
+    "impressions_daily",
+    "impressions_funnel",
+)
+
+
+def get_request_lambda(f, *args, **kwargs):
+    """
+    Capture arguments in the closure so we can use them later in the call
+    to ensure call by value and not call by reference.
+    """
+    return lambda: f(*args, **kwargs)
+
+
+def run(config: Mapping[str, str]) -> None:
+    """
+    Fetch all data for one podcast from Spotify and send it to the Open Podcast API.
+
+    `config` holds the settings that are read from the environment when the
+    pipeline is started as `python -m job`. Exits via `sys.exit` if the
+    configuration is invalid.
+    """
+    try:
+        print("Initializing environment")
+
+        BASE_URL = load_file_or_env(
+            "SPOTIFY_BASE_URL",
+            "https://generic.wg.spotify.com/podcasters/v0",
+            env=config,
+        )
+
+        # Spotify client ID which represents the app (in our case the podcasters app)
+        SPOTIFY_CLIENT_ID = load_file_or_env(
+            "SPOTIFY_CLIENT_ID", "05a1371ee5194c27860b3ff3ff3979d2", env=config
+        )
+
+        # Spotify cookies needed to authenticate
+        SP_DC = load_file_or_env("SPOTIFY_SP_DC", env=config)
+        SP_KEY = load_file_or_env("SPOTIFY_SP_KEY", env=config)
+
+        # ID of the podcast we want to fetch data for
+        SPOTIFY_PODCAST_ID = load_file_or_env("SPOTIFY_PODCAST_ID", env=config)
+
+        OPENPODCAST_API_ENDPOINT = config.get(
+            "OPENPODCAST_API_ENDPOINT", "https://api.openpodcast.dev"
+        )
+        OPENPODCAST_API_TOKEN = load_file_or_env("OPENPODCAST_API_TOKEN", env=config)
+
+        # Number of documents sent per request to the Open Podcast API.
+        # Batching needs `/connector/batch` support on the API side and is disabled
+        # by default (with a value of 1 or lower, every document is sent on its own).
+        OPENPODCAST_BATCH_SIZE = int(config.get("OPENPODCAST_BATCH_SIZE", "0"))
+        OPENPODCAST_BATCH_MAX_BYTES = int(
+            config.get("OPENPODCAST_BATCH_MAX_BYTES", str(4 * 1024 * 1024))
+        )
+        OPENPODCAST_BATCH_MAX_WAIT = float(
+            config.get("OPENPODCAST_BATCH_MAX_WAIT", "30")
+        )
+
+        # Content coding for large request bodies: `gzip` (default) or `none`
+        OPENPODCAST_COMPRESSION = config.get("OPENPODCAST_COMPRESSION", "gzip").lower()
+
+        # ID of the podcast we want to fetch data for
+        SPOTIFY_PODCAST_ID = load_file_or_env("SPOTIFY_PODCAST_ID", env=config)
+
+        # if SPOTIFY_PODCAST_ID is not set, try to use PODCAST_ID instead
+        # this is used by the connector manager to be more generic
+        if not SPOTIFY_PODCAST_ID:
+            SPOTIFY_PODCAST_ID = load_file_or_env("PODCAST_ID", env=config)
+
+        # Number of worker threads to fetch data from the Spotify API by default
+        NUM_WORKERS = int(config.get("NUM_WORKERS", "1"))
+
+        # Documents which were already stored today, set by the connector manager
+        # when it resumes an aborted run. They are not fetched again.
+        COMPLETED_DOCUMENTS = parse_completed(config.get("COMPLETED_DOCUMENTS", ""))
+
+        # API has a rate limit of around 20req/30sec.
+        # All worker threads (and all concurrent runs started by the connector
+        # manager) share this budget
+        RATE_LIMIT_REQUESTS = float(config.get("SPOTIFY_RATE_LIMIT_REQUESTS", "20"))
+        RATE_LIMIT_WINDOW = float(config.get("SPOTIFY_RATE_LIMIT_WINDOW", "30"))
+
+        # Start- and end-date for the data we want to fetch
+        # Load from environment variable if set, otherwise set to defaults
+        START_DATE = load_env(
+            "START_DATE",
+            (dt.datetime.now() - dt.timedelta(days=3)).strftime("%Y-%m-%d"),  # noqa: DTZ005
+            env=config,
+        )
+        END_DATE = load_env(
+            "END_DATE",
+            (dt.datetime.now() - dt.timedelta(days=1)).strftime("%Y-%m-%d"),  # noqa: DTZ005
+            env=config,
+        )
+
+        date_range = get_date_range(START_DATE, END_DATE)
+
+        # Directory for state that is kept between runs. If set, days of the
+        # per-day `aggregate` endpoint which were stored before are skipped.
+        STATE_DIR = load_env("STATE_DIR", env=config)
+
+        # Number of most recent days which are always fetched again, even if they
+        # were stored before, as Spotify still revises the numbers of recent days
+        REVISION_DAYS = int(config.get("SPOTIFY_REVISION_DAYS", "2"))
+
+        # Request the daily stream counts (`detailedStreams`) of the show and
+        # each episode before their aggregates. Days without any streams are sent
+        # as zero aggregates without requesting them one by one, or not at all if
+        # AGGREGATE_SEND_ZERO_DAYS is false.
+        AGGREGATE_ZERO_DAYS_FROM_STREAMS = config.get(
+            "AGGREGATE_ZERO_DAYS_FROM_STREAMS", ""
+        ).lower() in ("1", "true", "yes")
+        AGGREGATE_SEND_ZERO_DAYS = config.get(
+            "AGGREGATE_SEND_ZERO_DAYS", "true"
+        ).lower() in ("1", "true", "yes")
+
+        # Episodes without plays since the last run ("cold" episodes) are only
+        # refreshed every EPISODE_COLD_REFRESH_DAYS days. Episodes released within
+        # the last EPISODE_HOT_DAYS days are always refreshed. Needs STATE_DIR.
+        EPISODE_HOT_DAYS = int(config.get("EPISODE_HOT_DAYS", "30"))
+        EPISODE_COLD_REFRESH_DAYS = int(config.get("EPISODE_COLD_REFRESH_DAYS", "7"))
+
+        # Set by the connector manager for the chunks of a backfill. The
+        # activity of an episode today says nothing about a past date range,
+        # so all episodes are fetched. The CURRENT_ENDPOINTS are not sent.
+        BACKFILL = config.get("BACKFILL", "").lower() in ("1", "true", "yes")
+
+        # Days between full listings of all episodes if STATE_DIR is set. In
+        # between, only newly released episodes are listed and the others are
+        # taken from the episode catalog in STATE_DIR. Their play counts are not
+        # updated then, so they keep their activity (and cold episodes their
+        # refresh cadence) until the next full listing. 1 (default) lists all
+        # episodes in every run.
+        EPISODE_CATALOG_REFRESH_DAYS = int(
+            config.get("EPISODE_CATALOG_REFRESH_DAYS", "1")
+        )
+
+        # Directory of the on-disk cache for rarely changing data like episode
+        # metadata (defaults to STATE_DIR). Responses are reused for the number of
+        # days per endpoint in METADATA_CACHE_TTLS (e.g. `episodeMetadata=7`).
+        METADATA_CACHE_DIR = load_env("METADATA_CACHE_DIR", STATE_DIR, env=config)
+        METADATA_CACHE_TTLS = parse_ttls(
+            config.get("METADATA_CACHE_TTLS"), METADATA_CACHE_TTL_DAYS
+        )
+
+        # Only send metadata which changed since it was last stored. Unchanged
+        # documents are sent again after POST_UNCHANGED_AFTER_DAYS days.
+        POST_ONLY_IF_CHANGED = config.get("POST_ONLY_IF_CHANGED", "").lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+        POST_UNCHANGED_AFTER_DAYS = float(config.get("POST_UNCHANGED_AFTER_DAYS", "7"))
+
+        # check if all needed environment variables are set
+        required_vars = {
+            "SP_DC": SP_DC,
+            "SP_KEY": SP_KEY,
+            "SPOTIFY_PODCAST_ID": SPOTIFY_PODCAST_ID,
+            "OPENPODCAST_API_TOKEN": OPENPODCAST_API_TOKEN,
+        }
+        missing_vars = [name for name, value in required_vars.items() if value is None]
+
+        if len(missing_vars):
+            logger.error(
+                f"Missing required environment variables:  {', '.join(missing_vars)}. Exiting..."
+            )
+            sys.exit(1)
+
+        print("Done initializing environment")
+
+        spotify = RateLimitedSpotifyConnector(
+            base_url=BASE_URL,
+            client_id=SPOTIFY_CLIENT_ID,
+            podcast_id=SPOTIFY_PODCAST_ID,
+            sp_dc=SP_DC,
+            sp_key=SP_KEY,
+            limiter=connect_limiter(
+                config, "spotify", RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW
+            ),
+        )
+
+        open_podcast = OpenPodcastConnector(
+            OPENPODCAST_API_ENDPOINT,
+            OPENPODCAST_API_TOKEN,
+            SPOTIFY_PODCAST_ID,
+            pool_size=NUM_WORKERS,
+            compression=OPENPODCAST_COMPRESSION,
+        )
+
+        # Check that the Open Podcast API is healthy
+        response = open_podcast.health()
+        if response.status_code != 200:
+            logger.error(
+                f"Open Podcast API healthcheck failed with status code {response.status_code}"
+            )
+            sys.exit(1)
+
+        # Send documents in batches if enabled, otherwise post them one by one
+        sink = open_podcast
+        if OPENPODCAST_BATCH_SIZE > 1:
+            sink = BatchingSink(
+                open_podcast,
+                max_items=OPENPODCAST_BATCH_SIZE,
+                max_bytes=OPENPODCAST_BATCH_MAX_BYTES,
+                max_wait=OPENPODCAST_BATCH_MAX_WAIT,
+            )
+
+        # Use a clean date for "today" at midnight. This avoids issues with the
+        # impresions endpoint which requires exact date ranges.
+        # (For "total" and "faceted" impressions, start and end must be exactly IMPRESSIONS_DAYS_DIFF
+        # days apart.
+        # See: https://github.com/openpodcast/spotify-connector/blob/2d3f9722662c06e8f9ddf7816c1ee81906d45655/spotifyconnector/connector.py#L460-L479)
+        # It does not affect any other endpoints
+        todayDate = dt.datetime.now().replace(  # noqa: DTZ005
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        oldestDate = dt.datetime(2015, 5, 1)  # noqa: DTZ001
+
+        watermarks = None
+        planner = None
+        catalog = None
+        stored_aggregates = set()
+        revision_start = todayDate - dt.timedelta(days=REVISION_DAYS)
+        if STATE_DIR:
+            watermarks = WatermarkStore(Path(STATE_DIR) / "spotify.sqlite3")
+            if not BACKFILL:
+                planner = ActivityPlanner(
+                    Path(STATE_DIR) / "spotify.sqlite3",
+                    SPOTIFY_PODCAST_ID,
+                    todayDate,
+                    hot_days=EPISODE_HOT_DAYS,
+                    cold_refresh_days=EPISODE_COLD_REFRESH_DAYS,
+                )
+            if EPISODE_CATALOG_REFRESH_DAYS > 1:
+                catalog = EpisodeCatalog(
+                    Path(STATE_DIR) / "spotify.sqlite3",
+                    SPOTIFY_PODCAST_ID,
+                    todayDate,
+                    EPISODE_CATALOG_REFRESH_DAYS,
+                )
+            stored_aggregates = watermarks.stored_days(
+                SPOTIFY_PODCAST_ID, "aggregate", oldestDate, date_range.end
+            )
+
+        metadata_cache = None
+        post_sink = sink
+        if METADATA_CACHE_DIR:
+            metadata_cache = MetadataCache(
+                Path(METADATA_CACHE_DIR) / "spotify.sqlite3",
+                SPOTIFY_PODCAST_ID,
+                METADATA_CACHE_TTLS,
+            )
+            # A resumed run sends everything, so today's number of updates
+            # catches up with yesterday's and the run is not repeated again
+            if POST_ONLY_IF_CHANGED and not COMPLETED_DOCUMENTS:
+                post_sink = ChangedOnlySink(
+                    sink,
+                    metadata_cache,
+                    CHANGED_ONLY_ENDPOINTS,
+                    POST_UNCHANGED_AFTER_DAYS * DAY,
+                )
+
+        def cached(endpoint, key, call):
+            """
+            Result of the API call, from the metadata cache if enabled
+            """
+            if metadata_cache is None:
+                return call()
+            return metadata_cache.cached(endpoint, key, call)
+
+        def aggregate_days(days, episode_id=""):
+            """
+            Days for which the aggregate has to be fetched
+            """
+            if watermarks is None:
+                return list(days)
+            return days_to_fetch(days, stored_aggregates, episode_id, revision_start)
+
+        def mark_aggregate_stored(day, episode_id=""):
+            """
+            Callback to remember that the aggregate of this day was stored
+            """
+            if watermarks is None:
+                return None
+            return lambda: watermarks.mark_stored(
+                SPOTIFY_PODCAST_ID, episode_id, "aggregate", day
+            )
+
+        def fetch_streams(episode_id=None):
+            """
+            Daily stream counts of the show or an episode for the date range if
+            AGGREGATE_ZERO_DAYS_FROM_STREAMS is set. They are sent as the
+            `detailedStreams` endpoint and tell which days had no streams.
+            None if not set or the request fails.
+            """
+            if not AGGREGATE_ZERO_DAYS_FROM_STREAMS:
+                return None
+            try:
+                return spotify.streams(
+                    date_range.start, date_range.end, episode=episode_id
+                )
+            except Exception as e:
+                logger.warning(
+                    f"Failed to fetch the daily streams of {episode_id or 'the show'}, "
+                    f"requesting all aggregates: {e}"
+                )
+                return None
+
+        def streams_call(streams, episode_id=None):
+            """
+            Call for the `detailedStreams` endpoint, which reuses the stream counts
+            if they were fetched already
+            """
+            if streams is not None:
+                return lambda: streams
+            return get_request_lambda(
+                spotify.streams, date_range.start, date_range.end, episode=episode_id
+            )
+
+        def aggregate_endpoints(days, episode_id="", streams=None):
+            """
+            Fetch aggregate data for each individual day, otherwise we get all
+            data merged into one. Days without streams are sent as zero aggregates.
+            """
+            zero_days = zero_stream_days(streams)
+            for current_date in aggregate_days(days, episode_id):
+                mark_stored = mark_aggregate_stored(current_date, episode_id)
+                if current_date.strftime("%Y-%m-%d") in zero_days:
+                    if not AGGREGATE_SEND_ZERO_DAYS:
+                        if mark_stored is not None:
+                            mark_stored()
+                        continue
+                    call = get_request_lambda(
+                        empty_aggregate, current_date, current_date
+                    )
+                else:
+                    call = get_request_lambda(
+                        aggregate_or_empty,
+                        get_request_lambda(
+                            spotify.aggregate,
+                            current_date,
+                            current_date,
+                            episode=episode_id or None,
+                        ),
+                        current_date,
+                        current_date,
+                    )
+                yield FetchParams(
+                    openpodcast_endpoint="aggregate",
+                    spotify_call=call,
+                    start_date=current_date,
+                    end_date=current_date,
+                    meta={"episode": episode_id} if episode_id else None,
+                    on_success=mark_stored,
+                )
+
+        show_streams = fetch_streams()
+
+        # Show-level endpoints, which are sent to the workers first
+        show_endpoints = [
+            FetchParams(
+                openpodcast_endpoint="metadata",
+                spotify_call=lambda: spotify.metadata(),
+                start_date=date_range.start,
+                end_date=date_range.end,
+            ),
+            FetchParams(
+                openpodcast_endpoint="listeners",
+                spotify_call=get_request_lambda(
+                    spotify.listeners, date_range.start, date_range.end
+                ),
+                start_date=date_range.start,
+                end_date=date_range.end,
+            ),
+            FetchParams(
+                openpodcast_endpoint="detailedStreams",
+                spotify_call=streams_call(show_streams),
+                start_date=date_range.start,
+                end_date=date_range.end,
+            ),
+            FetchParams(
+                openpodcast_endpoint="followers",
+                spotify_call=get_request_lambda(
+                    spotify.followers, date_range.start, date_range.end
+                ),
+                start_date=date_range.start,
+                end_date=date_range.end,
+            ),
+            FetchParams(
+                openpodcast_endpoint="impressions_total",
+                # Total impressions are only available for the last 30 days
+                spotify_call=get_request_lambda(
+                    spotify.impressions,
+                    "total",
+                    todayDate - dt.timedelta(days=IMPRESSIONS_DAYS_DIFF),
+                    todayDate,
+                ),
+                start_date=date_range.start,
+                end_date=date_range.end,
+            ),
+            FetchParams(
+                openpodcast_endpoint="impressions_faceted",
+                spotify_call=get_request_lambda(
+                    # Faceted impressions are only available for the last 30 days
+                    spotify.impressions,
+                    "faceted",
+                    todayDate - dt.timedelta(days=IMPRESSIONS_DAYS_DIFF),
+                    todayDate,
+                ),
+                start_date=date_range.start,
+                end_date=date_range.end,
+            ),
+            FetchParams(
+                openpodcast_endpoint="impressions_daily",
+                spotify_call=get_request_lambda(
+                    spotify.impressions,
+                    "daily",
+                    todayDate - dt.timedelta(days=14),
+                    todayDate,
+                ),
+                start_date=date_range.start,
+                end_date=date_range.end,
+            ),
+            FetchParams(
+                openpodcast_endpoint="impressions_funnel",
+                spotify_call=get_request_lambda(
+                    spotify.impressions,
+                    "funnel",
+                    todayDate - dt.timedelta(days=14),
+                    todayDate,
+                ),
+                start_date=date_range.start,
+                end_date=date_range.end,
+            ),
+        ] + list(aggregate_endpoints(date_range, streams=show_streams))
+        if BACKFILL:
+            show_endpoints = [
+                params
+                for params in show_endpoints
+                if params.openpodcast_endpoint not in CURRENT_ENDPOINTS
+            ]
+
+        def generate_endpoints():
+            """
+            Generate all endpoints lazily, so the workers start with the show-level
+            endpoints while the episodes are still being listed, and only a few
+            endpoints are kept in memory at a time.
+            """
+            # Skip endpoints which were stored today by an aborted run
+            yield from skip_completed(show_endpoints, COMPLETED_DOCUMENTS)
+
+            # Fetch all episodes. Use a longer time range to make sure we get all
+            # episodes. The episodes are listed page by page as they are consumed
+            if catalog is None:
+                episodes = spotify.episodes(oldestDate, todayDate)
+            else:
+                episodes = catalog.episodes(
+                    lambda: spotify.episodes(oldestDate, todayDate)
+                )
+
+            def refreshed(episodes):
+                """
+                Skip episodes without recent activity, they are refreshed less
+                often. The play counts of episodes from the catalog are not
+                current, they count as unchanged until the next full listing.
+                """
+                for episode in episodes:
+                    episode_id = episode["id"]
+                    release_date = get_episode_release_date(episode)
+                    plays = get_episode_plays(episode)
+                    if planner is not None and catalog is not None:
+                        if episode_id in catalog.cached:
+                            plays = planner.previous_total(episode_id)
+                    if planner is None or planner.should_refresh(
+                        episode_id, release_date, plays
+                    ):
+                        yield episode_id, release_date
+
+            # The daily streams of the next episodes are fetched concurrently,
+            # while the endpoints of the current episode are generated
+            if AGGREGATE_ZERO_DAYS_FROM_STREAMS:
+                episodes_with_streams = prefetch(
+                    refreshed(episodes),
+                    lambda episode: fetch_streams(episode[0]),
+                    NUM_WORKERS,
+                )
+            else:
+                episodes_with_streams = (
+                    (episode, None) for episode in refreshed(episodes)
+                )
+
+            for (episode_id, release_date), streams in episodes_with_streams:
+                # Fetch data for each episode
+                episode_endpoints = [
+                    FetchParams(
+                        openpodcast_endpoint="episodeMetadata",
+                        spotify_call=get_request_lambda(
+                            cached,
+                            "episodeMetadata",
+                            episode_id,
+                            get_request_lambda(spotify.metadata, episode=episode_id),
+                        ),
+                        start_date=date_range.start,
+                        end_date=date_range.end,
+                        meta={"episode": episode_id},
+                    ),
+                    FetchParams(
+                        openpodcast_endpoint="detailedStreams",
+                        spotify_call=streams_call(streams, episode_id),
+                        start_date=date_range.start,
+                        end_date=date_range.end,
+                        meta={"episode": episode_id},
+                    ),
+                    FetchParams(
+                        openpodcast_endpoint="listeners",
+                        spotify_call=get_request_lambda(
+                            spotify.listeners,
+                            date_range.start,
+                            date_range.end,
+                            episode=episode_id,
+                        ),
+                        start_date=date_range.start,
+                        end_date=date_range.end,
+                        meta={"episode": episode_id},
+                    ),
+                    FetchParams(
+                        openpodcast_endpoint="performance",
+                        spotify_call=lambda episode_id=episode_id: (
+                            normalize_performance(
+                                spotify.performance(episode=episode_id)
+                            )
+                        ),
+                        start_date=date_range.start,
+                        end_date=date_range.end,
+                        meta={"episode": episode_id},
+                    ),
+                ]
+
+                # Start at the release date of the episode or the start date of the
+                # time range, whichever is later, to avoid unnecessary API calls.
+                # If the episode was released after the end date, we don't have any
+                # data for it yet, so we skip it
+                episode_date_range = date_range.since(release_date or date_range.start)
+                if episode_date_range is not None:
+                    episode_endpoints += aggregate_endpoints(
+                        episode_date_range, episode_id, streams
+                    )
+
+                yield from skip_completed(episode_endpoints, COMPLETED_DOCUMENTS)
+
+        # Process the FetchParams objects on a pool of worker threads. Endpoints
+        # are only generated as fast as the workers process them. The workers
+        # stop once all endpoints are processed (also if listing the episodes failed)
+        with Executor(lambda params: fetch(post_sink, params), NUM_WORKERS) as executor:
+            executor.map(generate_endpoints())
+
+        # Send the remainder of the last batch
+        if isinstance(sink, BatchingSink):
+            sink.flush()
+        open_podcast.close()
+        if watermarks is not None:
+            watermarks.close()
+        if planner is not None:
+            planner.close()
+        if catalog is not None:
+            catalog.close()
+        if post_sink is not sink:
+            logger.info(f"Skipped {post_sink.skipped} unchanged metadata documents")
+        if metadata_cache is not None:
+            metadata_cache.close()
+
+        print("All items processed.")
+
+    except CredentialsExpired as e:
+        # Cleanly handle expired credential cookie
+        logger.error(f"Authentication failed: {e}")
+        sys.exit(1)
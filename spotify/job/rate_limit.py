@@ -0,0 +1,241 @@
+import datetime as dt
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from multiprocessing.managers import BaseManager
+from typing import Dict, Mapping, Optional
+
+import requests
+from loguru import logger
+from spotifyconnector import SpotifyConnector
+from spotifyconnector.connector import (
+    DELAY_BASE,
+    MAX_REQUEST_ATTEMPTS,
+    MaxRetriesException,
+)
+
+# Status codes which are retried after a delay
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+# `RateLimitedSpotifyConnector._request` replaces the private `_request` of
+# this version of spotifyconnector, which is pinned in pyproject.toml. Compare
+# the method with the new version before upgrading.
+SPOTIFYCONNECTOR_VERSION = "0.8.3"
+
+
+class TokenBucket:
+    """
+    Token bucket shared by all worker threads to stay within the rate limit
+    of an API (`requests` per `window` seconds).
+
+    Every request takes one token. Tokens are refilled continuously, so short
+    bursts of up to `burst` requests are possible, but the average rate never
+    exceeds the limit. If the API answers with HTTP 429 anyway, the rate is
+    halved and all threads wait for `Retry-After`. Successful requests raise
+    the rate again step by step until the configured rate is reached.
+    """
+
+    def __init__(
+        self,
+        requests: float,
+        window: float,
+        burst: Optional[float] = None,
+        min_rate: Optional[float] = None,
+    ):
+        self.max_rate = requests / window
+        self.rate = self.max_rate
+        self.min_rate = min_rate or self.max_rate / 16
+        self.burst = burst if burst is not None else max(1.0, requests / 4)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Take a token, waiting until one is available.
+        Returns the number of seconds waited.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0.0)
+            time.sleep(wait)
+            waited += wait
+
+    def penalize(self, retry_after: Optional[float] = None) -> None:
+        """
+        Slow down after the API answered with HTTP 429.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+            logger.warning(
+                f"Rate limited, slowing down to {self.rate * 60:.1f} requests per minute"
+            )
+
+    def reward(self) -> None:
+        """
+        Speed up again after a successful request.
+        """
+        with self.lock:
+            if self.rate < self.max_rate:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class BrokerClient(BaseManager):
+    pass
+
+
+BrokerClient.register("get_bucket")
+
+
+def connect_limiter(
+    config: Mapping[str, str], provider: str, requests: float, window: float
+):
+    """
+    Return the token bucket for `provider`.
+
+    If the pipeline is run by the connector manager, the bucket is shared by
+    all pipeline runs on this host via the manager's rate limit broker
+    (`RATE_LIMIT_BROKER_ADDRESS`). Otherwise, or if the broker cannot be
+    reached, a bucket local to this run is used.
+    """
+    address = config.get("RATE_LIMIT_BROKER_ADDRESS")
+    authkey = config.get("RATE_LIMIT_BROKER_AUTHKEY")
+    if address and authkey:
+        try:
+            host, port = address.rsplit(":", 1)
+            client = BrokerClient(
+                address=(host, int(port)), authkey=bytes.fromhex(authkey)
+            )
+            client.connect()
+            logger.info(f"Using shared rate limit for {provider} from {address}")
+            return client.get_bucket(provider, requests, window)
+        except (OSError, ValueError, EOFError) as e:
+            logger.warning(f"Cannot connect to rate limit broker at {address}: {e}")
+    return TokenBucket(requests, window)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a `Retry-After` header, which is either a number of seconds or an
+    HTTP date. Returns the number of seconds to wait or None.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=dt.timezone.utc)
+    return max(0.0, (retry_at - dt.datetime.now(dt.timezone.utc)).total_seconds())
+
+
+class RateLimitedSpotifyConnector(SpotifyConnector):
+    """
+    SpotifyConnector which takes a token from a shared `TokenBucket` before
+    every request to the Spotify API and honours `Retry-After` on HTTP 429.
+
+    The library creates a new session for every request and offers no hook
+    around it, so `_request` is overridden (see `SPOTIFYCONNECTOR_VERSION`).
+    """
+
+    def __init__(self, *args, limiter: TokenBucket, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter
+
+    def _request(self, url: str, *, params: Optional[Dict[str, str]] = None) -> dict:
+        logger.trace("url = {}", url)
+        delay = DELAY_BASE
+
+        last_status_code = None
+        last_exception = None
+
+        for attempt in range(MAX_REQUEST_ATTEMPTS):
+            try:
+                if attempt == 0 or last_exception is None:
+                    self._ensure_auth()
+
+                self.limiter.acquire()
+                response = requests.get(
+                    url,
+                    params=params,
+                    headers={"Authorization": f"Bearer {self._bearer}"},
+                )
+
+                if response.status_code in RETRY_STATUS_CODES:
+                    last_status_code = response.status_code
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    if response.status_code == 429:
+                        # the limiter makes all threads wait
+                        self.limiter.penalize(retry_after or delay)
+                    else:
+                        time.sleep(retry_after or delay)
+                    delay *= 2
+                    logger.log(
+                        ("INFO" if attempt < 3 else "WARNING"),
+                        'Got {} for URL "{}", retrying (attempt {}/{})',
+                        response.status_code,
+                        url,
+                        attempt + 1,
+                        MAX_REQUEST_ATTEMPTS,
+                    )
+                    continue
+
+                if response.status_code == 401:
+                    last_status_code = response.status_code
+                    self._authenticate()
+                    continue
+
+                if not response.ok:
+                    last_status_code = response.status_code
+                    logger.error(
+                        f"Error in API: {response.status_code} {response.text}"
+                    )
+                    response.raise_for_status()
+
+                self.limiter.reward()
+                logger.trace("response = {}", response.text)
+                return response.json()
+
+            except requests.exceptions.RequestException as e:
+                last_exception = e
+                delay *= 2
+                logger.log(
+                    ("INFO" if attempt < 3 else "WARNING"),
+                    'Network error for URL "{}": {} (attempt {}/{}), next delay: {}s',
+                    url,
+                    str(e),
+                    attempt + 1,
+                    MAX_REQUEST_ATTEMPTS,
+                    delay,
+                )
+                # Don't sleep on the last attempt
+                if attempt < MAX_REQUEST_ATTEMPTS - 1:
+                    time.sleep(delay)
+                continue
+
+        # If we get here, all retries failed
+        if last_exception:
+            raise last_exception
+        raise MaxRetriesException(url, last_status_code, MAX_REQUEST_ATTEMPTS)
@@ -37,6 +37,24 @@ def aggregate_or_empty(spotify_call, start, end):
         raise
 
 
+def zero_stream_days(streams):
+    """
+    Returns the days (as `YYYY-MM-DD`) without any starts or streams in a
+    `detailedStreams` response. Days missing from the response or without
+    counts are not included, as nothing is known about them.
+    """
+    if not isinstance(streams, dict):
+        return set()
+    return {
+        point["date"]
+        for point in streams.get("detailedStreams") or []
+        if isinstance(point, dict)
+        and "date" in point
+        and point.get("starts") == 0
+        and point.get("streams") == 0
+    }
+
+
 def normalize_performance(data):
     if not isinstance(data, dict) or not isinstance(data.get("samples"), list):
         return data
@@ -62,3 +80,15 @@ def get_episode_release_date(episode):
             f"Episode {episode['id']} has an invalid release date ({episode['releaseDate']}). Continuing..."
         )
         return None
+
+
+def get_episode_plays(episode):
+    """
+    Returns the number of plays (starts or streams) of an episode from the
+    episode list, or None if the list does not contain it
+    """
+    for key in ("starts", "streams"):
+        value = episode.get(key)
+        if isinstance(value, int):
+            return value
+    return None
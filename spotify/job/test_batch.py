@@ -0,0 +1,99 @@
+import datetime as dt
+import json
+import unittest
+from unittest.mock import Mock, patch
+
+from job.batch import BatchingSink
+from job.open_podcast import OpenPodcastConnector
+
+
+def response(status_code, body=None):
+    return Mock(status_code=status_code, json=Mock(return_value=body), text="")
+
+
+class TestBatchingSink(unittest.TestCase):
+    def setUp(self):
+        self.connector = OpenPodcastConnector(
+            "https://api.example.com", "token", "podcast-id"
+        )
+        self.start = dt.datetime(2026, 7, 22)
+        self.end = dt.datetime(2026, 7, 28)
+
+    def post(self, sink, count):
+        for i in range(count):
+            sink.post("metadata", {"episode": str(i)}, {"a": i}, self.start, self.end)
+
+    def test_sends_batch_when_full(self):
+        sink = BatchingSink(self.connector, max_items=3)
+        ok = response(200, {"results": [{"status": 200}] * 3})
+        with patch.object(self.connector, "send", return_value=ok) as mock_send:
+            self.post(sink, 2)
+            mock_send.assert_not_called()
+
+            self.post(sink, 1)
+
+        mock_send.assert_called_once()
+        path, body = mock_send.call_args.args
+        self.assertEqual(path, "connector/batch")
+        documents = json.loads(body)
+        self.assertEqual([d["meta"]["episode"] for d in documents], ["0", "1", "0"])
+
+    def test_flush_sends_remainder(self):
+        sink = BatchingSink(self.connector, max_items=10)
+        ok = response(200, {"results": [{"status": 200}] * 2})
+        with patch.object(self.connector, "send", return_value=ok) as mock_send:
+            self.post(sink, 2)
+            sink.flush()
+            sink.flush()
+
+        mock_send.assert_called_once()
+        self.assertEqual(len(json.loads(mock_send.call_args.args[1])), 2)
+
+    def test_logs_failed_items(self):
+        sink = BatchingSink(self.connector, max_items=2)
+        partial = response(200, {"results": [{"status": 200}, {"status": 400}]})
+        with (
+            patch.object(self.connector, "send", return_value=partial),
+            patch("job.batch.logger") as mock_logger,
+        ):
+            self.post(sink, 2)
+
+        mock_logger.error.assert_called_once()
+        self.assertIn("for episode 1", mock_logger.error.call_args.args[0])
+
+    def test_calls_on_success_for_stored_items(self):
+        sink = BatchingSink(self.connector, max_items=2)
+        partial = response(200, {"results": [{"status": 200}, {"status": 400}]})
+        stored = []
+        with patch.object(self.connector, "send", return_value=partial):
+            for i in range(2):
+                sink.post(
+                    "aggregate",
+                    None,
+                    {"a": i},
+                    self.start,
+                    self.end,
+                    on_success=lambda i=i: stored.append(i),
+                )
+
+        self.assertEqual(stored, [0])
+
+    def test_falls_back_to_single_requests(self):
+        sink = BatchingSink(self.connector, max_items=2)
+        with patch.object(
+            self.connector,
+            "send",
+            side_effect=[response(404), response(200), response(200), response(200)],
+        ) as mock_send:
+            self.post(sink, 2)
+            self.post(sink, 1)
+            sink.flush()
+
+        paths = [c.args[0] for c in mock_send.call_args_list]
+        self.assertEqual(
+            paths, ["connector/batch", "connector", "connector", "connector"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import datetime as dt
+import tempfile
+import unittest
+from pathlib import Path
+
+from job.catalog import EpisodeCatalog
+
+TODAY = dt.datetime(2026, 7, 28)
+
+
+def episode(episode_id, release_date, starts=0):
+    return {"id": episode_id, "releaseDate": release_date, "starts": starts}
+
+
+class TestEpisodeCatalog(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "spotify.sqlite3"
+        self.all_episodes = [
+            episode("ep3", "2026-07-01", 30),
+            episode("ep2", "2026-06-01", 20),
+            episode("ep1", "2026-05-01", 10),
+        ]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def list_episodes(self, episodes, today=TODAY, refresh_days=7):
+        """
+        Returns the episodes of the catalog and the episodes listed from the API
+        """
+        consumed = []
+
+        def listed():
+            for e in episodes:
+                consumed.append(e)
+                yield e
+
+        catalog = EpisodeCatalog(self.path, "show", today, refresh_days)
+        result = list(catalog.episodes(listed))
+        catalog.close()
+        return result, consumed
+
+    def test_first_run_lists_all_episodes(self):
+        episodes, consumed = self.list_episodes(self.all_episodes)
+        self.assertEqual(episodes, self.all_episodes)
+        self.assertEqual(len(consumed), 3)
+
+    def test_only_new_episodes_are_listed(self):
+        self.list_episodes(self.all_episodes)
+
+        new = episode("ep4", "2026-07-20", 1)
+        episodes, consumed = self.list_episodes(
+            [new, episode("ep3", "2026-07-01", 31)] + self.all_episodes[1:],
+            today=TODAY + dt.timedelta(days=1),
+        )
+
+        self.assertEqual([e["id"] for e in episodes], ["ep4", "ep3", "ep2", "ep1"])
+        # the newest known episode is listed again, older ones are not
+        self.assertEqual([e["id"] for e in consumed], ["ep4", "ep3", "ep2"])
+        self.assertEqual(episodes[1]["starts"], 31)
+        self.assertEqual(episodes[3]["starts"], 10)
+
+    def test_full_refresh_removes_deleted_episodes(self):
+        self.list_episodes(self.all_episodes)
+
+        episodes, consumed = self.list_episodes(
+            self.all_episodes[:1] + self.all_episodes[2:],
+            today=TODAY + dt.timedelta(days=7),
+        )
+
+        self.assertEqual([e["id"] for e in consumed], ["ep3", "ep1"])
+        episodes, _ = self.list_episodes([], today=TODAY + dt.timedelta(days=8))
+        self.assertEqual([e["id"] for e in episodes], ["ep3", "ep1"])
+
+    def test_aborted_full_refresh_is_repeated(self):
+        catalog = EpisodeCatalog(self.path, "show", TODAY, 7)
+        episodes = catalog.episodes(lambda: iter(self.all_episodes))
+        next(episodes)
+        catalog.close()
+
+        catalog = EpisodeCatalog(self.path, "show", TODAY, 7)
+        self.assertTrue(catalog.needs_full_refresh())
+        catalog.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -30,6 +30,14 @@ class TestDateRange(unittest.TestCase):
         chunks = list(self.date_range.chunks(3))
         self.assertEqual(chunks, expected_chunks)
 
+    def test_since(self):
+        date_range = DateRange(dt.datetime(2022, 1, 1), dt.datetime(2022, 1, 10))
+
+        since = date_range.since(dt.datetime(2022, 1, 8))
+        self.assertEqual(list(since), [dt.datetime(2022, 1, i) for i in (8, 9, 10)])
+        self.assertEqual(date_range.since(dt.datetime(2021, 1, 1)).days, 9)
+        self.assertIsNone(date_range.since(dt.datetime(2022, 1, 11)))
+
 
 class TestGetDateRange(unittest.TestCase):
     def test_valid_date_range(self):
@@ -0,0 +1,103 @@
+import threading
+import time
+import unittest
+
+from job.executor import Executor, prefetch
+
+
+class TestExecutor(unittest.TestCase):
+    def test_processes_all_items(self):
+        done = []
+        lock = threading.Lock()
+
+        def work(item):
+            with lock:
+                done.append(item)
+
+        with Executor(work, num_workers=3) as executor:
+            executor.map(range(50))
+
+        self.assertEqual(sorted(done), list(range(50)))
+        self.assertFalse(any(thread.is_alive() for thread in executor.threads))
+
+    def test_submit_blocks_while_queue_is_full(self):
+        release = threading.Event()
+        submitted = []
+
+        def produce(executor):
+            for item in range(5):
+                executor.submit(item)
+                submitted.append(item)
+
+        with Executor(lambda item: release.wait(), num_workers=1, queue_size=2) as e:
+            producer = threading.Thread(target=produce, args=(e,))
+            producer.start()
+            time.sleep(0.2)
+            # one item is being processed, two are waiting in the queue
+            self.assertEqual(len(submitted), 3)
+            release.set()
+            producer.join()
+
+        self.assertEqual(len(submitted), 5)
+
+    def test_errors_do_not_stop_workers(self):
+        done = []
+
+        def work(item):
+            if item == 1:
+                raise ValueError("bad item")
+            done.append(item)
+
+        with Executor(work, num_workers=1) as executor:
+            executor.map(range(3))
+
+        self.assertEqual(done, [0, 2])
+
+    def test_stops_workers_if_producer_fails(self):
+        def items():
+            yield 1
+            raise RuntimeError("listing failed")
+
+        with self.assertRaises(RuntimeError):
+            with Executor(lambda item: None, num_workers=2) as executor:
+                executor.map(items())
+
+        self.assertFalse(any(thread.is_alive() for thread in executor.threads))
+        with self.assertRaises(RuntimeError):
+            executor.submit(2)
+
+
+class TestPrefetch(unittest.TestCase):
+    def test_yields_results_in_order(self):
+        def call(item):
+            time.sleep(0.01 * (3 - item))
+            return item * 10
+
+        self.assertEqual(
+            list(prefetch(range(3), call, num_workers=3)), [(0, 0), (1, 10), (2, 20)]
+        )
+
+    def test_calls_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def call(item):
+            # fails with BrokenBarrierError unless both calls run at once
+            barrier.wait()
+            return item
+
+        self.assertEqual(list(prefetch([1, 2], call, num_workers=2)), [(1, 1), (2, 2)])
+
+    def test_errors_are_raised_with_their_item(self):
+        def call(item):
+            if item == 1:
+                raise ValueError("bad item")
+            return item
+
+        results = prefetch(range(3), call)
+        self.assertEqual(next(results), (0, 0))
+        with self.assertRaises(ValueError):
+            next(results)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import datetime as dt
+import unittest
+
+from job.fetch_params import FetchParams, parse_completed, skip_completed
+
+
+def params(endpoint, episode=None, start=1, end=3):
+    return FetchParams(
+        openpodcast_endpoint=endpoint,
+        spotify_call=lambda: {},
+        start_date=dt.datetime(2026, 7, start),
+        end_date=dt.datetime(2026, 7, end),
+        meta={"episode": episode} if episode else None,
+    )
+
+
+class TestSkipCompleted(unittest.TestCase):
+    def setUp(self):
+        self.endpoints = [
+            params("metadata"),
+            params("followers"),
+            params("listeners"),
+            params("listeners", "ep1"),
+            params("listeners", "ep2"),
+            params("aggregate", "ep1", 1, 1),
+            params("aggregate", "ep1", 2, 2),
+        ]
+
+    def names(self, endpoints):
+        return [
+            (p.openpodcast_endpoint, (p.meta or {}).get("episode"), p.start_date.day)
+            for p in endpoints
+        ]
+
+    def test_skips_completed_documents(self):
+        completed = {
+            ("metadata", "", "2026-07-01", "2026-07-03"),
+            ("listeners", "ep1", "2026-07-01", "2026-07-03"),
+            ("aggregate", "ep1", "2026-07-01", "2026-07-01"),
+        }
+        remaining = skip_completed(self.endpoints, completed)
+        self.assertEqual(
+            self.names(remaining),
+            [
+                ("followers", None, 1),
+                ("listeners", None, 1),
+                ("listeners", "ep2", 1),
+                ("aggregate", "ep1", 2),
+            ],
+        )
+
+    def test_keeps_documents_with_the_same_key(self):
+        endpoints = [params("metrics"), params("metrics")]
+        completed = {("metrics", "", "2026-07-01", "2026-07-03")}
+        self.assertEqual(len(skip_completed(endpoints, completed)), 2)
+
+    def test_nothing_completed(self):
+        self.assertIs(skip_completed(self.endpoints, set()), self.endpoints)
+
+
+class TestParseCompleted(unittest.TestCase):
+    def test_parses_documents(self):
+        self.assertEqual(
+            parse_completed('[["listeners", "ep1", "2026-07-01", "2026-07-03"]]'),
+            {("listeners", "ep1", "2026-07-01", "2026-07-03")},
+        )
+
+    def test_empty(self):
+        self.assertEqual(parse_completed(""), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -43,6 +43,14 @@ class TestLoadFileOrEnv(unittest.TestCase):
         result = load_file_or_env(self.var, "")
         self.assertEqual(result, "")
 
+    def test_load_from_given_env(self):
+        os.environ[self.var] = self.env_value
+        result = load_file_or_env(self.var, self.default, {self.var: "given value"})
+        self.assertEqual(result, "given value")
+        result = load_file_or_env(self.var, self.default, {})
+        self.assertEqual(result, self.default)
+        del os.environ[self.var]
+
 
 if __name__ == "__main__":
     unittest.main()
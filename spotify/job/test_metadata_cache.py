@@ -0,0 +1,124 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from job.metadata_cache import DAY, ChangedOnlySink, MetadataCache, parse_ttls
+
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "state" / "cache.sqlite3"
+        self.cache = MetadataCache(self.path, "show", {"episodeMetadata": DAY})
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def test_cached_within_ttl(self):
+        call = Mock(return_value={"name": "Episode 1"})
+
+        self.assertEqual(
+            self.cache.cached("episodeMetadata", "ep1", call), {"name": "Episode 1"}
+        )
+        self.assertEqual(
+            self.cache.cached("episodeMetadata", "ep1", call), {"name": "Episode 1"}
+        )
+        self.cache.cached("episodeMetadata", "ep2", call)
+
+        self.assertEqual(call.call_count, 2)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_cache_is_shared_between_runs(self):
+        self.cache.cached("episodeMetadata", "ep1", lambda: {"name": "Episode 1"})
+
+        other = MetadataCache(self.path, "show", {"episodeMetadata": DAY})
+        call = Mock()
+        self.assertEqual(
+            other.cached("episodeMetadata", "ep1", call), {"name": "Episode 1"}
+        )
+        call.assert_not_called()
+        other.close()
+
+    def test_expired_entries_are_fetched_again(self):
+        call = Mock(return_value={"name": "Episode 1"})
+        self.cache.cached("episodeMetadata", "ep1", call)
+
+        with patch("job.metadata_cache.time.time", return_value=9e9):
+            self.cache.cached("episodeMetadata", "ep1", call)
+
+        self.assertEqual(call.call_count, 2)
+
+    def test_endpoints_without_ttl_are_not_cached(self):
+        call = Mock(return_value={"starts": 1})
+        self.cache.cached("listeners", "ep1", call)
+        self.cache.cached("listeners", "ep1", call)
+        self.assertEqual(call.call_count, 2)
+
+    def test_errors_are_not_cached(self):
+        with self.assertRaises(ValueError):
+            self.cache.cached("episodeMetadata", "ep1", Mock(side_effect=ValueError))
+        self.assertEqual(self.cache.cached("episodeMetadata", "ep1", lambda: 1), 1)
+
+    def test_empty_results_are_not_cached(self):
+        self.cache.cached("episodeMetadata", "ep1", lambda: None)
+        self.assertEqual(self.cache.cached("episodeMetadata", "ep1", lambda: 1), 1)
+
+
+class TestChangedOnlySink(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = MetadataCache(Path(self.tmp.name) / "cache.sqlite3", "show", {})
+        self.target = Mock()
+        self.target.post.side_effect = lambda *args, on_success=None: (
+            on_success and on_success()
+        )
+        self.sink = ChangedOnlySink(self.target, self.cache, ["episodeMetadata"], DAY)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def post(self, endpoint, data, episode="ep1"):
+        self.sink.post(endpoint, {"episode": episode}, data, "2026-07-01", "2026-07-03")
+
+    def test_skips_unchanged_documents(self):
+        self.post("episodeMetadata", {"name": "Episode 1"})
+        self.post("episodeMetadata", {"name": "Episode 1"})
+        self.post("episodeMetadata", {"name": "Episode 1"}, episode="ep2")
+        self.post("episodeMetadata", {"name": "Episode 1 (updated)"})
+
+        self.assertEqual(self.target.post.call_count, 3)
+        self.assertEqual(self.sink.skipped, 1)
+
+    def test_sends_unchanged_documents_after_max_age(self):
+        self.post("episodeMetadata", {"name": "Episode 1"})
+        with patch("job.metadata_cache.time.time", return_value=9e9):
+            self.post("episodeMetadata", {"name": "Episode 1"})
+        self.assertEqual(self.target.post.call_count, 2)
+
+    def test_failed_documents_are_sent_again(self):
+        self.target.post.side_effect = None
+        self.post("episodeMetadata", {"name": "Episode 1"})
+        self.post("episodeMetadata", {"name": "Episode 1"})
+        self.assertEqual(self.target.post.call_count, 2)
+
+    def test_other_endpoints_are_always_sent(self):
+        on_success = Mock()
+        for _ in range(2):
+            self.sink.post("listeners", None, {"a": 1}, "s", "e", on_success=on_success)
+        self.assertEqual(self.target.post.call_count, 2)
+        self.assertEqual(on_success.call_count, 2)
+
+
+class TestParseTtls(unittest.TestCase):
+    def test_overrides_defaults(self):
+        ttls = parse_ttls(
+            "episodeMetadata=1, other=0.5,invalid", {"episodeMetadata": 7}
+        )
+        self.assertEqual(ttls, {"episodeMetadata": DAY, "other": DAY / 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import datetime as dt
+import gzip
+import json
+import unittest
+from unittest.mock import Mock, patch
+
+from job.open_podcast import RETRY, OpenPodcastConnector, compress
+
+
+class TestOpenPodcastConnector(unittest.TestCase):
+    def setUp(self):
+        self.connector = OpenPodcastConnector(
+            "https://api.example.com", "token", "podcast-id", pool_size=4
+        )
+        self.start = dt.datetime(2026, 7, 22)
+        self.end = dt.datetime(2026, 7, 28)
+
+    def test_session_pool_is_sized_to_workers(self):
+        adapter = self.connector.session.get_adapter("https://api.example.com")
+
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertGreater(adapter.max_retries.total, 0)
+        self.assertEqual(
+            self.connector.session.headers["Authorization"], "Bearer token"
+        )
+
+    def test_post_reuses_session(self):
+        response = Mock(status_code=200)
+        with patch.object(
+            self.connector.session, "post", return_value=response
+        ) as mock_post:
+            for _ in range(3):
+                result = self.connector.post(
+                    "metadata", {"episode": "1"}, {"a": 1}, self.start, self.end
+                )
+
+        self.assertIs(result, response)
+        self.assertEqual(mock_post.call_count, 3)
+        args, kwargs = mock_post.call_args
+        self.assertEqual(args[0], "https://api.example.com/connector")
+        payload = json.loads(kwargs["data"])
+        self.assertEqual(
+            payload["meta"],
+            {"show": "podcast-id", "endpoint": "metadata", "episode": "1"},
+        )
+        self.assertEqual(payload["range"], {"start": "2026-07-22", "end": "2026-07-28"})
+
+    def test_large_bodies_are_gzip_compressed(self):
+        data = {"samples": [0.5] * 1000}
+        with patch.object(
+            self.connector.session, "post", return_value=Mock(status_code=200)
+        ) as mock_post:
+            self.connector.post("performance", None, data, self.start, self.end)
+
+        kwargs = mock_post.call_args.kwargs
+        self.assertEqual(kwargs["headers"]["Content-Encoding"], "gzip")
+        payload = json.loads(gzip.decompress(kwargs["data"]))
+        self.assertEqual(payload["data"], data)
+
+    def test_falls_back_to_identity_when_compression_is_rejected(self):
+        data = {"samples": [0.5] * 1000}
+        rejected = Mock(status_code=415, headers={})
+        with patch.object(
+            self.connector.session,
+            "post",
+            side_effect=[rejected, Mock(status_code=200), Mock(status_code=200)],
+        ) as mock_post:
+            self.connector.post("performance", None, data, self.start, self.end)
+            self.connector.post("performance", None, data, self.start, self.end)
+
+        self.assertIsNone(self.connector.content_encoding)
+        self.assertEqual(mock_post.call_count, 3)
+        for call in mock_post.call_args_list[1:]:
+            self.assertNotIn("Content-Encoding", call.kwargs["headers"])
+            self.assertEqual(json.loads(call.kwargs["data"])["data"], data)
+
+
+class TestCompress(unittest.TestCase):
+    def test_gzip(self):
+        self.assertEqual(gzip.decompress(compress(b"body", "gzip")), b"body")
+
+    def test_unsupported_coding(self):
+        with self.assertRaises(ValueError):
+            compress(b"body", "br")
+
+
+class TestRetry(unittest.TestCase):
+    def test_only_connection_errors_are_retried(self):
+        self.assertEqual(RETRY.connect, 3)
+        self.assertEqual(RETRY.read, 0)
+        self.assertEqual(RETRY.status, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
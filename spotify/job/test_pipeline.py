@@ -0,0 +1,197 @@
+import datetime as dt
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from job.pipeline import run
+from job.watermarks import WatermarkStore
+
+EPISODES = [
+    {"id": "ep2", "releaseDate": "2024-02-01", "starts": 20},
+    {"id": "ep1", "releaseDate": "2024-01-01", "starts": 10},
+]
+
+
+class FakeOpenPodcast:
+    """Records the posted documents instead of sending them."""
+
+    def __init__(self, *args, **kwargs):
+        self.lock = threading.Lock()
+        self.posts = []
+
+    def health(self):
+        return Mock(status_code=200)
+
+    def post(self, endpoint, extra_meta, data, start, end, on_success=None):
+        with self.lock:
+            self.posts.append((endpoint, (extra_meta or {}).get("episode"), start))
+        if on_success is not None:
+            on_success()
+
+    def close(self):
+        pass
+
+    def episodes(self):
+        """IDs of the episodes for which documents were posted"""
+        return {episode for _, episode, _ in self.posts if episode}
+
+
+def fake_dt(today):
+    """`dt` module of the pipeline with `today` as the current date"""
+
+    class FakeDatetime(dt.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls.combine(today, dt.time(), tz)
+
+    return SimpleNamespace(datetime=FakeDatetime, timedelta=dt.timedelta)
+
+
+def fake_spotify(episodes=EPISODES, streams=None):
+    spotify = Mock()
+    for method in (
+        "metadata",
+        "listeners",
+        "followers",
+        "impressions",
+        "aggregate",
+        "performance",
+    ):
+        getattr(spotify, method).return_value = {"data": method}
+    spotify.streams.return_value = streams or {"detailedStreams": []}
+    spotify.episodes.side_effect = lambda start, end: iter(episodes)
+    return spotify
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config = {
+            "SPOTIFY_SP_DC": "dc",
+            "SPOTIFY_SP_KEY": "key",
+            "SPOTIFY_PODCAST_ID": "show",
+            "OPENPODCAST_API_TOKEN": "token",
+            "START_DATE": "2024-03-01",
+            "END_DATE": "2024-03-03",
+            "STATE_DIR": self.tmp.name,
+        }
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_pipeline(self, spotify, today=None, **config):
+        open_podcast = FakeOpenPodcast()
+        with (
+            patch("job.pipeline.RateLimitedSpotifyConnector", return_value=spotify),
+            patch("job.pipeline.OpenPodcastConnector", return_value=open_podcast),
+            patch("job.pipeline.dt", fake_dt(today or dt.date.today())),
+        ):
+            run({**self.config, **config})
+        return open_podcast
+
+    def test_catalog_episodes_keep_their_refresh_cadence(self):
+        config = {
+            "EPISODE_CATALOG_REFRESH_DAYS": "7",
+            "EPISODE_COLD_REFRESH_DAYS": "3",
+        }
+        fetched = {"ep1": [], "ep2": []}
+        for day in range(9):
+            # ep2 is played every day, ep1 not at all. Only ep2 is listed
+            # between the full listings on day 0 and 7, ep1 is taken from
+            # the catalog.
+            episodes = [
+                {"id": "ep2", "releaseDate": "2024-02-01", "starts": 20 + day},
+                {"id": "ep1", "releaseDate": "2024-01-01", "starts": 10},
+            ]
+            open_podcast = self.run_pipeline(
+                fake_spotify(episodes),
+                today=dt.date(2024, 6, 1) + dt.timedelta(days=day),
+                **config,
+            )
+            for episode in open_podcast.episodes():
+                fetched[episode].append(day)
+
+        self.assertEqual(fetched["ep2"], list(range(9)))
+        self.assertEqual(fetched["ep1"], [0, 3, 6])
+
+    def test_resumed_run_skips_the_stored_documents(self):
+        completed = [
+            ["metadata", "", "2024-03-01", "2024-03-03"],
+            ["listeners", "ep1", "2024-03-01", "2024-03-03"],
+        ]
+        open_podcast = self.run_pipeline(
+            fake_spotify(), COMPLETED_DOCUMENTS=json.dumps(completed)
+        )
+
+        posted = {(endpoint, episode) for endpoint, episode, _ in open_podcast.posts}
+        self.assertNotIn(("metadata", None), posted)
+        self.assertNotIn(("listeners", "ep1"), posted)
+        self.assertIn(("listeners", None), posted)
+        self.assertIn(("listeners", "ep2"), posted)
+        self.assertIn(("episodeMetadata", "ep1"), posted)
+
+    def test_backfill_fetches_cold_episodes(self):
+        self.run_pipeline(fake_spotify())
+
+        # both episodes are cold now, but a backfill fetches a past date range
+        backfill = self.run_pipeline(fake_spotify(), BACKFILL="1")
+
+        self.assertEqual(backfill.episodes(), {"ep1", "ep2"})
+
+    def test_backfill_does_not_send_the_current_state_of_the_show(self):
+        spotify = fake_spotify()
+        backfill = self.run_pipeline(spotify, BACKFILL="1")
+
+        show_endpoints = {
+            endpoint for endpoint, episode, _ in backfill.posts if episode is None
+        }
+        self.assertEqual(show_endpoints, {"listeners", "detailedStreams", "aggregate"})
+        spotify.impressions.assert_not_called()
+        spotify.followers.assert_not_called()
+
+    def test_zero_days_are_not_sent_but_marked_as_stored(self):
+        streams = {
+            "detailedStreams": [
+                {"date": "2024-03-01", "starts": 0, "streams": 0},
+                {"date": "2024-03-02", "starts": 5, "streams": 3},
+                {"date": "2024-03-03", "starts": 0, "streams": 0},
+            ]
+        }
+        open_podcast = self.run_pipeline(
+            fake_spotify(streams=streams),
+            AGGREGATE_ZERO_DAYS_FROM_STREAMS="true",
+            AGGREGATE_SEND_ZERO_DAYS="false",
+            NUM_WORKERS="2",
+        )
+
+        aggregates = {
+            (episode, start.strftime("%Y-%m-%d"))
+            for endpoint, episode, start in open_podcast.posts
+            if endpoint == "aggregate"
+        }
+        self.assertEqual(
+            aggregates,
+            {(None, "2024-03-02"), ("ep1", "2024-03-02"), ("ep2", "2024-03-02")},
+        )
+
+        watermarks = WatermarkStore(Path(self.tmp.name) / "spotify.sqlite3")
+        stored = watermarks.stored_days(
+            "show", "aggregate", dt.datetime(2024, 3, 1), dt.datetime(2024, 3, 3)
+        )
+        watermarks.close()
+        self.assertEqual(
+            stored,
+            {
+                (episode, day)
+                for episode in ("", "ep1", "ep2")
+                for day in ("2024-03-01", "2024-03-02", "2024-03-03")
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import importlib.metadata
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from job.rate_limit import (
+    SPOTIFYCONNECTOR_VERSION,
+    RateLimitedSpotifyConnector,
+    TokenBucket,
+    connect_limiter,
+    parse_retry_after,
+)
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_allows_burst_then_waits(self):
+        bucket = TokenBucket(requests=2, window=0.1, burst=2)
+
+        self.assertEqual(bucket.acquire(), 0.0)
+        self.assertEqual(bucket.acquire(), 0.0)
+        # 20 requests per second -> the next token is available after ~50ms
+        self.assertGreater(bucket.acquire(), 0.0)
+
+    def test_penalize_slows_down_and_blocks(self):
+        bucket = TokenBucket(requests=100, window=1, burst=10)
+
+        start = time.monotonic()
+        bucket.penalize(retry_after=0.05)
+
+        self.assertEqual(bucket.rate, 50)
+        bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+    def test_reward_restores_rate(self):
+        bucket = TokenBucket(requests=100, window=1)
+        bucket.penalize()
+        for _ in range(20):
+            bucket.reward()
+
+        self.assertEqual(bucket.rate, bucket.max_rate)
+
+
+class TestParseRetryAfter(unittest.TestCase):
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after("5"), 5.0)
+
+    def test_http_date_in_the_past(self):
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+
+    def test_invalid(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+
+
+class TestConnectLimiter(unittest.TestCase):
+    def test_local_bucket_without_broker(self):
+        limiter = connect_limiter({}, "spotify", 20, 30)
+
+        self.assertIsInstance(limiter, TokenBucket)
+        self.assertEqual(limiter.max_rate, 20 / 30)
+
+    def test_local_bucket_if_broker_is_unreachable(self):
+        config = {
+            "RATE_LIMIT_BROKER_ADDRESS": "127.0.0.1:1",
+            "RATE_LIMIT_BROKER_AUTHKEY": "00",
+        }
+
+        self.assertIsInstance(connect_limiter(config, "spotify", 20, 30), TokenBucket)
+
+
+class TestRateLimitedSpotifyConnector(unittest.TestCase):
+    def setUp(self):
+        self.limiter = Mock(spec=TokenBucket)
+        self.connector = RateLimitedSpotifyConnector(
+            base_url="https://api.example.com",
+            client_id="client",
+            podcast_id="podcast",
+            sp_dc="dc",
+            sp_key="key",
+            limiter=self.limiter,
+        )
+        self.connector._ensure_auth = Mock()
+        self.connector._bearer = "bearer"
+
+    def test_acquires_token_and_honours_retry_after(self):
+        limited = Mock(status_code=429, headers={"Retry-After": "7"})
+        ok = Mock(status_code=200, ok=True, json=Mock(return_value={"a": 1}))
+        with patch("job.rate_limit.requests.get", side_effect=[limited, ok]):
+            result = self.connector._request("https://api.example.com/x")
+
+        self.assertEqual(result, {"a": 1})
+        self.assertEqual(self.limiter.acquire.call_count, 2)
+        self.limiter.penalize.assert_called_once_with(7.0)
+        self.limiter.reward.assert_called_once()
+
+    def test_installed_library_is_the_overridden_version(self):
+        self.assertEqual(
+            importlib.metadata.version("spotifyconnector"), SPOTIFYCONNECTOR_VERSION
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
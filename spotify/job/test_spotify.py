@@ -8,6 +8,7 @@ from job.spotify import (
     empty_aggregate,
     get_episode_release_date,
     normalize_performance,
+    zero_stream_days,
 )
 
 
@@ -72,6 +73,23 @@ class TestAggregateOrEmpty(unittest.TestCase):
         )
 
 
+class TestZeroStreamDays(unittest.TestCase):
+    def test_days_without_starts_and_streams(self):
+        streams = {
+            "detailedStreams": [
+                {"date": "2022-10-30", "starts": 1, "streams": 1},
+                {"date": "2022-10-31", "starts": 0, "streams": 0},
+                {"date": "2022-11-01", "starts": 1, "streams": 0},
+                {"date": "2022-11-02"},
+            ]
+        }
+        self.assertEqual(zero_stream_days(streams), {"2022-10-31"})
+
+    def test_unexpected_response(self):
+        self.assertEqual(zero_stream_days(None), set())
+        self.assertEqual(zero_stream_days({"detailedStreams": None}), set())
+
+
 class TestNormalizePerformance(unittest.TestCase):
     def test_adds_missing_fields_without_mutating_response(self):
         response = {"samples": [0.9, 0.8, 0.7], "episode": "episode-id"}
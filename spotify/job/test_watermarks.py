@@ -0,0 +1,44 @@
+import datetime as dt
+import tempfile
+import unittest
+from pathlib import Path
+
+from job.watermarks import WatermarkStore, days_to_fetch
+
+
+def day(d):
+    return dt.datetime(2026, 7, d)
+
+
+class TestWatermarkStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = WatermarkStore(Path(self.tmp.name) / "state" / "spotify.sqlite3")
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_stored_days(self):
+        self.store.mark_stored("show", "", "aggregate", day(1))
+        self.store.mark_stored("show", "ep1", "aggregate", day(2))
+        self.store.mark_stored("show", "ep1", "aggregate", day(2))
+        self.store.mark_stored("other", "", "aggregate", day(1))
+        self.store.mark_stored("show", "", "aggregate", day(20))
+
+        stored = self.store.stored_days("show", "aggregate", day(1), day(10))
+
+        self.assertEqual(stored, {("", "2026-07-01"), ("ep1", "2026-07-02")})
+
+    def test_days_to_fetch_skips_stored_days_before_revision_window(self):
+        stored = {("ep1", "2026-07-01"), ("ep1", "2026-07-03"), ("", "2026-07-02")}
+        days = [day(d) for d in range(1, 5)]
+
+        self.assertEqual(
+            days_to_fetch(days, stored, "ep1", revision_start=day(3)),
+            [day(2), day(3), day(4)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
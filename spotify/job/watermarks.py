@@ -0,0 +1,97 @@
+import datetime as dt
+import functools
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List, Set, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stored_days (
+    show TEXT NOT NULL,
+    episode TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    day TEXT NOT NULL,
+    stored_at TEXT NOT NULL,
+    PRIMARY KEY (show, endpoint, episode, day)
+)
+"""
+
+
+class WatermarkStore:
+    """
+    Remembers which days of a per-day endpoint (e.g. `aggregate`) were
+    successfully stored in the Open Podcast API, per show and episode.
+
+    Days that were stored before are not requested again, except for the
+    most recent days (the revision window), as Spotify still updates the
+    numbers of recent days.
+
+    The store is a SQLite database, so it can be shared by several runs.
+    """
+
+    def __init__(self, path: Path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        # Workers and the batching sink mark days from different threads
+        self.db = sqlite3.connect(
+            str(path), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(SCHEMA)
+
+    def stored_days(
+        self, show: str, endpoint: str, start: dt.datetime, end: dt.datetime
+    ) -> Set[Tuple[str, str]]:
+        """
+        Return all stored `(episode, day)` pairs of the show and endpoint
+        between `start` and `end`. The show itself has the episode "".
+        """
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT episode, day FROM stored_days "
+                "WHERE show = ? AND endpoint = ? AND day BETWEEN ? AND ?",
+                (show, endpoint, _day(start), _day(end)),
+            ).fetchall()
+        return set(rows)
+
+    def mark_stored(
+        self, show: str, episode: str, endpoint: str, day: dt.datetime
+    ) -> None:
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO stored_days VALUES (?, ?, ?, ?, ?)",
+                (
+                    show,
+                    episode,
+                    endpoint,
+                    _day(day),
+                    dt.datetime.now(dt.timezone.utc).isoformat(),
+                ),
+            )
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
+
+
+def days_to_fetch(
+    days: Iterable[dt.datetime],
+    stored: Set[Tuple[str, str]],
+    episode: str,
+    revision_start: dt.datetime,
+) -> List[dt.datetime]:
+    """
+    Return the days which were not stored yet or are within the revision
+    window (on or after `revision_start`).
+    """
+    return [
+        day
+        for day in days
+        if day >= revision_start or (episode, _day(day)) not in stored
+    ]
+
+
+# The same days are checked for every episode, so they are only formatted once
+@functools.lru_cache(maxsize=4096)
+def _day(day: dt.datetime) -> str:
+    return day.strftime("%Y-%m-%d")
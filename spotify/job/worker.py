@@ -1,25 +1,14 @@
-import queue
-from time import sleep
-
 import requests
 from loguru import logger
 
+from job.batch import BatchingSink
 from job.fetch_params import FetchParams
 from job.open_podcast import OpenPodcastConnector
 
 
-def worker(q: queue.Queue, openpodcast: OpenPodcastConnector, delay) -> None:
-    """
-    A worker thread that fetches data from the Spotify API
-    """
-    while True:
-        params = q.get()
-        fetch(openpodcast, params)
-        q.task_done()
-        sleep(delay)
-
-
-def fetch(openpodcast: OpenPodcastConnector, params: FetchParams) -> None:
+def fetch(
+    openpodcast: OpenPodcastConnector | BatchingSink, params: FetchParams
+) -> None:
     """
     Fetches data from the Spotify API and sends it to the Open Podcast API
     """
@@ -32,6 +21,7 @@ def fetch(openpodcast: OpenPodcastConnector, params: FetchParams) -> None:
                 data,
                 params.start_date,
                 params.end_date,
+                on_success=params.on_success,
             )
     except requests.exceptions.HTTPError as e:
         logger.error(e)